@@ -6,25 +6,57 @@ from .resources.users import users_blueprint
 from .resources.clubs import clubs_blueprint
 from .resources.books import books_blueprint
 from .resources.reviews import review_blueprint
-from sql_alchemy import db
+from .commands import register_commands
+from .json_provider import init_json_provider
+from .cache import response_cache
+from .request_log import init_request_logging
+from .query_stats import init_query_stats
+from .metrics import metrics
+from .leaderboard import init_leaderboard
+from .similarity import init_similarity
+from .passwords import password_hasher
+from .auth import is_token_revoked, load_current_user
+from sql_alchemy import db, apply_sqlite_pragmas
+from blacklist import BLACKLIST
 
 import os
 
-def create_app(config_name=None):
+def create_app(config_name=None, **config_overrides):
     load_dotenv()
+    # Importado só depois do load_dotenv, pois as classes de config leem o ambiente
+    from config import config
 
     app = Flask(__name__)
-    if config_name == 'testing': 
-        app.config.from_object('config.TestingConfig') 
-    else: 
-        app.config.from_object('config.DevelopmentConfig')        
+    config_name = config_name or os.environ.get('FLASK_CONFIG', 'default')
+    if config_name not in config:
+        raise ValueError(f'Unknown config: {config_name}')
+    app.config.from_object(config[config_name])
+    app.config.update(config_overrides)
+    init_json_provider(app)
 
     db.init_app(app)
+    apply_sqlite_pragmas(app)
     jwt = JWTManager(app)
+    BLACKLIST.init_app(app)
+    response_cache.init_app(app)
+    password_hasher.init_app(app)
+    init_leaderboard(app)
+    init_similarity(app)
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return is_token_revoked(jwt_payload)
+
+    jwt.user_lookup_loader(load_current_user)
 
     app.register_blueprint(users_blueprint)
     app.register_blueprint(clubs_blueprint)
     app.register_blueprint(books_blueprint)
     app.register_blueprint(review_blueprint)
 
+    register_commands(app)
+    init_request_logging(app)
+    init_query_stats(app)
+    metrics.init_app(app)
+
     return app
\ No newline at end of file
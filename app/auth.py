@@ -0,0 +1,51 @@
+import time
+from collections import namedtuple
+
+from flask import current_app
+
+from sql_alchemy import db
+from blacklist import BLACKLIST
+from .models.user import User
+
+# Identidade do usuário autenticado, disponível como `current_user` nas rotas protegidas
+CurrentUser = namedtuple('CurrentUser', ['id', 'email'])
+
+
+def identity_claims(user):
+    """
+    Claims adicionais gravadas no token no login, para que as rotas protegidas não precisem consultar o usuário.
+    """
+    return {'email': user.email}
+
+
+def _identity_key(user_id, email):
+    return f'identity:{user_id}:{email}'
+
+
+def revoke_identity(user_id, email):
+    """
+    Revoga todos os tokens emitidos com o email antigo do usuário (troca de email ou exclusão da conta).
+
+    A revogação dura o tempo de vida máximo de um access token, depois disso nenhum token com esse email é aceito.
+    """
+    expires = current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    BLACKLIST.add(_identity_key(user_id, email), time.time() + expires.total_seconds() if expires else None)
+
+
+def is_token_revoked(jwt_payload):
+    if jwt_payload['jti'] in BLACKLIST:
+        return True
+    return 'email' in jwt_payload and _identity_key(jwt_payload['sub'], jwt_payload['email']) in BLACKLIST
+
+
+def load_current_user(jwt_header, jwt_data):
+    """
+    Carrega o `current_user` da requisição; o flask_jwt_extended guarda o resultado até o fim dela.
+
+    Tokens emitidos no login trazem o email nas claims e dispensam o banco; os demais buscam o usuário pela chave primária.
+    """
+    if 'email' in jwt_data:
+        return CurrentUser(jwt_data['sub'], jwt_data['email'])
+
+    user = db.session.get(User, jwt_data['sub'])
+    return CurrentUser(user.id, user.email) if user else None
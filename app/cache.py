@@ -0,0 +1,221 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, request
+
+
+class NullCacheBackend:
+    """
+    Backend usado quando o cache está desligado: nunca guarda nada.
+    """
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, tags):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+
+class MemoryCacheBackend:
+    """
+    Cache LRU com TTL na memória do processo, com índice de tags para invalidação.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, tags = entry
+            if expires_at <= time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, ()):
+                    self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+class DiskCacheBackend:
+    """
+    Cache em um arquivo SQLite compartilhado entre os workers, com TTL e limite de entradas.
+
+    Quando o limite é ultrapassado, as entradas mais próximas de expirar são descartadas primeiro.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path, maxsize, ttl, busy_timeout=5.0):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_expires_at ON cache_entry (expires_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_tag (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key))')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_tag_key ON cache_tag (key)')
+
+    def _connection(self):
+        # Uma conexão por thread e por processo, para continuar válida depois de um fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM cache_entry WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, tags):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM cache_tag WHERE key = ?', (key,))
+            conn.execute('INSERT OR REPLACE INTO cache_entry (key, value, expires_at) VALUES (?, ?, ?)',
+                         (key, pickle.dumps(value), time.time() + self.ttl))
+            conn.executemany('INSERT OR IGNORE INTO cache_tag (tag, key) VALUES (?, ?)', [(tag, key) for tag in tags])
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(conn)
+
+    def invalidate(self, tags):
+        with self._connection() as conn:
+            for tag in tags:
+                conn.execute('DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_tag WHERE tag = ?)', (tag,))
+                conn.execute('DELETE FROM cache_tag WHERE key IN (SELECT key FROM cache_tag WHERE tag = ?)', (tag,))
+
+    def _prune(self, conn):
+        conn.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (time.time(),))
+        conn.execute('DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_entry ORDER BY expires_at '
+                     'LIMIT max(0, (SELECT COUNT(*) FROM cache_entry) - ?))', (self.maxsize,))
+        conn.execute('DELETE FROM cache_tag WHERE key NOT IN (SELECT key FROM cache_entry)')
+
+
+class ResponseCache:
+    """
+    Cache das respostas dos endpoints de leitura, invalidado por tags nas escritas dos models.
+
+    O backend é escolhido por `RESPONSE_CACHE`: `null` (desligado), `memory` (LRU do processo)
+    ou `disk` (arquivo SQLite `RESPONSE_CACHE_DATABASE` compartilhado entre os workers).
+    """
+
+    def init_app(self, app):
+        backend = app.config['RESPONSE_CACHE']
+        maxsize, ttl = app.config['RESPONSE_CACHE_MAXSIZE'], app.config['RESPONSE_CACHE_TTL']
+        if backend == 'null':
+            store = NullCacheBackend()
+        elif backend == 'memory':
+            store = MemoryCacheBackend(maxsize, ttl)
+        elif backend == 'disk':
+            os.makedirs(app.instance_path, exist_ok=True)
+            store = DiskCacheBackend(os.path.join(app.instance_path, app.config['RESPONSE_CACHE_DATABASE']), maxsize, ttl)
+        else:
+            raise ValueError(f'Unknown response cache backend: {backend}')
+        app.extensions['response_cache'] = {'backend': store, 'hits': 0, 'misses': 0, 'lock': threading.Lock()}
+
+    @property
+    def _state(self):
+        return current_app.extensions['response_cache']
+
+    @property
+    def stats(self):
+        return {'hits': self._state['hits'], 'misses': self._state['misses']}
+
+    def _count(self, counter):
+        state = self._state
+        with state['lock']:
+            state[counter] += 1
+
+    def invalidate(self, *tags):
+        self._state['backend'].invalidate(tags)
+
+    def cached(self, *tags):
+        """
+        Decorator que guarda as respostas 200 do endpoint, identificadas pela URL completa.
+
+        As tags podem usar os argumentos da rota (ex.: 'book:{title}'); o endpoint pode acrescentar
+        outras com `add_cache_tags`.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                backend = self._state['backend']
+                if isinstance(backend, NullCacheBackend):
+                    return view(**kwargs)
+
+                key = request.full_path
+                entry = backend.get(key)
+                if entry is not None:
+                    self._count('hits')
+                    response = current_app.response_class(entry['body'], status=entry['status'], headers=entry['headers'])
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._count('misses')
+                g.cache_tags = {tag.format(**kwargs) for tag in tags}
+                response = current_app.make_response(view(**kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    backend.set(key, {
+                        'status': response.status_code,
+                        'headers': list(response.headers.items()),
+                        'body': response.get_data()
+                    }, g.cache_tags)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+
+def add_cache_tags(*tags):
+    """
+    Acrescenta tags à resposta em cache do endpoint atual, para dependências que só são conhecidas na consulta.
+    """
+    if 'cache_tags' in g:
+        g.cache_tags.update(tags)
+
+
+response_cache = ResponseCache()
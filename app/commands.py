@@ -0,0 +1,100 @@
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .exporter import iter_ndjson, iter_reviews, parse_since
+from .importer import FORMATS, import_books, import_reviews, iter_rows
+from .models.book import Book
+from .schema import SchemaUpgradeError, upgrade_schema
+from .similarity import rebuild_similar_books
+
+@click.command('repair-ratings')
+@with_appcontext
+def repair_ratings_command():
+    """
+    Recalcula do zero os agregados de avaliação (rating_count e rating_sum) de todos os livros.
+    """
+    updated = Book.repair_rating_aggregates()
+    click.echo(f'Rating aggregates repaired for {updated} books.')
+
+
+@click.command('import-catalog')
+@click.argument('kind', type=click.Choice(['books', 'reviews']))
+@click.argument('file', type=click.File('r', encoding='utf-8', errors='surrogateescape'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Formato do arquivo (padrão: pela extensão).')
+@click.option('--batch-size', default=1000, show_default=True, help='Linhas por transação.')
+@click.option('--registered-by', help='Email do usuário que registra todos os livros importados.')
+@with_appcontext
+def import_catalog_command(kind, file, fmt, batch_size, registered_by):
+    """
+    Importa livros ou resenhas de um arquivo CSV ou NDJSON (use - para ler da entrada padrão).
+    """
+    fmt = fmt or ('csv' if os.path.splitext(file.name)[1].lower() == '.csv' else 'ndjson')
+    rows = iter_rows(file, fmt)
+    if kind == 'books':
+        report = import_books(rows, registered_by=registered_by, batch_size=batch_size)
+    else:
+        report = import_reviews(rows, batch_size=batch_size)
+
+    for error in report.to_dict()['errors']:
+        click.echo(f"line {error['line']}: {error['message']}", err=True)
+    click.echo(f'{report.inserted} {kind} imported, {report.failed} rows failed.')
+
+
+@click.command('export-reviews')
+@click.option('--since', help='Exporta só as resenhas criadas a partir desta data (ISO 8601).')
+@click.option('--gzip', 'compress', is_flag=True, help='Comprime a saída em gzip.')
+@click.option('--output', type=click.File('wb'), default='-', help='Arquivo de saída (padrão: saída padrão).')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=1000, show_default=True)
+@with_appcontext
+def export_reviews_command(since, compress, output, chunk_size):
+    """
+    Exporta as resenhas em NDJSON, lendo o banco em chunks para manter o uso de memória constante.
+    """
+    try:
+        since = parse_since(since)
+    except ValueError:
+        raise click.BadParameter('Use the ISO 8601 format.', param_hint='--since')
+
+    for chunk in iter_ndjson(iter_reviews(since, chunk_size), compress):
+        output.write(chunk)
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """
+    Atualiza o banco existente para o schema atual: cria tabelas, colunas e índices que faltam.
+    """
+    try:
+        steps = upgrade_schema()
+    except SchemaUpgradeError as error:
+        raise click.ClickException(str(error))
+
+    for step in steps:
+        click.echo(step)
+    click.echo('Database is up to date.')
+
+
+@click.command('rebuild-similar-books')
+@with_appcontext
+def rebuild_similar_books_command():
+    """
+    Recalcula do zero os livros parecidos de cada livro a partir das resenhas.
+    """
+    config = current_app.config
+    started = time.perf_counter()
+    books = rebuild_similar_books(config['SIMILAR_BOOKS_MIN_RATING'], config['SIMILAR_BOOKS_NEIGHBOURS'],
+                                  config['SIMILAR_BOOKS_MAX_USER_BOOKS'])
+    click.echo(f'Similar books rebuilt for {books} books in {time.perf_counter() - started:.1f} s.')
+
+
+def register_commands(app):
+    app.cli.add_command(repair_ratings_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(import_catalog_command)
+    app.cli.add_command(export_reviews_command)
+    app.cli.add_command(rebuild_similar_books_command)
@@ -0,0 +1,67 @@
+import json
+import zlib
+from datetime import datetime, timezone
+
+from sql_alchemy import db
+from .models.review import Review
+
+REVIEW_FIELDS = ('id', 'book_id', 'book_title', 'rating', 'comment', 'user_email', 'created_at')
+
+
+def parse_since(value):
+    """
+    Converte o parâmetro `since` (data ISO 8601) para o formato gravado em `Review.created_at`: UTC sem fuso.
+
+    Retorna:
+        datetime: A data convertida, ou `None` quando o valor não foi informado.
+    """
+    if not value:
+        return None
+    since = datetime.fromisoformat(value)
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def iter_reviews(since=None, chunk_size=1000):
+    """
+    Percorre as resenhas em ordem de criação, a partir de `since` quando informado.
+
+    As linhas são lidas do banco com um cursor no servidor (`yield_per`), `chunk_size` por vez, sem criar
+    objetos do ORM, de forma que o uso de memória não depende do tamanho da tabela.
+
+    Retorna:
+        Iterator: Um dicionário por resenha.
+    """
+    review = Review.__table__
+    query = db.select(*(review.c[field] for field in REVIEW_FIELDS)).order_by(review.c.created_at, review.c.id)
+    if since is not None:
+        query = query.where(review.c.created_at >= since)
+
+    result = db.session.execute(query, execution_options={'yield_per': chunk_size})
+    for row in result.mappings():
+        data = dict(row)
+        if data['created_at'] is not None:
+            data['created_at'] = data['created_at'].isoformat()
+        yield data
+
+
+def iter_ndjson(rows, compress=False):
+    """
+    Serializa as linhas como NDJSON, agrupando-as em blocos de bytes; com `compress`, no formato gzip.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row, ensure_ascii=False, separators=(',', ':')))
+        if len(buffer) == 1000:
+            data = ('\n'.join(buffer) + '\n').encode('utf-8')
+            buffer = []
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+    data = ('\n'.join(buffer) + '\n').encode('utf-8') if buffer else b''
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
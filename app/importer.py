@@ -0,0 +1,239 @@
+import csv
+import json
+from itertools import islice
+
+from sql_alchemy import db
+from .cache import response_cache
+from .models.book import Book
+from .models.review import Review
+from .leaderboard import record_rating_change
+from .models.user import User
+
+FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 1000
+
+
+def _valid_text(values):
+    # Bytes que não eram UTF-8 válido chegam como surrogates (errors='surrogateescape') e não voltam a ser codificados
+    try:
+        for value in values:
+            if isinstance(value, list):
+                if not _valid_text(value):
+                    return False
+            elif isinstance(value, str):
+                value.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def iter_rows(stream, fmt):
+    """
+    Lê as linhas de um stream de texto em CSV (com cabeçalho) ou NDJSON.
+
+    O stream deve ser aberto com `errors='surrogateescape'`, para que bytes que não são UTF-8 válido
+    invalidem só a própria linha, em vez de interromper a leitura no meio da importação.
+
+    Retorna:
+        Iterator: Tuplas (número da linha, dicionário), com `None` no lugar das linhas inválidas
+        (JSON ou CSV malformado, ou com bytes que não são UTF-8).
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        try:
+            fieldnames = reader.fieldnames
+        except csv.Error:
+            # Sem cabeçalho não há como ler as demais linhas
+            yield 1, None
+            return
+        if fieldnames is not None and not _valid_text(fieldnames):
+            yield 1, None
+            return
+        # A linha 1 é o cabeçalho
+        line_number = 1
+        while True:
+            line_number += 1
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error:
+                yield line_number, None
+                continue
+            yield line_number, row if _valid_text(row.values()) else None
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line) if _valid_text([line]) else None
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Unknown import format: {fmt}')
+
+
+class ImportReport:
+    """
+    Resultado de uma importação: linhas inseridas e erros por linha.
+    """
+
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'message': message})
+
+    def to_dict(self):
+        return {'inserted': self.inserted, 'failed': self.failed, 'errors': sorted(self.errors, key=lambda error: error['line'])}
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _text(row, field, max_length):
+    value = row.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f'Missing {field}!')
+    if len(value) > max_length:
+        raise ValueError(f'The {field} must have at most {max_length} characters!')
+    return value
+
+
+def _existing(column, values):
+    if not values:
+        return set()
+    return set(db.session.execute(db.select(column).where(column.in_(values))).scalars())
+
+
+def _insert_chunk(report, table, valid, tags):
+    try:
+        db.session.execute(table.insert(), [row for _, row in valid])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for line_number, _ in valid:
+            report.error(line_number, 'An internal error occurred trying to save this batch!')
+        return False
+    report.inserted += len(valid)
+    response_cache.invalidate(*tags)
+    return True
+
+
+def import_books(rows, registered_by=None, batch_size=1000):
+    """
+    Importa livros em lotes, com uma transação e um único INSERT (executemany) por lote.
+
+    Duplicatas são detectadas por conjunto: uma consulta IN por lote contra o banco e um set dentro do lote.
+    Quando `registered_by` é informado, ele vale para todas as linhas; senão, cada linha deve trazer o seu.
+
+    Retorna:
+        ImportReport: As quantidades de linhas inseridas e com erro, e os erros por linha.
+    """
+    report = ImportReport()
+    for chunk in _chunks(rows, batch_size):
+        parsed = []
+        for line_number, row in chunk:
+            if row is None:
+                report.error(line_number, 'Invalid row!')
+                continue
+            try:
+                parsed.append((line_number, {
+                    'title': _text(row, 'title', 100),
+                    'description': _text(row, 'description', 250),
+                    'gender': _text(row, 'gender', 20),
+                    'registered_by': registered_by or _text(row, 'registered_by', 80)
+                }))
+            except ValueError as error:
+                report.error(line_number, str(error))
+
+        existing_titles = _existing(Book.title, {book['title'] for _, book in parsed})
+        known_users = _existing(User.email, {book['registered_by'] for _, book in parsed})
+        valid, seen = [], set()
+        for line_number, book in parsed:
+            if book['title'] in existing_titles or book['title'] in seen:
+                report.error(line_number, 'Book already exists!')
+            elif book['registered_by'] not in known_users:
+                report.error(line_number, 'User not exists!')
+            else:
+                seen.add(book['title'])
+                valid.append((line_number, book))
+
+        if valid:
+            _insert_chunk(report, Book.__table__, valid, ['books', *(f'book:{title}' for title in seen)])
+    return report
+
+
+def import_reviews(rows, batch_size=1000):
+    """
+    Importa resenhas em lotes, com uma transação por lote.
+
+    Livros e usuários referenciados são validados com uma consulta IN por lote, e os agregados de avaliação
+    dos livros são atualizados no mesmo lote com um único UPDATE (executemany) pela chave primária.
+
+    Retorna:
+        ImportReport: As quantidades de linhas inseridas e com erro, e os erros por linha.
+    """
+    report = ImportReport()
+    book = Book.__table__
+    update_aggregates = (
+        db.update(book)
+        .where(book.c.id == db.bindparam('_id'))
+        .values(rating_count=book.c.rating_count + db.bindparam('_count'),
+                rating_sum=book.c.rating_sum + db.bindparam('_sum'))
+    )
+
+    for chunk in _chunks(rows, batch_size):
+        parsed = []
+        for line_number, row in chunk:
+            if row is None:
+                report.error(line_number, 'Invalid row!')
+                continue
+            try:
+                rating = str(row.get('rating', ''))
+                if not rating.isdigit() or int(rating) > 5:
+                    raise ValueError('The review value must be from 0 to 5!')
+                comment = str(row['comment']) if row.get('comment') else None
+                if comment is not None and len(comment) > 500:
+                    raise ValueError('The comment must have at most 500 characters!')
+                parsed.append((line_number, {
+                    'rating': int(rating),
+                    'comment': comment,
+                    'user_email': _text(row, 'user_email', 80),
+                    'book_title': _text(row, 'book_title', 100)
+                }))
+            except ValueError as error:
+                report.error(line_number, str(error))
+
+        titles = {review['book_title'] for _, review in parsed}
+        book_ids = dict(db.session.execute(db.select(Book.title, Book.id).where(Book.title.in_(titles))).all()) if titles else {}
+        known_users = _existing(User.email, {review['user_email'] for _, review in parsed})
+        valid, aggregates = [], {}
+        for line_number, review in parsed:
+            if review['book_title'] not in book_ids:
+                report.error(line_number, 'Book not exists!')
+            elif review['user_email'] not in known_users:
+                report.error(line_number, 'User not exists!')
+            else:
+                review['book_id'] = book_ids[review['book_title']]
+                valid.append((line_number, review))
+                count, total = aggregates.get(review['book_id'], (0, 0))
+                aggregates[review['book_id']] = (count + 1, total + review['rating'])
+
+        if valid:
+            db.session.execute(update_aggregates, [
+                {'_id': book_id, '_count': count, '_sum': total} for book_id, (count, total) in aggregates.items()
+            ])
+            for book_id, (count, total) in aggregates.items():
+                record_rating_change(db.session, book_id, count, total)
+            titles = {review['book_title'] for _, review in valid}
+            _insert_chunk(report, Review.__table__, valid, ['reviews', *(f'book:{title}' for title in titles)])
+    return report
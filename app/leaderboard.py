@@ -0,0 +1,195 @@
+import bisect
+import logging
+import os
+import threading
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+
+from sql_alchemy import db
+from .models.book import Book
+
+logger = logging.getLogger('bookbridge.leaderboard')
+
+
+class Leaderboard:
+    """
+    Ranking dos livros pela média bayesiana das avaliações, mantido em memória em uma lista ordenada.
+
+    A nota de cada livro é `(C * m + soma) / (C + quantidade)`, em que `C` é `TOP_BOOKS_PRIOR_WEIGHT` e `m` é
+    a média geral das avaliações, fixada a cada reconstrução para que as notas dos outros livros não mudem
+    a cada resenha. O ranking é montado a partir dos agregados de Book (sem ler as resenhas) na criação da aplicação
+    e remontado por uma thread em segundo plano a cada `TOP_BOOKS_REFRESH_INTERVAL` segundos; entre uma reconstrução
+    e outra, cada escrita confirmada de resenha atualiza só a posição do livro afetado. As consultas só leem a lista.
+
+    Há uma lista para cada mínimo de avaliações aceito em `levels`, com só os livros que o atingem, para que
+    a consulta leia apenas os `limit` primeiros, sem percorrer os livros com menos avaliações.
+    """
+
+    def __init__(self, prior_weight, refresh_interval, levels=(1,)):
+        self.prior_weight = prior_weight
+        self.refresh_interval = refresh_interval
+        self.levels = tuple(sorted({max(1, level) for level in levels}))
+        self._lock = threading.Lock()
+        # mínimo de avaliações -> (-nota, book_id) em ordem crescente, ou seja, da maior para a menor nota
+        self._rankings = {level: [] for level in self.levels}
+        # book_id -> (quantidade, soma, chave no ranking)
+        self._books = {}
+        self._prior_mean = 0.0
+        # Avaliações que entraram na média `m` da última reconstrução
+        self._prior_reviews = 0
+        self._built = False
+        self._app = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _score(self, count, total):
+        return (self.prior_weight * self._prior_mean + total) / (self.prior_weight + count)
+
+    def rebuild(self):
+        """
+        Reconstrói o ranking a partir de Book.rating_count e Book.rating_sum.
+        """
+        rows = db.session.execute(
+            db.select(Book.id, Book.rating_count, Book.rating_sum).where(Book.rating_count > 0)
+        ).all()
+        reviews = sum(count for _, count, _ in rows)
+
+        with self._lock:
+            self._prior_mean = sum(total for _, _, total in rows) / reviews if reviews else 0.0
+            self._prior_reviews = reviews
+            self._books, self._rankings = {}, {level: [] for level in self.levels}
+            for book_id, count, total in rows:
+                key = (-self._score(count, total), book_id)
+                self._books[book_id] = (count, total, key)
+                for level in self.levels:
+                    if count < level:
+                        break
+                    self._rankings[level].append(key)
+            for ranking in self._rankings.values():
+                ranking.sort()
+            self._built = True
+
+    def invalidate(self):
+        """
+        Pede uma reconstrução à thread em segundo plano, sem esperar o próximo intervalo.
+        """
+        self._wake.set()
+        self._ensure_refresher()
+
+    def start(self, app):
+        """
+        Monta o ranking e liga a reconstrução periódica.
+
+        Se as tabelas ainda não existem (ex.: banco novo, antes de `db.create_all`), o ranking fica vazio
+        até a primeira reconstrução da thread.
+        """
+        self._app = app
+        with app.app_context():
+            self._try_rebuild()
+
+    def _try_rebuild(self):
+        try:
+            if db.inspect(db.engine).has_table(Book.__tablename__):
+                self.rebuild()
+        except SQLAlchemyError:
+            db.session.rollback()
+            logger.warning('Could not build the top books ranking', exc_info=True)
+
+    def _ensure_refresher(self):
+        # Criada sob demanda e recriada depois de um fork (ex.: workers do gunicorn)
+        if self._app is None or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                # Sem ranking montado na inicialização, a thread já começa reconstruindo
+                if not self._built:
+                    self._wake.set()
+                self._thread = threading.Thread(target=self._run, name='bookbridge-leaderboard', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            with self._app.app_context():
+                self._try_rebuild()
+
+    def apply(self, changes):
+        """
+        Aplica as variações de quantidade e soma das avaliações de cada livro, reposicionando-o no ranking.
+
+        Se o ranking foi montado sem nenhuma avaliação (ex.: banco novo), a média `m` ficou em 0 e as notas
+        não seriam médias bayesianas até a próxima reconstrução; nesse caso, ela é pedida na hora à thread.
+        """
+        with self._lock:
+            # Ainda não montado: a próxima reconstrução já lê os valores confirmados no banco
+            if not self._built:
+                return
+            stale_prior = not self._prior_reviews
+            for book_id, count_delta, sum_delta in changes:
+                count, total, key = self._books.pop(book_id, (0, 0, None))
+                for level in self.levels:
+                    if count < level:
+                        break
+                    ranking = self._rankings[level]
+                    del ranking[bisect.bisect_left(ranking, key)]
+                count, total = count + count_delta, total + sum_delta
+                if count > 0:
+                    key = (-self._score(count, total), book_id)
+                    self._books[book_id] = (count, total, key)
+                    for level in self.levels:
+                        if count < level:
+                            break
+                        bisect.insort(self._rankings[level], key)
+        if stale_prior:
+            self.invalidate()
+
+    def top(self, limit, min_reviews=1):
+        """
+        Retorna os `limit` livros com as maiores notas entre os que têm pelo menos `min_reviews` avaliações.
+
+        Retorna:
+            list: Tuplas (book_id, quantidade, soma, nota), da maior para a menor nota.
+
+        Lança:
+            ValueError: Se `min_reviews` não estiver em `levels`.
+        """
+        if min_reviews not in self._rankings:
+            raise ValueError(f"min_reviews must be one of: {', '.join(map(str, self.levels))}!")
+        self._ensure_refresher()
+        with self._lock:
+            return [(book_id, *self._books[book_id][:2], -score) for score, book_id in self._rankings[min_reviews][:limit]]
+
+
+def init_leaderboard(app):
+    leaderboard = Leaderboard(app.config['TOP_BOOKS_PRIOR_WEIGHT'], app.config['TOP_BOOKS_REFRESH_INTERVAL'],
+                              [app.config['TOP_BOOKS_MIN_REVIEWS'], *app.config['TOP_BOOKS_MIN_REVIEWS_LEVELS']])
+    leaderboard.start(app)
+    app.extensions['leaderboard'] = leaderboard
+
+
+def get_leaderboard():
+    return current_app.extensions['leaderboard']
+
+
+def record_rating_change(session, book_id, count_delta, sum_delta):
+    """
+    Registra a variação dos agregados de um livro, aplicada ao ranking só quando a sessão confirma a transação.
+    """
+    session.info.setdefault('rating_changes', []).append((book_id, count_delta, sum_delta))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_rating_changes(session):
+    changes = session.info.pop('rating_changes', None)
+    if changes and has_app_context() and 'leaderboard' in current_app.extensions:
+        get_leaderboard().apply(changes)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_rating_changes(session, previous_transaction):
+    session.info.pop('rating_changes', None)
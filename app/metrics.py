@@ -0,0 +1,282 @@
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+
+from sql_alchemy import db
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'bookbridge_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status code.'),
+    'bookbridge_http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint.'),
+    'bookbridge_http_requests_in_flight': ('gauge', 'HTTP requests currently being handled.'),
+    'bookbridge_db_pool_connections_total': ('counter', 'Database connections opened by the pool.'),
+    'bookbridge_db_pool_checkouts_total': ('counter', 'Connections checked out from the database pool.'),
+    'bookbridge_db_pool_checked_out': ('gauge', 'Connections currently checked out from the database pool.'),
+}
+
+# Máximo de shards registrados antes de incorporar os das threads encerradas
+MAX_SHARDS = 256
+
+
+def _family(sample):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if sample.endswith(suffix) and sample[:-len(suffix)] in METRICS:
+            return sample[:-len(suffix)]
+    return sample
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Métricas da aplicação no formato de texto do Prometheus, expostas em `/metrics`.
+
+    Cada thread incrementa o seu próprio dicionário (shard), sem lock no caminho da requisição;
+    os shards só são somados na leitura. Com `METRICS_MULTIPROC_DIR`, cada processo (ex.: worker do gunicorn)
+    grava um snapshot das suas métricas nesse diretório a cada `METRICS_FLUSH_INTERVAL` segundos e em cada
+    leitura, e `/metrics` soma os snapshots de todos os processos. Os gauges só contam os processos vivos.
+    O diretório deve ser esvaziado a cada nova implantação.
+    """
+
+    def __init__(self):
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Depois de um fork o processo filho começa do zero, para não contar de novo o que é do pai
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._flusher = None
+
+    def init_app(self, app):
+        if not app.config['METRICS_ENABLED']:
+            return
+        directory = app.config['METRICS_MULTIPROC_DIR']
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        app.extensions['metrics'] = {'directory': directory, 'flush_interval': app.config['METRICS_FLUSH_INTERVAL']}
+
+        with app.app_context():
+            for engine in db.engines.values():
+                if not event.contains(engine, 'checkout', self._on_checkout):
+                    event.listen(engine, 'connect', self._on_connect)
+                    event.listen(engine, 'checkout', self._on_checkout)
+                    event.listen(engine, 'checkin', self._on_checkin)
+
+        app.before_request(self._start_request)
+        app.after_request(self._record_request)
+        app.teardown_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view, methods=['GET'])
+
+    # Caminho da requisição
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                if len(self._shards) >= MAX_SHARDS:
+                    self._retire_dead_shards()
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, labels, seconds):
+        shard = self._shard()
+        index = bisect.bisect_left(BUCKETS, seconds)
+        le = repr(BUCKETS[index]) if index < len(BUCKETS) else '+Inf'
+        for key, value in (((f'{name}_bucket', labels + (('le', le),)), 1), ((f'{name}_sum', labels), seconds),
+                           ((f'{name}_count', labels), 1)):
+            shard[key] = shard.get(key, 0) + value
+
+    def _start_request(self):
+        self._ensure_flusher()
+        g.metrics_started = time.perf_counter()
+        g.metrics_labels = (('blueprint', request.blueprint or ''), ('endpoint', request.endpoint or 'unmatched'))
+        self.inc('bookbridge_http_requests_in_flight', g.metrics_labels)
+
+    def _record_request(self, response):
+        if 'metrics_started' in g:
+            labels = g.metrics_labels
+            self.inc('bookbridge_http_requests_total', labels + (('method', request.method), ('status', str(response.status_code))))
+            self.observe('bookbridge_http_request_duration_seconds', labels, time.perf_counter() - g.metrics_started)
+        return response
+
+    def _finish_request(self, exception):
+        if 'metrics_started' in g:
+            self.inc('bookbridge_http_requests_in_flight', g.metrics_labels, -1)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.inc('bookbridge_db_pool_connections_total')
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.inc('bookbridge_db_pool_checkouts_total')
+        self.inc('bookbridge_db_pool_checked_out')
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.inc('bookbridge_db_pool_checked_out', value=-1)
+
+    # Leitura
+
+    def _retire_dead_shards(self):
+        alive = []
+        for thread_ref, shard in self._shards:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                alive.append((thread_ref, shard))
+            else:
+                for key, value in list(shard.items()):
+                    self._retired[key] = self._retired.get(key, 0) + value
+        self._shards = alive
+
+    def collect(self):
+        """
+        Soma os shards de todas as threads do processo atual.
+
+        Retorna:
+            dict: O valor de cada amostra, indexado por (nome, labels).
+        """
+        with self._lock:
+            self._retire_dead_shards()
+            samples = dict(self._retired)
+            for _, shard in self._shards:
+                for key, value in list(shard.items()):
+                    samples[key] = samples.get(key, 0) + value
+        return samples
+
+    def _snapshot_path(self, directory, pid):
+        return os.path.join(directory, f'metrics-{pid}.json')
+
+    def flush(self, directory):
+        """
+        Grava o snapshot das métricas do processo atual no diretório compartilhado, de forma atômica.
+        """
+        samples = [[name, [list(label) for label in labels], value] for (name, labels), value in self.collect().items()]
+        descriptor, path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump({'pid': os.getpid(), 'samples': samples}, file)
+        os.replace(path, self._snapshot_path(directory, os.getpid()))
+
+    def _ensure_flusher(self):
+        state = current_app.extensions['metrics']
+        if not state['directory'] or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            directory, interval = state['directory'], state['flush_interval']
+
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.flush(directory)
+                    except OSError:
+                        # Diretório indisponível no momento: tenta de novo no próximo intervalo
+                        continue
+
+            self._flusher = threading.Thread(target=run, name='metrics-flusher', daemon=True)
+            self._flusher.start()
+
+    def collect_all(self, directory):
+        """
+        Soma os snapshots de todos os processos do diretório compartilhado, começando pelo atual.
+        """
+        self.flush(directory)
+        samples = {}
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(snapshot['pid'])
+            for name, labels, value in snapshot['samples']:
+                if not alive and METRICS[_family(name)][0] == 'gauge':
+                    continue
+                key = (name, tuple(tuple(label) for label in labels))
+                samples[key] = samples.get(key, 0) + value
+        return samples
+
+    def render(self, samples):
+        """
+        Formata as amostras no formato de texto do Prometheus, com os buckets dos histogramas acumulados.
+        """
+        families = {}
+        for (name, labels), value in samples.items():
+            families.setdefault(_family(name), []).append((name, labels, value))
+
+        lines = []
+        for family in sorted(families):
+            kind, description = METRICS[family]
+            lines.append(f'# HELP {family} {description}')
+            lines.append(f'# TYPE {family} {kind}')
+            family_samples = families[family]
+            if kind == 'histogram':
+                family_samples = self._histogram_samples(family, family_samples)
+            else:
+                family_samples = sorted(family_samples, key=lambda sample: sample[1])
+            for name, labels, value in family_samples:
+                label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+                lines.append(f'{name}{{{label_text}}} {_format_value(value)}' if labels else f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _histogram_samples(self, family, family_samples):
+        # Os buckets são guardados sem acumular; o formato do Prometheus pede a contagem acumulada até cada limite
+        series = {}
+        for name, labels, value in family_samples:
+            if name == f'{family}_bucket':
+                series.setdefault(labels[:-1], {})[labels[-1][1]] = value
+            else:
+                series.setdefault(labels, {})[name] = value
+
+        samples = []
+        for labels in sorted(series):
+            total = 0
+            for le in [repr(bound) for bound in BUCKETS] + ['+Inf']:
+                total += series[labels].get(le, 0)
+                samples.append((f'{family}_bucket', labels + (('le', le),), total))
+            samples.append((f'{family}_sum', labels, series[labels].get(f'{family}_sum', 0.0)))
+            samples.append((f'{family}_count', labels, series[labels].get(f'{family}_count', 0)))
+        return samples
+
+    def _metrics_view(self):
+        directory = current_app.extensions['metrics']['directory']
+        samples = self.collect_all(directory) if directory else self.collect()
+        return Response(self.render(samples), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+metrics = MetricsRegistry()
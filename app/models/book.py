@@ -1,20 +1,123 @@
+import re
+
+from flask import current_app
+from sqlalchemy import DDL, column, event, table
+
 from sql_alchemy import db
+from .club import Club
+from ..cache import response_cache
 
 class Book(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(100), nullable=False)
+    title = db.Column(db.String(100), nullable=False, unique=True, index=True)
     description = db.Column(db.String(250), nullable=False)
     gender = db.Column(db.String(20), nullable=False)
     registered_by = db.Column(db.String, db.ForeignKey('user.email'), nullable=False)
-    reviews = db.relationship('Review', backref='book', lazy=True)
+    # Agregados das reviews, mantidos pelos eventos de escrita de Review
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reviews = db.relationship('Review', back_populates='book', lazy=True)
+
+    __table_args__ = (
+        # Atende ao filtro por gênero da listagem já na ordem do cursor
+        db.Index('ix_book_gender_id', 'gender', 'id'),
+    )
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 2)
 
     @classmethod
     def book_exists(cls, title):
         return cls.query.filter_by(title=title).first()
+
+    @classmethod
+    def count_by_gender(cls):
+        """
+        Conta os livros de cada gênero em um único GROUP BY.
+        """
+        rows = db.session.execute(db.select(cls.gender, db.func.count(cls.id)).group_by(cls.gender).order_by(cls.gender))
+        return dict(rows.all())
+
+    @classmethod
+    def search(cls, text, limit, offset=0, options=()):
+        """
+        Busca livros pelo título e pela descrição, do mais para o menos relevante.
+
+        No SQLite usa o índice FTS5 `book_fts`, com o último termo como prefixo, em duas faixas: primeiro os livros
+        com todos os termos no título, do título mais curto (o mais próximo da busca) para o mais longo, e depois
+        os demais, pelo BM25 com o título pesando `SEARCH_TITLE_WEIGHT` vezes a descrição. O BM25 custa alguns
+        microssegundos por livro encontrado, então em cada faixa só os `SEARCH_MAX_CANDIDATES` livros mais recentes
+        são ranqueados (0 ranqueia todos); um livro antigo com o termo no título continua aparecendo, mesmo que
+        milhares de livros mais novos citem o termo na descrição. Nos outros bancos, cai para um LIKE em que todos
+        os termos precisam aparecer. `options` são as opções de carregamento da consulta dos livros.
+        """
+        terms = re.findall(r'\w+', text)
+        if not terms:
+            return []
+
+        if db.engine.dialect.name != 'sqlite':
+            query = db.select(cls).options(*options).order_by(cls.title, cls.id)
+            for term in terms:
+                query = query.where(db.or_(cls.title.ilike(f'%{term}%'), cls.description.ilike(f'%{term}%')))
+            return db.session.execute(query.limit(limit).offset(offset)).scalars().all()
+
+        phrases = ' '.join(f'"{term}"' for term in terms) + '*'
+        max_candidates = current_app.config['SEARCH_MAX_CANDIDATES']
+        title_fts, other_fts = book_fts.alias('title_fts'), book_fts.alias('other_fts')
+        # Ordenar pelo tamanho do título evita um segundo BM25, cujo custo fixo pesa nas buscas por prefixo
+        title_hits = (db.select(title_fts.c.rowid, db.literal(0).label('tier'), db.func.length(cls.title).label('rank'))
+                      .select_from(title_fts).join(cls, cls.id == title_fts.c.rowid)
+                      .where(_search_candidates(title_fts, f'title : ({phrases})', max_candidates))
+                      .cte('title_hits'))
+        bm25 = db.func.bm25(other_fts.c.book_fts, current_app.config['SEARCH_TITLE_WEIGHT'], 1.0)
+        other_hits = (db.select(other_fts.c.rowid, db.literal(1).label('tier'), bm25.label('rank'))
+                      .where(_search_candidates(other_fts, phrases, max_candidates),
+                             other_fts.c.rowid.not_in(db.select(title_hits.c.rowid))))
+        hits = db.union_all(db.select(title_hits), other_hits).subquery()
+        hits = db.select(hits).order_by(hits.c.tier, hits.c.rank).limit(limit).offset(offset).subquery()
+
+        query = (db.select(cls).options(*options).join(hits, hits.c.rowid == cls.id)
+                 .order_by(hits.c.tier, hits.c.rank, cls.id))
+        return db.session.execute(query).scalars().all()
+
+    @classmethod
+    def update_rating_aggregates(cls, connection, book_id, count_delta, sum_delta):
+        book = cls.__table__
+        connection.execute(
+            db.update(book)
+            .where(book.c.id == book_id)
+            .values(rating_count=book.c.rating_count + count_delta, rating_sum=book.c.rating_sum + sum_delta)
+        )
+
+    @classmethod
+    def repair_rating_aggregates(cls, connection=None):
+        from .review import Review
+
+        book, review = cls.__table__, Review.__table__
+        reviews_of_book = review.c.book_id == book.c.id
+        statement = db.update(book).values(
+            rating_count=db.select(db.func.count(review.c.id)).where(reviews_of_book).scalar_subquery(),
+            rating_sum=db.select(db.func.coalesce(db.func.sum(review.c.rating), 0)).where(reviews_of_book).scalar_subquery()
+        )
+        if connection is not None:
+            return connection.execute(statement).rowcount
+
+        result = db.session.execute(statement)
+        db.session.commit()
+        return result.rowcount
     
+    def _cache_tags(self):
+        titles = {self.title, *db.inspect(self).attrs.title.history.deleted}
+        return ['books', *(f'book:{title}' for title in titles)]
+
     def save_book(self):
+        tags = self._cache_tags()
         db.session.add(self)
         db.session.commit()
+        response_cache.invalidate(*tags)
     
     def update_book(self, title, description, gender, registered_by):
         self.title = title
@@ -23,5 +126,67 @@ class Book(db.Model):
         self.registered_by = registered_by
     
     def delete_book(self):
+        tags = self._cache_tags()
         db.session.delete(self)
-        db.session.commit()  
\ No newline at end of file
+        db.session.commit()
+        Club.invalidate_stats()
+        response_cache.invalidate(*tags)  
+
+
+# Índice de busca textual (SQLite FTS5) sobre título e descrição, sincronizado por triggers.
+# Só as colunas indexadas disparam o trigger de UPDATE, para não pesar nas atualizações de agregados,
+# e os índices de prefixo deixam rápidas as buscas pelo último termo incompleto.
+book_fts = table('book_fts', column('rowid'), column('book_fts'))
+
+
+def _search_candidates(fts, query, max_candidates):
+    # Livros que casam com a busca; com `max_candidates`, só os mais recentes, por uma faixa de rowid
+    # que o FTS5 aplica antes de calcular o ranking
+    matches = fts.c.book_fts.op('MATCH')(query)
+    if not max_candidates:
+        return matches
+    window = book_fts.alias()
+    oldest_candidate = (db.select(window.c.rowid).where(window.c.book_fts.op('MATCH')(query))
+                        .order_by(window.c.rowid.desc())
+                        .limit(1).offset(max_candidates - 1)
+                        .scalar_subquery())
+    return db.and_(matches, fts.c.rowid >= db.func.coalesce(oldest_candidate, 0))
+
+SEARCH_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5("
+    "title, description, content='book', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+    "CREATE TRIGGER IF NOT EXISTS book_fts_ai AFTER INSERT ON book BEGIN "
+    "INSERT INTO book_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS book_fts_ad AFTER DELETE ON book BEGIN "
+    "INSERT INTO book_fts (book_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS book_fts_au AFTER UPDATE OF title, description ON book BEGIN "
+    "INSERT INTO book_fts (book_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO book_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+)
+
+
+def create_search_index(connection):
+    """
+    Cria o índice de busca de um banco existente e o preenche com os livros já cadastrados.
+    """
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(db.text(statement))
+    connection.execute(db.text("INSERT INTO book_fts (book_fts) VALUES ('rebuild')"))
+
+
+for statement in SEARCH_INDEX_DDL:
+    event.listen(Book.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Book.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS book_fts').execute_if(dialect='sqlite'))
+
+
+# Mantém a cópia do título nas resenhas (Review.book_title) na mesma transação da renomeação do livro
+@event.listens_for(Book, 'after_update')
+def _rename_book_in_reviews(mapper, connection, book):
+    history = db.inspect(book).attrs.title.history
+    if not history.deleted:
+        return
+
+    from .review import Review
+
+    review = Review.__table__
+    connection.execute(db.update(review).where(review.c.book_id == book.id).values(book_title=book.title))
\ No newline at end of file
@@ -0,0 +1,40 @@
+from sqlalchemy import event
+
+from sql_alchemy import db
+from .book import Book
+
+# Os livros mais parecidos com cada livro ("quem leu também gostou"), pré-calculados por app/similarity.py
+class BookSimilarity(db.Model):
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    similar_book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        # Atende à consulta dos vizinhos de um livro já na ordem de similaridade
+        db.Index('ix_book_similarity_book_id_score', 'book_id', 'score'),
+    )
+
+    @classmethod
+    def similar_to(cls, title, limit):
+        """
+        Retorna os livros mais parecidos com o livro do título, em uma única consulta pelo índice (book_id, score).
+
+        Retorna:
+            list: Tuplas (livro, similaridade), da maior para a menor similaridade.
+        """
+        book_id = db.select(Book.id).where(Book.title == title).scalar_subquery()
+        query = (db.select(Book, cls.score)
+                 .join(cls, cls.similar_book_id == Book.id)
+                 .where(cls.book_id == book_id)
+                 .order_by(cls.score.desc(), Book.id)
+                 .limit(limit))
+        return db.session.execute(query).all()
+
+
+# Remove as similaridades do livro na mesma transação da exclusão, dos dois lados do par
+@event.listens_for(Book, 'before_delete')
+def _delete_book_similarities(mapper, connection, book):
+    similarity = BookSimilarity.__table__
+    connection.execute(db.delete(similarity).where(
+        db.or_(similarity.c.book_id == book.id, similarity.c.similar_book_id == book.id)
+    ))
@@ -1,4 +1,9 @@
+import time
+
+from flask import current_app
+
 from sql_alchemy import db
+from ..cache import response_cache
 
 # Tabela de associação para a relação muitos-para-muitos entre Club e Book
 club_book = db.Table('club_book',
@@ -8,22 +13,93 @@ club_book = db.Table('club_book',
 
 class Club(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, unique=True, index=True)
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     books = db.relationship('Book', secondary=club_book, backref=db.backref('clubs', lazy='dynamic'))
     
     @classmethod
     def club_exists(cls, name):
         return cls.query.filter_by(name=name).first()
+
+    @classmethod
+    def average_books_read(cls):
+        """
+        Calcula a média de livros por clube em uma única consulta agregada sobre club_book e club.
+
+        Com `CLUB_STATS_CACHE` ativo, o resultado fica em cache por até `CLUB_STATS_CACHE_TTL` segundos
+        e é descartado a cada escrita de clube ou exclusão de livro.
+        """
+        if not current_app.config['CLUB_STATS_CACHE']:
+            return cls._compute_average_books_read()
+
+        stats = current_app.extensions.setdefault('club_stats', {})
+        if 'average_books_read' not in stats or time.monotonic() >= stats['expires_at']:
+            stats['average_books_read'] = cls._compute_average_books_read()
+            stats['expires_at'] = time.monotonic() + current_app.config['CLUB_STATS_CACHE_TTL']
+        return stats['average_books_read']
+
+    @classmethod
+    def _compute_average_books_read(cls):
+        total_books, total_clubs = db.session.execute(db.select(
+            db.select(db.func.count()).select_from(club_book).scalar_subquery(),
+            db.select(db.func.count(cls.id)).scalar_subquery()
+        )).one()
+        if not total_clubs:
+            return 0
+        return round(total_books / total_clubs, 2)
+
+    def has_book(self, book_id):
+        """
+        Verifica se o livro já está na lista do clube com um EXISTS pela chave primária de club_book,
+        sem carregar a lista.
+        """
+        return db.session.execute(db.select(
+            db.exists().where(club_book.c.club_id == self.id, club_book.c.book_id == book_id)
+        )).scalar()
+
+    def find_books(self, titles):
+        """
+        Resolve os títulos em uma única consulta IN, indicando para cada livro se ele já está na lista do clube.
+
+        Retorna:
+            list: Tuplas (id, título, já está no clube) dos títulos que existem.
+        """
+        from .book import Book
+
+        in_club = db.exists().where(club_book.c.club_id == self.id, club_book.c.book_id == Book.id)
+        return db.session.execute(db.select(Book.id, Book.title, in_club).where(Book.title.in_(titles))).all()
+
+    def add_books(self, book_ids):
+        """
+        Adiciona os livros à lista do clube com um único INSERT em club_book, sem carregar a lista.
+
+        Os livros devem ter sido verificados antes (`has_book` ou `find_books`): um livro repetido viola a chave primária.
+        """
+        db.session.execute(club_book.insert().values([{'club_id': self.id, 'book_id': book_id} for book_id in book_ids]))
+        self.save_club()
+
+    @classmethod
+    def invalidate_stats(cls):
+        current_app.extensions.get('club_stats', {}).clear()
     
+    def _cache_tags(self):
+        names = {self.name, *db.inspect(self).attrs.name.history.deleted}
+        return ['clubs', *(f'club:{name}' for name in names)]
+
     def save_club(self):
+        tags = self._cache_tags()
         db.session.add(self)
         db.session.commit()
+        self.invalidate_stats()
+        response_cache.invalidate(*tags)
     
     def update_club(self, name, owner_id):
         self.name = name
         self.owner_id = owner_id
 
     def delete_club(self):
+        tags = self._cache_tags()
         db.session.delete(self)
-        db.session.commit()  
\ No newline at end of file
+        db.session.commit()
+        self.invalidate_stats()
+        response_cache.invalidate(*tags)  
\ No newline at end of file
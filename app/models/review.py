@@ -1,28 +1,97 @@
+from sqlalchemy import event
+from sqlalchemy.orm import validates
+
 from sql_alchemy import db
 from datetime import datetime, timezone
+from .book import Book
+from ..cache import response_cache
+from ..leaderboard import record_rating_change
+from ..similarity import record_similarity_change
 
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.String(500))
     user_email = db.Column(db.String(80), db.ForeignKey('user.email'), nullable=False)
-    book_title = db.Column(db.String(100), db.ForeignKey('book.title'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
+    # Cópia do título do livro para as respostas, atualizada quando o livro é renomeado
+    book_title = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    book = db.relationship('Book', back_populates='reviews')
+
+    __table_args__ = (
+        # Atende à listagem das resenhas de um livro já na ordem de criação
+        db.Index('ix_review_book_id_created_at', 'book_id', 'created_at'),
+        # Atende à exportação incremental (since) na ordem de criação
+        db.Index('ix_review_created_at', 'created_at'),
+        # Atende às coocorrências de leitores na atualização incremental dos livros parecidos: com as duas
+        # igualdades (leitor e livro), o SQLite prefere este índice ao de book_id, que nos livros populares é enorme
+        db.Index('ix_review_user_email_book_id', 'user_email', 'book_id', 'rating'),
+    )
 
     @classmethod
     def review_exists(cls, id):
         return cls.query.filter_by(id=id).fisrt()
+
+    @validates('book')
+    def _copy_book_title(self, key, book):
+        self.book_title = book.title
+        return book
     
+    def _cache_tags(self):
+        titles = {self.book_title, *db.inspect(self).attrs.book_title.history.deleted}
+        return ['reviews', *(f'book:{title}' for title in titles)]
+
     def save_review(self):
+        tags = self._cache_tags()
         db.session.add(self)
         db.session.commit()
+        response_cache.invalidate(*tags)
     
-    def update_review(self, rating, comment, user_email, book_title):
+    def update_review(self, rating, comment, user_email, book):
         self.rating = rating
         self.comment = comment
         self.user_email = user_email
-        self.book_title = book_title
+        self.book = book
 
     def delete_review(self):
+        tags = self._cache_tags()
         db.session.delete(self)
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+        response_cache.invalidate(*tags)
+
+
+# Mantém Book.rating_count/rating_sum na mesma transação de qualquer escrita de Review
+# (save_review, update_review seguido de save_review e delete_review) e avisa o ranking e os livros parecidos
+def _previous_value(review, attribute):
+    history = db.inspect(review).attrs[attribute].history
+    return history.deleted[0] if history.deleted else getattr(review, attribute)
+
+
+def _update_rating_aggregates(review, connection, book_id, count_delta, sum_delta):
+    Book.update_rating_aggregates(connection, book_id, count_delta, sum_delta)
+    session = db.object_session(review)
+    record_rating_change(session, book_id, count_delta, sum_delta)
+    record_similarity_change(session, book_id, review.user_email)
+
+
+@event.listens_for(Review, 'after_insert')
+def _add_to_rating_aggregates(mapper, connection, review):
+    _update_rating_aggregates(review, connection, review.book_id, 1, int(review.rating))
+
+
+@event.listens_for(Review, 'after_update')
+def _move_rating_aggregates(mapper, connection, review):
+    old_book_id, old_rating = _previous_value(review, 'book_id'), int(_previous_value(review, 'rating'))
+    new_book_id, new_rating = review.book_id, int(review.rating)
+    if old_book_id == new_book_id:
+        if old_rating != new_rating:
+            _update_rating_aggregates(review, connection, new_book_id, 0, new_rating - old_rating)
+        return
+    _update_rating_aggregates(review, connection, old_book_id, -1, -old_rating)
+    _update_rating_aggregates(review, connection, new_book_id, 1, new_rating)
+
+
+@event.listens_for(Review, 'after_delete')
+def _remove_from_rating_aggregates(mapper, connection, review):
+    _update_rating_aggregates(review, connection, _previous_value(review, 'book_id'), -1, -int(_previous_value(review, 'rating')))
\ No newline at end of file
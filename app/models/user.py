@@ -1,4 +1,5 @@
 from sql_alchemy import db
+from ..cache import response_cache
 import re
 
 class User(db.Model):
@@ -19,11 +20,14 @@ class User(db.Model):
     def save_user(self):
         db.session.add(self)
         db.session.commit()
+        response_cache.invalidate(f'user:{self.id}')
     
     def update_user(self, email, password):
         self.email = email
         self.password = password
 
     def delete_user(self):
+        tag = f'user:{self.id}'
         db.session.delete(self)
-        db.session.commit()    
\ No newline at end of file
+        db.session.commit()
+        response_cache.invalidate(tag)    
\ No newline at end of file
@@ -0,0 +1,92 @@
+from flask import Response, current_app, request, stream_with_context
+
+def get_keyset_args():
+    """
+    Lê os parâmetros de paginação por cursor da query string.
+
+    `after` é o último id recebido pelo cliente (0 para a primeira página) e `limit`
+    é o tamanho da página, limitado por `MAX_PAGE_SIZE`.
+
+    Retorna:
+        tuple: O cursor `after` e o `limit` da página.
+    """
+    after = request.args.get('after', 0, type=int)
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    return after, limit
+
+
+def get_offset_args():
+    """
+    Lê os parâmetros de paginação por deslocamento (`offset` e `limit`) da query string.
+
+    Usada só onde a ordem não é pela chave primária, como nos resultados ranqueados da busca.
+
+    Retorna:
+        tuple: O `offset` e o `limit` da página.
+    """
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    return offset, limit
+
+
+def offset_response(items, limit, offset):
+    """
+    Monta a resposta JSON de uma página, informando o próximo `offset` no header `X-Next-Offset`
+    quando a página veio cheia.
+    """
+    response = current_app.json.response(items)
+    if len(items) == limit:
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return response
+
+
+def stream_requested():
+    """
+    Indica se o cliente pediu a resposta em modo streaming (`?stream=true`).
+    """
+    return request.args.get('stream', 'false').lower() in ('1', 'true', 'yes')
+
+
+def paginate_by_id(query, model, after, limit):
+    """
+    Aplica paginação por cursor (keyset) ordenada pela chave primária.
+
+    Retorna:
+        list: Os registros da página, com id maior que `after`.
+    """
+    return query.filter(model.id > after).order_by(model.id).limit(limit).all()
+
+
+def keyset_response(items, limit, next_cursor):
+    """
+    Monta a resposta JSON de uma página, informando o próximo cursor no header `X-Next-Cursor`
+    quando a página veio cheia.
+    """
+    response = current_app.json.response(items)
+    if len(items) == limit:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+
+def stream_json_array(chunks):
+    """
+    Gera uma resposta JSON em streaming a partir de um iterável de listas (chunks).
+
+    Cada chunk é serializado e enviado assim que fica pronto, de forma que o servidor
+    nunca precisa manter a lista completa em memória.
+
+    Retorna:
+        Response: Uma resposta `application/json` em streaming contendo um único array.
+    """
+    def generate():
+        yield '['
+        first = True
+        for chunk in chunks:
+            for item in chunk:
+                yield ('' if first else ',') + current_app.json.dumps(item)
+                first = False
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
@@ -0,0 +1,54 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+    """
+    Gera e confere hashes de senha fora das threads de requisição.
+
+    Com `PASSWORD_HASH_EXECUTOR = 'process'`, o trabalho (lento e intensivo em CPU de propósito) vai para um
+    pool de `PASSWORD_HASH_WORKERS` processos, limitando quantos núcleos uma rajada de logins pode ocupar.
+    Com `'inline'`, o hash é calculado na própria thread da requisição.
+    O método e o tamanho do salt vêm de `PASSWORD_HASH_METHOD` e `PASSWORD_HASH_SALT_LENGTH`.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        executor = app.config['PASSWORD_HASH_EXECUTOR']
+        if executor not in ('inline', 'process'):
+            raise ValueError(f'Unknown password hash executor: {executor}')
+        app.extensions['password_hasher'] = self
+
+    def _get_executor(self):
+        # Criado sob demanda e recriado depois de um fork (ex.: workers do gunicorn)
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=current_app.config['PASSWORD_HASH_WORKERS'])
+                self._executor_pid = os.getpid()
+                atexit.register(self._executor.shutdown, wait=False, cancel_futures=True)
+            return self._executor
+
+    def _run(self, function, *args):
+        if current_app.config['PASSWORD_HASH_EXECUTOR'] == 'inline':
+            return function(*args)
+        future = self._get_executor().submit(function, *args)
+        return future.result(timeout=current_app.config['PASSWORD_HASH_TIMEOUT'])
+
+    def hash(self, password):
+        config = current_app.config
+        return self._run(generate_password_hash, password, config['PASSWORD_HASH_METHOD'], config['PASSWORD_HASH_SALT_LENGTH'])
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,62 @@
+import logging
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from sql_alchemy import db
+
+logger = logging.getLogger('bookbridge.queries')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'db_queries' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'db_queries' in g and conn.info.get('query_started'):
+        g.db_time += time.perf_counter() - conn.info['query_started'].pop()
+        g.db_queries += 1
+
+
+def init_query_stats(app):
+    """
+    Conta os comandos SQL e soma o tempo gasto no banco em cada requisição, informando os valores
+    nos headers `X-DB-Queries` e `Server-Timing` da resposta.
+
+    Com `QUERY_BUDGET_LOG_ENABLED`, as requisições que passam de `QUERY_BUDGET_STATEMENTS` comandos
+    ou de `QUERY_BUDGET_DB_MS` milissegundos no banco são registradas no logger `bookbridge.queries`.
+    Os comandos executados durante respostas em streaming, depois do envio dos headers, não entram na conta.
+    """
+    if not app.config['QUERY_STATS_ENABLED']:
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_query_stats():
+        g.db_queries = 0
+        g.db_time = 0.0
+        g.query_stats_started = time.perf_counter()
+
+    @app.after_request
+    def add_query_stats_headers(response):
+        if 'db_queries' not in g:
+            return response
+
+        db_ms = g.db_time * 1000
+        total_ms = (time.perf_counter() - g.query_stats_started) * 1000
+        response.headers['X-DB-Queries'] = str(g.db_queries)
+        response.headers['Server-Timing'] = f'db;dur={db_ms:.2f};desc="{g.db_queries} queries", app;dur={total_ms:.2f}'
+
+        config = current_app.config
+        max_statements, max_db_ms = config['QUERY_BUDGET_STATEMENTS'], config['QUERY_BUDGET_DB_MS']
+        if config['QUERY_BUDGET_LOG_ENABLED'] and (g.db_queries > max_statements or db_ms > max_db_ms):
+            logger.warning('Query budget exceeded: %s %s ran %d statements in %.2f ms (budget: %d statements, %.0f ms)',
+                           request.method, request.full_path.rstrip('?'), g.db_queries, db_ms, max_statements, max_db_ms)
+        return response
@@ -0,0 +1,104 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler que descarta o registro quando a fila está cheia, em vez de bloquear a requisição.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def init_request_logging(app):
+    """
+    Configura o log de requisições: um registro JSON compacto por requisição, gravado em
+    `REQUEST_LOG_FILE` por uma thread em segundo plano.
+
+    Apenas uma fração `REQUEST_LOG_SAMPLE_RATE` das requisições é registrada (respostas 5xx sempre são),
+    e só os headers listados em `REQUEST_LOG_HEADERS` entram no registro. A thread é recriada no primeiro
+    registro depois de um fork (ex.: `gunicorn --preload`), já que o processo filho não herda as threads do pai.
+    """
+    if not app.config['REQUEST_LOG_ENABLED']:
+        return
+
+    # Logger próprio da aplicação, fora da hierarquia global, para não duplicar handlers entre apps
+    logger = logging.Logger('bookbridge.requests', logging.INFO)
+    handler = DroppingQueueHandler(None)
+    logger.addHandler(handler)
+
+    sample_rate = app.config['REQUEST_LOG_SAMPLE_RATE']
+    allowed_headers = app.config['REQUEST_LOG_HEADERS']
+    state = app.extensions['request_log'] = {'listener': None, 'handler': handler, 'pid': None, 'lock': threading.Lock()}
+    _ensure_listener(app, state)
+    atexit.register(stop_request_logging, app)
+
+    @app.before_request
+    def start_request_log():
+        g.request_log_started = time.perf_counter()
+        g.request_log_sampled = sample_rate >= 1 or random.random() < sample_rate
+
+    @app.after_request
+    def write_request_log(response):
+        if 'request_log_started' not in g or not (g.request_log_sampled or response.status_code >= 500):
+            return response
+
+        record = {
+            'ts': round(time.time(), 3),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - g.request_log_started) * 1000, 3),
+            'ip': request.remote_addr
+        }
+        headers = {name: request.headers[name] for name in allowed_headers if name in request.headers}
+        if headers:
+            record['headers'] = headers
+        _ensure_listener(app, state)
+        logger.info(json.dumps(record, separators=(',', ':')))
+        return response
+
+
+def _ensure_listener(app, state):
+    # Fila, arquivo e thread novos em cada processo: os do pai podem ter ficado com locks presos no fork
+    if state['pid'] == os.getpid():
+        return
+    with state['lock']:
+        if state['pid'] == os.getpid():
+            return
+        log_queue = queue.Queue(maxsize=app.config['REQUEST_LOG_QUEUE_SIZE'])
+        file_handler = logging.FileHandler(app.config['REQUEST_LOG_FILE'])
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+        listener = QueueListener(log_queue, file_handler)
+        listener.start()
+        state['handler'].queue = log_queue
+        state['handler'].dropped = 0
+        state['listener'], state['pid'] = listener, os.getpid()
+
+
+def stop_request_logging(app):
+    """
+    Grava os registros que ainda estão na fila e encerra a thread de log da aplicação.
+    """
+    state = app.extensions.get('request_log')
+    if state and state['pid'] == os.getpid() and state['listener']._thread is not None:
+        state['listener'].stop()
+        for handler in state['listener'].handlers:
+            handler.close()
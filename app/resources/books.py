@@ -1,8 +1,18 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import io
 
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required, current_user
+
+from sql_alchemy import db
 from ..models.book import Book
+from ..models.book_similarity import BookSimilarity
 from ..models.user import User
+from ..cache import add_cache_tags, response_cache
+from ..importer import import_books, iter_rows
+from ..leaderboard import get_leaderboard
+from ..serializers import BOOK, get_fieldset
+from ..pagination import (get_keyset_args, get_offset_args, keyset_response, offset_response, paginate_by_id,
+                          stream_json_array, stream_requested)
 
 books_blueprint = Blueprint('books_blueprint', __name__)
 
@@ -22,7 +32,6 @@ def register_book():
     title = data['title']
     description = data['description']
     gender = data['gender']
-    current_user = User.query.filter_by(id=get_jwt_identity()).first()
 
     if Book.book_exists(title):
         return jsonify({"message" : "Book already exists!"}), 409  # Conflict
@@ -36,45 +45,155 @@ def register_book():
     return jsonify({"message" : "Book created successfully!"}), 201  # Created
 
 
+@books_blueprint.route('/books/bulk', methods=['POST'])
+@jwt_required()
+def register_books_in_bulk():
+    """
+    Registra livros em lote a partir de um corpo CSV (`text/csv`) ou NDJSON (`application/x-ndjson`).
+
+    O corpo é lido em streaming e processado em lotes de `batch_size` linhas (query param opcional),
+    cada lote com uma única transação. Todos os livros ficam registrados pelo usuário atualmente autenticado.
+    
+    Retorna:
+        Response: Uma resposta JSON com a quantidade de livros inseridos e os erros por linha, ou uma mensagem de erro e o código de status HTTP apropriado.
+    """
+    formats = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson'}
+    if request.mimetype not in formats:
+        return jsonify({"message" : "Unsupported content type! Use text/csv or application/x-ndjson."}), 415  # Unsupported Media Type
+
+    batch_size = max(1, min(request.args.get('batch_size', 1000, type=int), 10000))
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', errors='surrogateescape', newline='')
+    report = import_books(iter_rows(stream, formats[request.mimetype]), registered_by=current_user.email, batch_size=batch_size)
+
+    return jsonify({"message" : "Books imported!", **report.to_dict()}), 200  # OK
+
+
 @books_blueprint.route('/books', methods=['GET'])
+@response_cache.cached('books', 'reviews')
 def get_all_books():
     """
-    Retorna todos os livros cadastrados, incluindo todas as reviews relacionadas.
+    Retorna os livros cadastrados, incluindo todas as reviews relacionadas, paginados por cursor.
 
-    Este endpoint não recebe parâmetros.
+    Este endpoint recebe os parâmetros opcionais `after` (último id recebido), `limit` (tamanho da página)
+    e `gender`, que filtra os livros pelo gênero.
+    Quando a página vem cheia, o header `X-Next-Cursor` traz o valor de `after` da próxima página.
+    Com `stream=true`, todos os livros a partir de `after` são enviados em streaming, em chunks lidos do banco.
+    Em ambos os modos as reviews de cada página são carregadas em uma única consulta.
+    Com `fields` (ex.: `fields=id,title`) só os campos pedidos são lidos do banco e as reviews só vêm com `include=reviews`.
     
     Retorna:
-        Response: Uma resposta JSON com a lista de todos os livros cadastrados e suas reviews associadas.
+        Response: Uma resposta JSON com a lista dos livros cadastrados e suas reviews associadas.
+    """
+    try:
+        fieldset = get_fieldset(BOOK, default_include=('reviews',))
+    except ValueError as error:
+        return jsonify({"message" : str(error)}), 400  # Bad Request
+
+    after, limit = get_keyset_args()
+    query = Book.query.options(*fieldset.options())
+    if 'gender' in request.args:
+        query = query.filter(Book.gender == request.args['gender'])
+
+    if stream_requested():
+        return stream_json_array(_iter_book_chunks(query, after, fieldset))
+
+    books = paginate_by_id(query, Book, after, limit)
+    all_books = [fieldset.dump(book) for book in books]
+    
+    return keyset_response(all_books, limit, books[-1].id if books else after), 200  # OK
+
+
+def _iter_book_chunks(query, after, fieldset):
+    """
+    Percorre o catálogo em chunks de `STREAM_CHUNK_SIZE` livros, paginando por cursor.
+    """
+    chunk_size = current_app.config['STREAM_CHUNK_SIZE']
+    while True:
+        books = paginate_by_id(query, Book, after, chunk_size)
+        if not books:
+            return
+        yield [fieldset.dump(book) for book in books]
+        after = books[-1].id
+        # Libera os objetos já enviados para manter o uso de memória constante
+        db.session.expunge_all()
+
+
+@books_blueprint.route('/books/facets', methods=['GET'])
+@response_cache.cached('books')
+def get_book_facets():
     """
-    books = Book.query.all()
-    all_books = [] 
+    Retorna a quantidade de livros cadastrados em cada gênero.
+
+    A contagem é feita no banco em uma única consulta agregada e fica em cache até a próxima escrita de livros.
     
-    for book in books: 
-        reviews = []
-        for review in book.reviews:
-            review_data = {
-                'id': review.id,
-                'rating': review.rating,
-                'comment': review.comment,
-                'user_email': review.user_email,
-                'created_at': review.created_at
-            }
-            reviews.append(review_data)
-        
-        book_data = {
-            'id': book.id,
-            'title': book.title,
-            'description': book.description,
-            'gender': book.gender,
-            'registered_by': book.registered_by,
-            'reviews': reviews
-        } 
-        all_books.append(book_data) 
+    Retorna:
+        Response: Uma resposta JSON com o número de livros por gênero.
+    """
+    return jsonify({"gender" : Book.count_by_gender()}), 200  # OK
+
+
+@books_blueprint.route('/books/search', methods=['GET'])
+@response_cache.cached('books', 'reviews')
+def search_books():
+    """
+    Busca livros pelo título e pela descrição.
+
+    Este endpoint recebe o texto da busca no parâmetro `q` e os parâmetros opcionais `offset` e `limit`.
+    Os resultados vêm do mais para o menos relevante, sem as reviews (a não ser com `include=reviews`);
+    quando a página vem cheia, o header `X-Next-Offset` traz o `offset` da próxima página.
+    Também aceita `fields`, como em `/books`.
     
-    return jsonify(all_books), 200  # OK
+    Retorna:
+        Response: Uma resposta JSON com a lista dos livros encontrados, ou uma mensagem de erro e o código de status HTTP apropriado.
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({"message" : "Missing search query!"}), 400  # Bad Request
+    try:
+        fieldset = get_fieldset(BOOK)
+    except ValueError as error:
+        return jsonify({"message" : str(error)}), 400  # Bad Request
+
+    offset, limit = get_offset_args()
+    books = Book.search(text, limit, offset, options=fieldset.options())
+    results = [fieldset.dump(book) for book in books]
+
+    return offset_response(results, limit, offset), 200  # OK
+
+
+@books_blueprint.route('/books/top', methods=['GET'])
+def get_top_books():
+    """
+    Retorna os livros mais bem avaliados, pela média bayesiana das avaliações.
+
+    Este endpoint recebe os parâmetros opcionais `limit` (quantidade de livros) e `min_reviews` (mínimo de avaliações
+    do livro, um dos valores de `TOP_BOOKS_MIN_REVIEWS_LEVELS`). O ranking fica em memória e é atualizado a cada
+    resenha, então só os `limit` livros do topo são lidos do banco, pela chave primária.
+
+    Retorna:
+        Response: Uma resposta JSON com a lista dos livros, da maior para a menor nota, ou uma mensagem de erro e o código de status HTTP apropriado.
+    """
+    limit = max(1, min(request.args.get('limit', 10, type=int), current_app.config['MAX_PAGE_SIZE']))
+    min_reviews = request.args.get('min_reviews', current_app.config['TOP_BOOKS_MIN_REVIEWS'], type=int)
+    try:
+        ranking = get_leaderboard().top(limit, min_reviews)
+    except ValueError as error:
+        return jsonify({"message" : str(error)}), 400  # Bad Request
+    books = {book.id: book for book in Book.query.filter(Book.id.in_([book_id for book_id, *_ in ranking]))}
+    results = [{
+        'id': book_id,
+        'title': books[book_id].title,
+        'gender': books[book_id].gender,
+        'rating_count': count,
+        'average_rating': round(total / count, 2),
+        'score': round(score, 4)
+    } for book_id, count, total, score in ranking if book_id in books]
+
+    return jsonify(results), 200  # OK
 
 
 @books_blueprint.route('/books/<string:title>', methods=['GET'])
+@response_cache.cached('book:{title}')
 def get_book(title):
     """
     Retorna informações de um livro existente, incluindo todas as reviews relacionadas.
@@ -89,25 +208,64 @@ def get_book(title):
 
     if not book:
         return jsonify({"message" : "Book not exists!"}), 404  # Not Found
+
+    return _book_detail(book)
+
+
+@books_blueprint.route('/books/id/<int:id>', methods=['GET'])
+@response_cache.cached()
+def get_book_by_id(id):
+    """
+    Retorna informações de um livro existente pela chave primária, incluindo todas as reviews relacionadas.
+
+    Este endpoint recebe o ID do livro pela URL e retorna as mesmas informações de `/books/<title>`.
     
-    reviews = []
-    for review in book.reviews:
-        review_data = { 
-            'id': review.id, 
-            'rating': review.rating, 
-            'comment': review.comment, 
-            'user_email': review.user_email, 
-            'created_at': review.created_at 
-        } 
-        reviews.append(review_data)
-
-    return jsonify({
-        "title" : book.title,
-        "description" : book.description,
-        "gender" : book.gender,
-        "registered_by" : book.registered_by,
-        "reviews": reviews
-    }), 200  # OK
+    Retorna:
+        Response: Uma resposta JSON com as informações do livro e suas reviews, ou uma mensagem de erro e o código de status HTTP apropriado.
+    """
+    book = db.session.get(Book, id)
+
+    if not book:
+        return jsonify({"message" : "Book not exists!"}), 404  # Not Found
+
+    add_cache_tags(f'book:{book.title}')
+    return _book_detail(book)
+
+
+# O detalhe do livro não traz o id, que o cliente já conhece pela URL
+BOOK_DETAIL = BOOK.fieldset(['title', 'description', 'gender', 'registered_by', 'reviews'])
+
+
+def _book_detail(book):
+    return jsonify(BOOK_DETAIL.dump(book)), 200  # OK
+
+
+@books_blueprint.route('/books/<string:title>/similar', methods=['GET'])
+def get_similar_books(title):
+    """
+    Retorna os livros de que gostaram os mesmos leitores do livro ("quem leu também gostou").
+
+    Este endpoint recebe o título do livro pela URL e o parâmetro opcional `limit`. As similaridades são pré-calculadas
+    (comando `flask rebuild-similar-books` e a cada resenha), então a resposta vem de uma única consulta indexada.
+
+    Parâmetros:
+        title (str): O título do livro.
+
+    Retorna:
+        Response: Uma resposta JSON com a lista dos livros parecidos, ou uma mensagem de erro e o código de status HTTP apropriado.
+    """
+    limit = max(1, min(request.args.get('limit', 10, type=int), current_app.config['SIMILAR_BOOKS_NEIGHBOURS']))
+    similar = BookSimilarity.similar_to(title, limit)
+
+    if not similar and not Book.book_exists(title):
+        return jsonify({"message" : "Book not exists!"}), 404  # Not Found
+
+    return jsonify([{
+        'id': book.id,
+        'title': book.title,
+        'gender': book.gender,
+        'score': round(score, 4)
+    } for book, score in similar]), 200  # OK
 
 
 @books_blueprint.route('/books/<string:title>', methods=['PUT'])
@@ -123,7 +281,6 @@ def edit_book(title):
         Response: Uma resposta JSON com uma mensagem de sucesso ou erro e o código de status HTTP apropriado.
     """
     data = request.get_json()
-    current_user = User.query.filter_by(id=get_jwt_identity()).first()
     book = Book.query.filter_by(title=title).first()
 
     if not book:
@@ -166,7 +323,6 @@ def delete_book(title):
     Retorna:
         Response: Uma resposta JSON com uma mensagem de sucesso ou erro e o código de status HTTP apropriado.
     """
-    current_user = User.query.filter_by(id=get_jwt_identity()).first()
     book = Book.query.filter_by(title=title).first()
 
     if not book:
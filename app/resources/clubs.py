@@ -1,9 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
+from sql_alchemy import db
+
 from ..models.club import Club
 from ..models.user import User
 from ..models.book import Book
+from ..serializers import CLUB, USER, get_fieldset
+from ..pagination import get_keyset_args, keyset_response, paginate_by_id
+from ..cache import add_cache_tags, response_cache
 
 clubs_blueprint = Blueprint('clubs_blueprint', __name__)
 
@@ -36,54 +41,35 @@ def register_club():
 
 
 @clubs_blueprint.route('/clubs', methods=['GET'])
+@response_cache.cached('clubs', 'books', 'reviews')
 def get_all_clubs():
     """
-    Retorna uma lista de todos os clubes, incluindo informações detalhadas dos livros e reviews relacionados.
+    Retorna uma lista dos clubes, incluindo informações detalhadas dos livros e reviews relacionados, paginada por cursor.
 
-    Este endpoint não recebe parâmetros.
+    Este endpoint recebe os parâmetros opcionais `after` (último id recebido) e `limit` (tamanho da página).
+    Livros e reviews são carregados de forma antecipada (selectin), então cada página custa sempre
+    três consultas (clubes, livros e reviews), independente da quantidade de dados.
+    Com `fields` (ex.: `fields=id,name`) só os campos pedidos são lidos do banco e os livros só vêm com
+    `include=books` (ou `include=books.reviews`, para trazer também as reviews de cada livro).
 
     Retorna:
-        Response: Uma resposta JSON com a lista de todos os clubes e suas respectivas informações detalhadas.
-    """
-    clubs = Club.query.all()
-    all_clubs = []
-
-    for club in clubs:
-        books = []
-        for book in club.books:
-            reviews = []
-            for review in book.reviews:
-                review_data = {
-                    'id': review.id,
-                    'rating': review.rating,
-                    'comment': review.comment,
-                    'user_email': review.user_email,
-                    'created_at': review.created_at
-                }
-                reviews.append(review_data)
-            
-            book_data = {
-                'id': book.id,
-                'title': book.title,
-                'description': book.description,
-                'gender': book.gender,
-                'registered_by': book.registered_by,
-                'reviews': reviews
-            } 
-            books.append(book_data)
-        
-        club_data = {
-            'id': club.id,
-            'name': club.name,
-            'owner_id': club.owner_id,
-            'books': books
-        }
-        all_clubs.append(club_data)
+        Response: Uma resposta JSON com a lista dos clubes e suas respectivas informações detalhadas.
+    """
+    try:
+        fieldset = get_fieldset(CLUB, default_include=('books.reviews',))
+    except ValueError as error:
+        return jsonify({"message" : str(error)}), 400  # Bad Request
+
+    after, limit = get_keyset_args()
+    query = Club.query.options(*fieldset.options())
+    clubs = paginate_by_id(query, Club, after, limit)
+    all_clubs = [fieldset.dump(club) for club in clubs]
     
-    return jsonify(all_clubs), 200  # OK
+    return keyset_response(all_clubs, limit, clubs[-1].id if clubs else after), 200  # OK
 
 
 @clubs_blueprint.route('/clubs/<string:name>', methods=['GET'])
+@response_cache.cached('club:{name}')
 def get_club(name):
     """
     Retorna informações de um clube existente, incluindo todos os livros relacionados.
@@ -99,24 +85,38 @@ def get_club(name):
     if not club:
         return jsonify({"message" : "Club not exists!"}), 404  # Not Found
 
-    owner = User.query.filter_by(id=club.owner_id).first()
+    return _club_detail(club)
+
+
+@clubs_blueprint.route('/clubs/id/<int:id>', methods=['GET'])
+@response_cache.cached()
+def get_club_by_id(id):
+    """
+    Retorna informações de um clube existente pela chave primária, incluindo todos os livros relacionados.
+
+    Este endpoint recebe o ID do clube pela URL e retorna as mesmas informações de `/clubs/<name>`.
+    
+    Retorna:
+        Response: Uma resposta JSON com as informações do clube e seus livros, ou uma mensagem de erro e o código de status HTTP apropriado.
+    """
+    club = db.session.get(Club, id)
+
+    if not club:
+        return jsonify({"message" : "Club not exists!"}), 404  # Not Found
+
+    add_cache_tags(f'club:{club.name}')
+    return _club_detail(club)
+
+
+CLUB_DETAIL = CLUB.fieldset(['name', 'books'])
+OWNER = USER.fieldset(['email'])
+
 
-    books = []
-    for book in club.books:
-        book_data = {
-            'id': book.id,
-            'title': book.title,
-            'description': book.description,
-            'gender': book.gender,
-            'registered_by': book.registered_by
-        }
-        books.append(book_data)
+def _club_detail(club):
+    owner = User.query.options(*OWNER.options()).filter_by(id=club.owner_id).first()
+    add_cache_tags(f'user:{club.owner_id}', *(f'book:{book.title}' for book in club.books))
 
-    return jsonify({
-        "name" : club.name,
-        "owner" : owner.email,
-        "books" : books
-    }), 200  # OK
+    return jsonify({**CLUB_DETAIL.dump(club), "owner" : owner.email}), 200  # OK
 
 
 @clubs_blueprint.route('/clubs/<string:name>', methods=['PUT'])
@@ -206,38 +206,75 @@ def add_book(name, title):
         return jsonify({"message" : "Book not exists!"}), 404  # Not Found
     if current_user_id != club.owner_id:
         return jsonify({"message" : "Access denied!"}), 403  # Forbidden
-    for bk in club.books:
-        if bk.title == title:
-            return jsonify({"message" : "This book already exists in this club!"}), 409  # Conflict
-    club.books.append(book)
+    if club.has_book(book.id):
+        return jsonify({"message" : "This book already exists in this club!"}), 409  # Conflict
     
     try:
-        club.save_club()
+        club.add_books([book.id])
     except:
         return jsonify({"message" : "An internal error occurred trying to save club!"}), 500  # Internal Server Error
     
     return jsonify({"message" : "Book added to club successfully!"}), 200  # OK
 
 
+@clubs_blueprint.route('/clubs/<string:name>/books', methods=['POST'])
+@jwt_required()
+def add_books(name):
+    """
+    Adiciona vários livros a um clube existente.
+
+    Este endpoint recebe o nome do clube pela URL e dados JSON com a lista `titles` dos títulos dos livros.
+    Os títulos são resolvidos em uma única consulta, que também indica quais livros já estão no clube,
+    e os que faltam são inseridos em uma única instrução. Se algum título não existir, nenhum livro é adicionado.
+
+    Retorna:
+        Response: Uma resposta JSON com os títulos adicionados e os que já estavam no clube, ou uma mensagem de erro e o código de status HTTP apropriado.
+    """
+    data = request.get_json()
+    titles = data.get('titles')
+    max_titles = current_app.config['CLUB_BOOKS_MAX_TITLES']
+
+    if not titles or not isinstance(titles, list) or not all(isinstance(title, str) for title in titles):
+        return jsonify({"message" : "Information is missing to add books!"}), 400  # Bad Request
+    if len(titles) > max_titles:
+        return jsonify({"message" : f"Too many books! The limit is {max_titles} per request."}), 400  # Bad Request
+
+    current_user_id = get_jwt_identity()
+    club = Club.query.filter_by(name=name).first()
+
+    if not club:
+        return jsonify({"message" : "Club not exists!"}), 404  # Not Found
+    if current_user_id != club.owner_id:
+        return jsonify({"message" : "Access denied!"}), 403  # Forbidden
+
+    titles = list(dict.fromkeys(titles))
+    books = {title: (book_id, in_club) for book_id, title, in_club in club.find_books(titles)}
+    missing = [title for title in titles if title not in books]
+    if missing:
+        return jsonify({"message" : "Book not exists!", "titles" : missing}), 404  # Not Found
+
+    added = [title for title in titles if not books[title][1]]
+    existing = [title for title in titles if books[title][1]]
+    if not added:
+        return jsonify({"message" : "These books already exist in this club!", "existing" : existing}), 409  # Conflict
+
+    try:
+        club.add_books([books[title][0] for title in added])
+    except:
+        return jsonify({"message" : "An internal error occurred trying to save club!"}), 500  # Internal Server Error
+
+    return jsonify({"message" : "Books added to club successfully!", "added" : added, "existing" : existing}), 200  # OK
+
+
 @clubs_blueprint.route('/clubs/average-books-read', methods=['GET'])
 def average_number_of_books_read_by_clubs():
     """
     Calcula a média de livros lidos por clubes.
 
-    Este endpoint não recebe parâmetros.
+    Este endpoint não recebe parâmetros. A média é calculada no banco, com uma única consulta agregada,
+    e pode ser servida de cache quando `CLUB_STATS_CACHE` está ativo.
 
     Retorna:
         Response: Uma resposta JSON com a média de livros lidos por clubes.
     """
-    clubs = Club.query.all()
-    total_number_of_books = 0
-
-    for club in clubs:
-        total_number_of_books += len(club.books)
-    
-    if len(clubs) > 0:
-        average_number_of_books_read_by_clubs = round(total_number_of_books / len(clubs), 2)
-    else:
-        average_number_of_books_read_by_clubs = 0
-
-    return jsonify({"average number of books read by clubs": average_number_of_books_read_by_clubs}), 200  # OK
\ No newline at end of file
+    return jsonify({"average number of books read by clubs": Club.average_books_read()}), 200  # OK
\ No newline at end of file
@@ -1,9 +1,13 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, current_user
 
+from sql_alchemy import db
 from ..models.review import Review
 from ..models.book import Book
-from ..models.user import User
+from ..serializers import REVIEW, get_fieldset
+from ..pagination import get_keyset_args, keyset_response
+from ..cache import response_cache
+from ..exporter import iter_ndjson, iter_reviews, parse_since
 
 review_blueprint = Blueprint('review_blueprint', __name__)
 
@@ -21,16 +25,15 @@ def register_review():
         Response: Uma resposta JSON com uma mensagem de sucesso ou erro e o código de status HTTP apropriado.
     """
     data = request.get_json()
-    current_user = User.query.filter_by(id=get_jwt_identity()).first()
 
     if 'rating' in data and 'comment' in data and 'book_title' in data:
-        if not Book.book_exists(data['book_title']):
+        book = Book.book_exists(data['book_title'])
+        if not book:
             return jsonify({"message" : "Book not exists!"}), 404  # Not Found
         if not data['rating'].isdigit() or int(data['rating']) < 0 or int(data['rating']) > 5:
             return jsonify({"message" : "The review value must be from 0 to 5!"}), 400  # Bad Request
 
-        book = Book.query.filter_by(title=data['book_title']).first()
-        new_review = Review(rating=data['rating'], comment=data['comment'], user_email=current_user.email, book_title=book.title)
+        new_review = Review(rating=data['rating'], comment=data['comment'], user_email=current_user.email, book=book)
         try:
             new_review.save_review()
         except:
@@ -46,57 +49,84 @@ def get_all_reviews():
     """
     Retorna uma lista de todas as resenhas.
 
-    Este endpoint não recebe parâmetros.
+    Este endpoint recebe o parâmetro opcional `fields` (ex.: `fields=id,rating`), com os campos de cada resenha
+    que devem ser lidos do banco e retornados.
 
     Retorna:
         Response: Uma resposta JSON com a lista de todas as resenhas.
     """
-    reviews = Review.query.all()
-    all_reviews = []
-
-    for review in reviews:
-        review_data = {
-            'id': review.id,
-            'book_title': review.book_title,
-            'rating': review.rating,
-            'comment': review.comment,
-            'user_email': review.user_email,
-            'created_at': review.created_at
-        }
-        all_reviews.append(review_data)
+    try:
+        fieldset = get_fieldset(REVIEW)
+    except ValueError as error:
+        return jsonify({"message" : str(error)}), 400  # Bad Request
+
+    reviews = Review.query.options(*fieldset.options()).all()
+    all_reviews = [fieldset.dump(review) for review in reviews]
     
     return jsonify(all_reviews), 200  # OK
 
 
+@review_blueprint.route('/reviews/export', methods=['GET'])
+def export_reviews():
+    """
+    Exporta todas as resenhas em NDJSON (uma resenha JSON por linha), em streaming e em ordem de criação.
+
+    Este endpoint recebe os parâmetros opcionais `since` (data ISO 8601; só as resenhas criadas a partir dela)
+    e `gzip` (com `true`, a resposta é comprimida). As resenhas são lidas do banco em chunks de
+    `STREAM_CHUNK_SIZE`, então o uso de memória não cresce com o tamanho da tabela.
+
+    Retorna:
+        Response: Uma resposta NDJSON em streaming, ou uma mensagem de erro e o código de status HTTP apropriado.
+    """
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        return jsonify({"message" : "Invalid since date! Use the ISO 8601 format."}), 400  # Bad Request
+
+    compress = request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes')
+    rows = iter_reviews(since, current_app.config['STREAM_CHUNK_SIZE'])
+    response = Response(stream_with_context(iter_ndjson(rows, compress)), mimetype='application/x-ndjson')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
 @review_blueprint.route('/reviews/<string:title>', methods=['GET'])
+@response_cache.cached('book:{title}')
 def get_all_reviews_by_book(title):
     """
-    Retorna uma lista de todas as resenhas de um livro específico.
+    Retorna uma lista das resenhas de um livro específico, em ordem de criação e paginada por cursor.
 
-    Este endpoint recebe o título do livro pela URL.
+    Este endpoint recebe o título do livro pela URL e os parâmetros opcionais `after` (id da última resenha recebida)
+    e `limit` (tamanho da página). O título é resolvido para o id do livro na mesma consulta, e o filtro e a ordenação
+    são feitos no banco, pelo índice (book_id, created_at). Também aceita `fields`, como em `/reviews/`.
 
     Parâmetros:
         title (str): O título do livro cujas resenhas serão retornadas.
 
     Retorna:
-        Response: Uma resposta JSON com a lista de todas as resenhas do livro especificado.
-    """
-    reviews = Review.query.all()
-    all_reviews = []
-
-    for review in reviews:
-        if review.book_title == title:
-            review_data = {
-                'id': review.id,
-                'book_title': review.book_title,
-                'rating': review.rating,
-                'comment': review.comment,
-                'user_email': review.user_email,
-                'created_at': review.created_at
-            }
-            all_reviews.append(review_data)
+        Response: Uma resposta JSON com a lista das resenhas do livro especificado.
+    """
+    try:
+        fieldset = get_fieldset(REVIEW)
+    except ValueError as error:
+        return jsonify({"message" : str(error)}), 400  # Bad Request
+
+    after, limit = get_keyset_args()
+    book_id = db.select(Book.id).where(Book.title == title).scalar_subquery()
+    query = Review.query.options(*fieldset.options()).filter(Review.book_id == book_id)
+
+    if after:
+        cursor = db.session.get(Review, after)
+        if cursor:
+            query = query.filter(db.tuple_(Review.created_at, Review.id) > (cursor.created_at, cursor.id))
+        else:
+            query = query.filter(Review.id > after)
+
+    reviews = query.order_by(Review.created_at, Review.id).limit(limit).all()
+    all_reviews = [fieldset.dump(review) for review in reviews]
     
-    return jsonify(all_reviews), 200  # OK
+    return keyset_response(all_reviews, limit, reviews[-1].id if reviews else after), 200  # OK
 
 
 @review_blueprint.route('/reviews/<int:id>', methods=['GET'])
@@ -137,7 +167,6 @@ def edit_review(id):
         Response: Uma resposta JSON com uma mensagem de sucesso ou erro e o código de status HTTP apropriado.
     """
     data = request.get_json()
-    current_user = User.query.filter_by(id=get_jwt_identity()).first()
     review = Review.query.filter_by(id=id).first()
 
     if not review:
@@ -153,9 +182,10 @@ def edit_review(id):
     if 'comment' in data and review.comment != data['comment']:
         review.comment = data['comment']
     if 'book_title' in data:
-        if not Book.book_exists(data['book_title']):
+        book = Book.book_exists(data['book_title'])
+        if not book:
             return jsonify({"message" : "Book not exists!"}), 404  # Not Found
-        review.book_title = data['book_title']
+        review.book = book
     
     try:
         review.save_review()
@@ -177,7 +207,6 @@ def delete_review(id):
     Retorna:
         Response: Uma resposta JSON com uma mensagem de sucesso ou erro e o código de status HTTP apropriado.
     """
-    current_user = User.query.filter_by(id=get_jwt_identity()).first()
     review = Review.query.filter_by(id=id).first()
 
     if not review:
@@ -194,23 +223,18 @@ def average_rating_of_book(title):
     """
     Calcula a média das classificações de um livro específico.
 
-    Este endpoint recebe o título do livro pela URL.
+    Este endpoint recebe o título do livro pela URL. A média é lida dos agregados mantidos no próprio livro,
+    sem percorrer as resenhas.
 
     Parâmetros:
         title (str): O título do livro cuja média de classificações será calculada.
 
     Retorna:
-        Response: Uma resposta JSON com a média das classificações do livro especificado.
+        Response: Uma resposta JSON com a média das classificações do livro especificado, ou uma mensagem de erro e o código de status HTTP apropriado.
     """
-    reviews = Review.query.all()
-    total_rating_of_book = 0
-    total_of_reviews = 0
+    book = Book.book_exists(title)
 
-    for review in reviews:
-        if review.book_title == title:
-            total_rating_of_book += review.rating
-            total_of_reviews += 1
-    
-    avarage_rating = round(total_rating_of_book / total_of_reviews, 2)
+    if not book:
+        return jsonify({"message" : "Book not exists!"}), 404  # Not Found
 
-    return jsonify({"avarage rating of book" : "{}".format(avarage_rating)}), 200  # OK
\ No newline at end of file
+    return jsonify({"avarage rating of book" : "{}".format(book.average_rating)}), 200  # OK
\ No newline at end of file
@@ -1,10 +1,11 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity
 
 from sql_alchemy import db
 from blacklist import BLACKLIST
 from ..models.user import User
+from ..passwords import password_hasher
+from ..auth import identity_claims, revoke_identity
 
 users_blueprint = Blueprint('users_blueprint', __name__)
 
@@ -21,7 +22,7 @@ def register_user():
     """
     data = request.get_json()
     email = data['email']
-    hashed_password = generate_password_hash(data['password'])
+    hashed_password = password_hasher.hash(data['password'])
 
     if not User.is_valid_email(email):
         return jsonify({"message" : "Email not valid!"}), 400  # Bad Request
@@ -87,13 +88,17 @@ def edit_user(email):
             return jsonify({"message" : "User already exists!"}), 409  # Conflict
         user.email = data['email']
     if 'password' in data:
-        user.password = generate_password_hash(data['password'])
+        user.password = password_hasher.hash(data['password'])
     
     try:
         user.save_user()
     except:
         return jsonify({"message" : "An internal error occurred trying to save user!"}), 500  # Internal Server Error
 
+    # Os tokens emitidos com o email antigo o carregam nas claims e deixam de ser válidos
+    if email != user.email:
+        revoke_identity(user.id, email)
+
     return jsonify({"message" : "User edited successfully!"}), 200  # OK
 
 
@@ -118,7 +123,8 @@ def delete_user(email):
         return jsonify({"message" : "Access denied!"}), 403  # Forbidden
     
     user.delete_user()
-    BLACKLIST.add(get_jwt()['jti'])
+    BLACKLIST.add(get_jwt()['jti'], get_jwt().get('exp'))
+    revoke_identity(current_user_id, email)
     return jsonify({"message" : "User deleted successfully!"}), 200  # OK
 
 
@@ -137,10 +143,10 @@ def login():
     
     if not user:
         return jsonify({"message" : "User does not exist!"}), 404  # Not Found
-    if not check_password_hash(user.password, data['password']):
+    if not password_hasher.verify(user.password, data['password']):
         return jsonify({"message": "Invalid credentials"}), 401  # Unauthorized
     
-    access_token = create_access_token(identity=user.id)
+    access_token = create_access_token(identity=user.id, additional_claims=identity_claims(user))
     return jsonify({"access_token" : access_token}), 200  # OK
 
 @users_blueprint.route('/logout', methods=['POST'])
@@ -149,10 +155,10 @@ def logout():
     """ 
     Realiza o logout de um usuário.
     
-    Este endpoint invalida o token JWT atual, adicionando-o à lista negra (BLACKLIST).
+    Este endpoint invalida o token JWT atual, adicionando-o à lista negra (BLACKLIST) até o seu vencimento.
     
     Retorna: 
         Response: Uma resposta JSON com uma mensagem de sucesso. 
     """
-    BLACKLIST.add(get_jwt()['jti'])
+    BLACKLIST.add(get_jwt()['jti'], get_jwt().get('exp'))
     return jsonify({"message" : "Successfully logged out!"}), 200  # OK
\ No newline at end of file
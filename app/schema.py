@@ -0,0 +1,131 @@
+from sqlalchemy.schema import CreateColumn
+
+from sql_alchemy import db
+
+
+class SchemaUpgradeError(Exception):
+    pass
+
+
+# Migrações de dados executadas quando a coluna correspondente acaba de ser criada em um banco existente
+DATA_MIGRATIONS = {}
+
+
+def data_migration(table, column):
+    def decorator(function):
+        DATA_MIGRATIONS[(table, column)] = function
+        return function
+    return decorator
+
+
+@data_migration('book', 'rating_count')
+def _backfill_rating_aggregates(connection):
+    from .models.book import Book
+
+    Book.repair_rating_aggregates(connection)
+
+
+@data_migration('review', 'book_id')
+def _backfill_review_book_ids(connection):
+    from .models.book import Book
+    from .models.review import Review
+
+    book, review = Book.__table__, Review.__table__
+    connection.execute(db.update(review).values(
+        book_id=db.select(book.c.id).where(book.c.title == review.c.book_title).scalar_subquery()
+    ))
+    # Os agregados passam a ser calculados por book_id, que só agora está preenchido
+    Book.repair_rating_aggregates(connection)
+
+
+# Índices substituídos por outros do schema atual, removidos na atualização
+DROPPED_INDEXES = {
+    'review': ['ix_review_book_title_created_at'],
+}
+
+
+def _add_column_ddl(column, dialect):
+    # O SQLite só aceita ADD COLUMN NOT NULL com um DEFAULT; sem ele, a coluna é criada aceitando NULL
+    if not column.nullable and column.server_default is None:
+        return f'{dialect.identifier_preparer.format_column(column)} {column.type.compile(dialect)}'
+    return str(CreateColumn(column).compile(dialect=dialect))
+
+
+def _duplicates(connection, index):
+    columns = [column for column in index.columns]
+    query = (db.select(*columns, db.func.count().label('total'))
+             .group_by(*columns)
+             .having(db.func.count() > 1)
+             .limit(10))
+    return connection.execute(query).all()
+
+
+def upgrade_schema():
+    """
+    Atualiza um banco existente para o schema atual dos models, sem apagar dados.
+
+    Cria as tabelas, colunas e índices que faltam (inclusive o índice de busca FTS5 no SQLite),
+    remove os índices substituídos e roda as migrações de dados das colunas novas.
+    Antes de criar um índice único, confere se há valores duplicados e interrompe a atualização se houver.
+
+    Retorna:
+        list: A descrição de cada passo executado.
+    """
+    steps, pending_migrations = [], []
+    with db.engine.begin() as connection:
+        inspector = db.inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+
+        # O driver do SQLite confirma DDL na hora, então os duplicados são conferidos antes de qualquer alteração
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if not index.unique or index.name in existing_indexes:
+                    continue
+                if not all(column.name in existing_columns for column in index.columns):
+                    continue
+                duplicates = _duplicates(connection, index)
+                if duplicates:
+                    values = ', '.join(repr(row[0]) if len(row) == 2 else repr(tuple(row[:-1])) for row in duplicates)
+                    raise SchemaUpgradeError(f'Cannot create unique index {index.name}: duplicated values {values}.')
+
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                table.create(connection)
+                steps.append(f'Created table {table.name}.')
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {_add_column_ddl(column, connection.dialect)}'))
+                steps.append(f'Added column {table.name}.{column.name}.')
+                if (table.name, column.name) in DATA_MIGRATIONS:
+                    pending_migrations.append((table.name, column.name))
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                index.create(connection)
+                steps.append(f'Created index {index.name}.')
+            for index_name in DROPPED_INDEXES.get(table.name, []):
+                if index_name in existing_indexes:
+                    connection.execute(db.text(f'DROP INDEX {index_name}'))
+                    steps.append(f'Dropped index {index_name}.')
+
+        if connection.dialect.name == 'sqlite' and not db.inspect(connection).has_table('book_fts'):
+            from .models.book import create_search_index
+
+            create_search_index(connection)
+            steps.append('Created search index book_fts.')
+
+        # As migrações de dados rodam só depois que todas as tabelas e colunas existem
+        for table_name, column_name in pending_migrations:
+            DATA_MIGRATIONS[(table_name, column_name)](connection)
+            steps.append(f'Migrated data for {table_name}.{column_name}.')
+    return steps
@@ -0,0 +1,117 @@
+from flask import request
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only, selectinload
+
+from .models.book import Book
+from .models.club import Club
+from .models.review import Review
+from .models.user import User
+
+
+class Serializer:
+    """
+    Formato JSON de um modelo: os campos (colunas) que podem ser pedidos e as relações que podem ser incluídas,
+    cada uma com o seu serializer e os campos que aparecem quando ela vem aninhada.
+    """
+
+    def __init__(self, model, fields, relationships=None):
+        self.model = model
+        self.fields = fields
+        # nome da relação -> (serializer, campos padrão quando aninhada)
+        self.relationships = relationships or {}
+
+    def fieldset(self, fields=None, include=(), default_include=()):
+        """
+        Monta a seleção de campos e relações, validando os nomes pedidos.
+
+        Sem `fields`, vêm todos os campos; sem `fields` nem `include`, vêm as relações de `default_include`.
+        Relações podem ser pedidas tanto em `include` quanto em `fields`, e as aninhadas com ponto (`books.reviews`).
+
+        Retorna:
+            Fieldset: A seleção, que gera as opções de carregamento da consulta e os dicionários da resposta.
+
+        Lança:
+            ValueError: Se algum campo ou relação não existir.
+        """
+        if fields is None and not include:
+            include = default_include
+        fields = self.fields if fields is None else fields
+        include = [*include, *(name for name in fields if name in self.relationships)]
+        fields = [name for name in fields if name not in self.relationships]
+
+        unknown = [name for name in fields if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}!")
+
+        nested = {}
+        for path in include:
+            name, _, rest = path.partition('.')
+            if name not in self.relationships:
+                raise ValueError(f"Unknown include: {path}!")
+            nested.setdefault(name, [])
+            if rest:
+                nested[name].append(rest)
+
+        for name, paths in nested.items():
+            serializer, default_fields = self.relationships[name]
+            nested[name] = serializer.fieldset(default_fields, paths)
+        return Fieldset(self, list(dict.fromkeys(fields)), nested)
+
+
+class Fieldset:
+    """
+    Campos e relações pedidos de um modelo.
+    """
+
+    def __init__(self, serializer, fields, include):
+        self.serializer = serializer
+        self.fields = fields
+        # nome da relação -> Fieldset do modelo relacionado
+        self.include = include
+
+    def options(self):
+        """
+        Opções de carregamento para a consulta: `load_only` com as colunas pedidas (a chave primária sempre vem)
+        e um `selectinload` por relação incluída. Colunas e relações não pedidas não são lidas do banco.
+        """
+        model = self.serializer.model
+        columns = [getattr(model, name) for name in self.fields] or inspect(model).primary_key
+        options = [load_only(*columns)]
+        for name, fieldset in self.include.items():
+            options.append(selectinload(getattr(model, name)).options(*fieldset.options()))
+        return options
+
+    def dump(self, obj):
+        data = {name: getattr(obj, name) for name in self.fields}
+        for name, fieldset in self.include.items():
+            data[name] = [fieldset.dump(item) for item in getattr(obj, name)]
+        return data
+
+
+def _split(value):
+    names = [name.strip() for name in (value or '').split(',') if name.strip()]
+    return names or None
+
+
+def get_fieldset(serializer, default_include=()):
+    """
+    Lê os parâmetros `fields` e `include` (nomes separados por vírgula) da query string.
+
+    Retorna:
+        Fieldset: A seleção pedida pelo cliente.
+
+    Lança:
+        ValueError: Se algum campo ou relação não existir.
+    """
+    return serializer.fieldset(_split(request.args.get('fields')), _split(request.args.get('include')) or (), default_include)
+
+
+REVIEW = Serializer(Review, ('id', 'book_title', 'rating', 'comment', 'user_email', 'created_at'))
+BOOK = Serializer(Book, ('id', 'title', 'description', 'gender', 'registered_by'), {
+    # Aninhadas no livro, as reviews não repetem o título
+    'reviews': (REVIEW, ('id', 'rating', 'comment', 'user_email', 'created_at')),
+})
+CLUB = Serializer(Club, ('id', 'name', 'owner_id'), {
+    'books': (BOOK, BOOK.fields),
+})
+USER = Serializer(User, ('id', 'email'))
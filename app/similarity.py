@@ -0,0 +1,268 @@
+import heapq
+import logging
+import math
+import os
+import queue
+import threading
+from array import array
+from collections import Counter, defaultdict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from sql_alchemy import db
+from .models.book_similarity import BookSimilarity
+
+logger = logging.getLogger('bookbridge.similarity')
+
+INSERT_BATCH_SIZE = 10000
+# Resenhas alteradas tiradas da fila de uma vez pela thread em segundo plano (as repetidas são atualizadas uma vez só)
+WORKER_BATCH_SIZE = 100
+
+
+def _top_neighbours(book_id, co_readers, readers, neighbours):
+    # Similaridade do cosseno entre os conjuntos de leitores que gostaram de cada livro; empates pelo menor id
+    total = readers[book_id]
+    scores = ((other, count / math.sqrt(total * readers[other])) for other, count in co_readers.items() if other != book_id)
+    return heapq.nlargest(neighbours, scores, key=lambda item: (item[1], -item[0]))
+
+
+def rebuild_similar_books(min_rating, neighbours, max_user_books):
+    """
+    Recalcula do zero os `neighbours` livros mais parecidos com cada livro.
+
+    Dois livros são parecidos quando os mesmos leitores gostaram deles (avaliação de pelo menos `min_rating`).
+    As resenhas são lidas uma única vez e guardadas como listas de adjacência compactas (`array`) de leitores
+    por livro e livros por leitor; a linha de cada livro é então somada com `Counter`, sem montar a matriz inteira.
+    Leitores com mais de `max_user_books` livros não entram nas coocorrências, pois o custo cresce com o quadrado.
+
+    Retorna:
+        int: A quantidade de livros com vizinhos.
+    """
+    from .models.review import Review
+
+    review = Review.__table__
+    rows = db.session.execute(
+        db.select(review.c.user_email, review.c.book_id)
+        .where(review.c.rating >= min_rating, review.c.book_id.is_not(None))
+        .distinct()
+    )
+    user_ids, books_of_user, readers_of_book = {}, [], defaultdict(lambda: array('i'))
+    for email, book_id in rows:
+        user = user_ids.setdefault(email, len(user_ids))
+        if user == len(books_of_user):
+            books_of_user.append(array('i'))
+        books_of_user[user].append(book_id)
+        readers_of_book[book_id].append(user)
+
+    readers = {book_id: len(users) for book_id, users in readers_of_book.items()}
+    similarity = BookSimilarity.__table__
+    db.session.execute(db.delete(similarity))
+    batch, books = [], 0
+    for book_id, users in readers_of_book.items():
+        co_readers = Counter()
+        for user in users:
+            if len(books_of_user[user]) <= max_user_books:
+                co_readers.update(books_of_user[user])
+        top = _top_neighbours(book_id, co_readers, readers, neighbours)
+        books += bool(top)
+        batch.extend({'book_id': book_id, 'similar_book_id': other, 'score': score} for other, score in top)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.session.execute(similarity.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(similarity.insert(), batch)
+    db.session.commit()
+    return books
+
+
+def _co_readers(connection, book_id, min_rating, candidates=None):
+    # Leitores em comum do livro com cada outro livro (só com os `candidates`, quando informados)
+    # e o total de leitores de cada um; o próprio livro aparece com o seu total
+    from .models.review import Review
+
+    review = Review.__table__
+    mine, other, readers_of = review.alias('mine'), review.alias('other'), review.alias('readers_of')
+    if candidates is not None:
+        # Parte dos leitores de cada candidato e confere, pelo índice de user_email, se também gostaram do livro;
+        # com o join, o SQLite releria todos os leitores do livro (milhares, nos populares) a cada leitor do candidato
+        books = [book_id, *candidates]
+        liked_book = (db.select(mine.c.id)
+                      .where(mine.c.user_email == other.c.user_email, mine.c.book_id == book_id, mine.c.rating >= min_rating)
+                      .exists())
+        co_readers = connection.execute(
+            db.select(other.c.book_id, db.func.count(db.distinct(other.c.user_email)))
+            .where(other.c.book_id.in_(books), other.c.rating >= min_rating, liked_book)
+            .group_by(other.c.book_id)
+        ).all()
+        readers = connection.execute(
+            db.select(readers_of.c.book_id, db.func.count(db.distinct(readers_of.c.user_email)))
+            .where(readers_of.c.book_id.in_(books), readers_of.c.rating >= min_rating)
+            .group_by(readers_of.c.book_id)
+        ).all()
+        return Counter(dict(co_readers)), dict(readers)
+
+    readers_query = (db.select(db.func.count(db.distinct(readers_of.c.user_email)))
+                     .where(readers_of.c.book_id == other.c.book_id, readers_of.c.rating >= min_rating)
+                     .scalar_subquery())
+    query = (db.select(other.c.book_id, db.func.count(db.distinct(other.c.user_email)), readers_query)
+             .select_from(mine.join(other, other.c.user_email == mine.c.user_email))
+             .where(mine.c.book_id == book_id, mine.c.rating >= min_rating, other.c.rating >= min_rating)
+             .group_by(other.c.book_id))
+    rows = connection.execute(query).all()
+    return Counter({other_id: count for other_id, count, _ in rows}), {other_id: total for other_id, _, total in rows}
+
+
+def _update_pair(connection, book_id, other_id, score, neighbours):
+    similarity = BookSimilarity.__table__
+    connection.execute(db.delete(similarity).where(similarity.c.book_id == book_id, similarity.c.similar_book_id == other_id))
+    if not score:
+        return
+    connection.execute(similarity.insert(), [{'book_id': book_id, 'similar_book_id': other_id, 'score': score}])
+    kept = (db.select(similarity.c.similar_book_id)
+            .where(similarity.c.book_id == book_id)
+            .order_by(similarity.c.score.desc(), similarity.c.similar_book_id)
+            .limit(neighbours))
+    connection.execute(db.delete(similarity).where(similarity.c.book_id == book_id, similarity.c.similar_book_id.not_in(kept)))
+
+
+def refresh_book_neighbours(connection, book_id, user_email, min_rating, neighbours, max_user_books, max_readers):
+    """
+    Atualiza as similaridades depois de uma resenha de `user_email` para o livro `book_id`.
+
+    A linha do livro é recalculada por inteiro, pelos índices de review, quando ele tem até `max_readers` leitores;
+    nos livros mais populares, em que um leitor a mais quase não muda a linha, só os pares com os outros livros
+    de que o leitor gostou são atualizados. Os pares de outros livros com este mudam pouco (só o número de leitores
+    do livro) e são corrigidos na próxima reconstrução.
+    """
+    from .models.review import Review
+
+    review, similarity = Review.__table__, BookSimilarity.__table__
+    liked = connection.execute(
+        db.select(review.c.book_id).distinct()
+        .where(review.c.user_email == user_email, review.c.rating >= min_rating, review.c.book_id != book_id)
+        .limit(max_user_books)
+    ).scalars().all()
+    total = connection.execute(
+        db.select(db.func.count(db.distinct(review.c.user_email))).where(review.c.book_id == book_id, review.c.rating >= min_rating)
+    ).scalar()
+
+    def score(other_id):
+        return co_readers[other_id] / math.sqrt(total * readers[other_id]) if co_readers.get(other_id) else 0
+
+    if total > max_readers:
+        co_readers, readers = _co_readers(connection, book_id, min_rating, liked)
+        for other_id in liked:
+            _update_pair(connection, book_id, other_id, score(other_id), neighbours)
+            _update_pair(connection, other_id, book_id, score(other_id), neighbours)
+        return
+
+    co_readers, readers = _co_readers(connection, book_id, min_rating)
+    connection.execute(db.delete(similarity).where(similarity.c.book_id == book_id))
+    top = _top_neighbours(book_id, co_readers, readers, neighbours) if total else []
+    if top:
+        connection.execute(similarity.insert(), [
+            {'book_id': book_id, 'similar_book_id': other_id, 'score': value} for other_id, value in top
+        ])
+    for other_id in liked:
+        _update_pair(connection, other_id, book_id, score(other_id), neighbours)
+
+
+class SimilarityWorker:
+    """
+    Atualiza as similaridades em uma thread em segundo plano, fora do caminho das requisições.
+
+    Cada escrita confirmada de resenha só coloca (book_id, user_email) em uma fila de até `SIMILAR_BOOKS_QUEUE_SIZE`
+    itens, sem nenhum comando SQL; a thread junta o que estiver na fila (sem repetições) e atualiza cada resenha
+    em uma transação curta, para não segurar o lock de escrita das requisições. Com a fila cheia, a alteração é descartada e corrigida na próxima reconstrução
+    (`flask rebuild-similar-books`).
+    """
+
+    def __init__(self, app):
+        self._app = app
+        self._maxsize = app.config['SIMILAR_BOOKS_QUEUE_SIZE']
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+
+    def _ensure_started(self):
+        # Criada sob demanda e recriada depois de um fork (ex.: workers do gunicorn)
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._maxsize)
+                self._thread = threading.Thread(target=self._run, name='bookbridge-similarity', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, changes):
+        self._ensure_started()
+        for change in changes:
+            try:
+                self._queue.put_nowait(change)
+            except queue.Full:
+                self.dropped += 1
+
+    def join(self):
+        """
+        Espera a fila esvaziar.
+        """
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def _run(self):
+        work = self._queue
+        while True:
+            changes = [work.get()]
+            while len(changes) < WORKER_BATCH_SIZE:
+                try:
+                    changes.append(work.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._app.app_context():
+                    self._refresh(set(changes))
+            except Exception:
+                logger.exception('Could not update similar books for %s', sorted(set(changes)))
+            finally:
+                for _ in changes:
+                    work.task_done()
+
+    def _refresh(self, changes):
+        config = self._app.config
+        # Uma transação por resenha, para segurar o lock de escrita do banco o mínimo possível
+        for book_id, user_email in changes:
+            with db.engine.begin() as connection:
+                refresh_book_neighbours(connection, book_id, user_email, config['SIMILAR_BOOKS_MIN_RATING'],
+                                        config['SIMILAR_BOOKS_NEIGHBOURS'], config['SIMILAR_BOOKS_MAX_USER_BOOKS'],
+                                        config['SIMILAR_BOOKS_MAX_INCREMENTAL_READERS'])
+
+
+def init_similarity(app):
+    app.extensions['similarity_worker'] = SimilarityWorker(app)
+
+
+def get_similarity_worker():
+    return current_app.extensions['similarity_worker']
+
+
+def record_similarity_change(session, book_id, user_email):
+    """
+    Registra uma resenha alterada, cujas similaridades são atualizadas só quando a sessão confirma a transação.
+    """
+    session.info.setdefault('similarity_changes', set()).add((book_id, user_email))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_similarity_changes(session):
+    changes = session.info.pop('similarity_changes', None)
+    if not changes or not has_app_context() or not current_app.config['SIMILAR_BOOKS_INCREMENTAL']:
+        return
+    if 'similarity_worker' in current_app.extensions:
+        get_similarity_worker().submit(changes)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_similarity_changes(session, previous_transaction):
+    session.info.pop('similarity_changes', None)
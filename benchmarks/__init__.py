@@ -0,0 +1,9 @@
+"""
+Benchmarks de desempenho da API.
+
+Cada módulo pode ser executado com `python -m benchmarks.<modulo>` a partir da raiz do projeto
+e usa a configuração `benchmark` (banco definido por `BENCHMARK_DATABASE_URL`).
+
+`benchmarks.harness` mede todas as rotas sobre o banco sintético de `benchmarks.dataset` e grava
+um JSON que pode ser comparado com o de uma execução anterior (`--baseline`) para detectar regressões.
+"""
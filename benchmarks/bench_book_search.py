@@ -0,0 +1,89 @@
+"""
+Mede a latência de GET /books/search sobre um catálogo grande.
+
+Títulos e descrições são gerados a partir de um vocabulário fixo e determinístico, de forma que cada termo
+aparece em alguns milhares de livros. São medidas buscas por um termo, por dois termos e por prefixo.
+
+Uso:
+    python -m benchmarks.bench_book_search --books 1000000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from itertools import product
+
+from app import create_app
+from app.models.book import Book
+from app.models.user import User
+from sql_alchemy import db
+
+BATCH_SIZE = 50000
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'vi', 'zo', 'be', 'da', 'fu', 'go', 'hi', 'jo', 'pe', 'si']
+VOCABULARY = [''.join(parts) for parts in product(SYLLABLES, repeat=3)]
+QUERIES = {
+    'one_term': lambda rng: rng.choice(VOCABULARY),
+    'two_terms': lambda rng: f'{rng.choice(VOCABULARY)} {rng.choice(VOCABULARY)}',
+    'prefix': lambda rng: rng.choice(VOCABULARY)[:4],
+}
+
+
+def populate(total_books):
+    rng = random.Random(42)
+    db.drop_all()
+    db.create_all()
+    db.session.execute(db.insert(User), [{'email': 'bench@example.com', 'password': 'x'}])
+    rows = []
+    for i in range(total_books):
+        title = ' '.join(rng.choices(VOCABULARY, k=3))
+        rows.append({'title': f'{title} {i}', 'description': ' '.join(rng.choices(VOCABULARY, k=12)),
+                     'gender': 'Fiction', 'registered_by': 'bench@example.com'})
+        if len(rows) == BATCH_SIZE:
+            db.session.execute(db.insert(Book), rows)
+            rows = []
+    if rows:
+        db.session.execute(db.insert(Book), rows)
+    db.session.commit()
+
+
+def measure(client, kind, repeat, limit):
+    rng = random.Random(7)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get('/books/search', query_string={'q': QUERIES[kind](rng), 'limit': limit})
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200
+    timings.sort()
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app('benchmark')
+    results = []
+    with app.app_context():
+        started = time.perf_counter()
+        populate(args.books)
+        print(json.dumps({'books': args.books, 'populate_s': round(time.perf_counter() - started, 1)}))
+        client = app.test_client()
+        for kind in QUERIES:
+            result = {'books': args.books, 'query': kind, **measure(client, kind, args.repeat, args.limit)}
+            results.append(result)
+            print(json.dumps(result))
+        db.drop_all()
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
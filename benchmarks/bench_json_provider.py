@@ -0,0 +1,86 @@
+"""
+Compara a serialização das respostas JSON com o provider padrão do Flask, com o StdlibJSONProvider
+(o mesmo json, com a formatação de datas mais rápida) e com o OrjsonProvider.
+
+Os payloads são montados pelos mesmos serializers das rotas, a partir do banco sintético de `benchmarks.dataset`:
+páginas de GET /books e GET /clubs (com as reviews aninhadas) e a lista completa de GET /reviews/.
+Só a serialização é medida (`app.json.response`), sem consultas ao banco nem o restante da requisição.
+
+Uso:
+    python -m benchmarks.bench_json_provider --scale 10k
+"""
+import argparse
+import json
+import statistics
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+from app import create_app
+from app.json_provider import OrjsonProvider, StdlibJSONProvider, orjson
+from app.models.book import Book
+from app.models.club import Club
+from app.models.review import Review
+from app.serializers import BOOK, CLUB, REVIEW
+from sql_alchemy import db
+from .dataset import parse_scale, populate
+
+
+def payloads(page_sizes):
+    books = BOOK.fieldset(include=['reviews'])
+    clubs = CLUB.fieldset(include=['books.reviews'])
+    reviews = REVIEW.fieldset()
+    result = {}
+    for size in page_sizes:
+        query = Book.query.options(*books.options()).order_by(Book.id).limit(size)
+        result[f'books_page_{size}'] = [books.dump(book) for book in query]
+    query = Club.query.options(*clubs.options()).order_by(Club.id).limit(max(page_sizes))
+    result['clubs_page'] = [clubs.dump(club) for club in query]
+    result['all_reviews'] = [reviews.dump(review) for review in Review.query.options(*reviews.options())]
+    return result
+
+
+def measure(app, provider, payload, repeat):
+    timings = []
+    with app.test_request_context():
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = provider.response(payload).get_data()
+            timings.append((time.perf_counter() - started) * 1000)
+    median = statistics.median(timings)
+    return body, {'p50_ms': round(median, 3), 'mb_per_s': round(len(body) / median / 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='10k', help='1k, 10k, 100k, 1m ou um número de livros')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[100, 1000])
+    args = parser.parse_args()
+
+    if orjson is None:
+        raise SystemExit('orjson is not installed')
+
+    app = create_app('benchmark', SQLALCHEMY_DATABASE_URI='sqlite://')
+    providers = {'flask': DefaultJSONProvider(app), 'stdlib': StdlibJSONProvider(app), 'orjson': OrjsonProvider(app)}
+    results = []
+    with app.app_context():
+        populate(parse_scale(args.scale), args.seed)
+        for name, payload in payloads(args.page_sizes).items():
+            result = {'payload': name, 'items': len(payload)}
+            bodies = {}
+            for provider_name, provider in providers.items():
+                bodies[provider_name], result[provider_name] = measure(app, provider, payload, args.repeat)
+            # Todos os providers precisam gerar exatamente a mesma resposta (os dados sintéticos são ASCII)
+            assert len(set(bodies.values())) == 1, name
+            result['bytes'] = len(bodies['flask'])
+            result['speedup'] = round(result['flask']['p50_ms'] / result['orjson']['p50_ms'], 1)
+            print(json.dumps(result))
+            results.append(result)
+        db.drop_all()
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Mede a latência de um endpoint de leitura barato durante uma rajada de logins concorrentes,
+com o hash de senha calculado na thread da requisição (`inline`) e no pool de processos (`process`).
+
+Uso:
+    python -m benchmarks.bench_login_storm --threads 16 --duration 5
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+from app import create_app
+from app.models.book import Book
+from app.models.user import User
+from app.passwords import password_hasher
+from sql_alchemy import db
+
+
+def login_storm(client, stop, counter):
+    body = json.dumps({'email': 'bench@example.com', 'password': 'password123'})
+    while not stop.is_set():
+        response = client.post('/login', data=body, content_type='application/json')
+        assert response.status_code == 200
+        counter.append(1)
+
+
+def run(executor, threads, duration):
+    app = create_app('benchmark')
+    app.config['PASSWORD_HASH_EXECUTOR'] = executor
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(User(email='bench@example.com', password=password_hasher.hash('password123')))
+        db.session.add(Book(title='Bench Book', description='Description', gender='Fiction', registered_by='bench@example.com'))
+        db.session.commit()
+
+    client = app.test_client()
+    # Aquece o pool de processos antes da medição
+    client.post('/login', data=json.dumps({'email': 'bench@example.com', 'password': 'password123'}), content_type='application/json')
+
+    def measure_reads(seconds):
+        timings = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            assert client.get('/books/Bench Book').status_code == 200
+            timings.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.005)
+        timings.sort()
+        return {'p50_ms': round(statistics.median(timings), 3),
+                'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3)}
+
+    idle = measure_reads(1)
+    stop, logins = threading.Event(), []
+    workers = [threading.Thread(target=login_storm, args=(app.test_client(), stop, logins)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    storm = measure_reads(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    with app.app_context():
+        db.drop_all()
+    return {'executor': executor, 'threads': threads, 'idle_reads': idle, 'storm_reads': storm,
+            'logins_per_second': round(len(logins) / duration, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--executors', nargs='+', default=['inline', 'process'])
+    args = parser.parse_args()
+
+    results = []
+    for executor in args.executors:
+        result = run(executor, args.threads, args.duration)
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+if __name__ == '__main__':
+    main()
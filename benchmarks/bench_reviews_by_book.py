@@ -0,0 +1,96 @@
+"""
+Mede a latência de GET /reviews/<title> conforme a tabela de resenhas cresce.
+
+O livro consultado tem sempre a mesma quantidade de resenhas; só o restante da tabela aumenta.
+Com o filtro e a ordenação resolvidos pelo índice (book_id, created_at), a latência deve se manter estável.
+
+Uso:
+    python -m benchmarks.bench_reviews_by_book --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.models.book import Book
+from app.models.review import Review
+from app.models.user import User
+from sql_alchemy import db
+
+TARGET_TITLE = 'Target Book'
+TARGET_REVIEWS = 200
+BOOKS = 1000
+BATCH_SIZE = 50000
+
+
+def populate(total_reviews):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(db.insert(User), [{'email': 'bench@example.com', 'password': 'x'}])
+    titles = [TARGET_TITLE] + [f'Book {i}' for i in range(1, BOOKS)]
+    db.session.execute(db.insert(Book), [
+        {'title': title, 'description': 'Description', 'gender': 'Fiction', 'registered_by': 'bench@example.com'}
+        for title in titles
+    ])
+
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(total_reviews):
+        # As resenhas do livro consultado ficam espalhadas pela tabela inteira
+        if i % (total_reviews // TARGET_REVIEWS) == 0:
+            book_id = 1
+        else:
+            book_id = 2 + i % (BOOKS - 1)
+        rows.append({'rating': i % 6, 'comment': 'Comment', 'user_email': 'bench@example.com',
+                     'book_id': book_id, 'book_title': titles[book_id - 1], 'created_at': start + timedelta(seconds=i)})
+        if len(rows) == BATCH_SIZE:
+            db.session.execute(db.insert(Review.__table__), rows)
+            rows = []
+    if rows:
+        db.session.execute(db.insert(Review.__table__), rows)
+    db.session.commit()
+
+
+def measure(client, repeat, limit):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(f'/reviews/{TARGET_TITLE}?limit={limit}')
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200 and len(response.json) == limit
+    timings.sort()
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app('benchmark')
+    results = []
+    with app.app_context():
+        for size in args.sizes:
+            populate(size)
+            plan = db.session.execute(db.text(
+                "EXPLAIN QUERY PLAN SELECT * FROM review WHERE book_id = (SELECT id FROM book WHERE title = :title) "
+                "ORDER BY created_at, id LIMIT 50"
+            ), {'title': TARGET_TITLE}).fetchall() if db.engine.dialect.name == 'sqlite' else []
+            result = {'reviews': size, **measure(app.test_client(), args.repeat, args.limit),
+                      'plan': [row[-1] for row in plan]}
+            results.append(result)
+            print(json.dumps(result))
+        db.drop_all()
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
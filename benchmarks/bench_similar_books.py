@@ -0,0 +1,126 @@
+"""
+Mede a reconstrução dos livros parecidos (`flask rebuild-similar-books`), a consulta GET /books/<title>/similar
+e a atualização incremental feita a cada resenha.
+
+As resenhas, as consultas e as atualizações são sorteadas com popularidade desigual entre os livros
+(poucos livros concentram muitos leitores), como em um catálogo real.
+
+Uso:
+    python -m benchmarks.bench_similar_books --users 100000 --books 100000 --reviews-per-user 10
+"""
+import argparse
+import json
+import random
+import resource
+import statistics
+import time
+
+from flask import current_app
+
+from app import create_app
+from app.models.book import Book
+from app.models.review import Review
+from app.models.user import User
+from app.similarity import rebuild_similar_books, refresh_book_neighbours
+from sql_alchemy import db
+
+BATCH_SIZE = 50000
+
+
+def _insert(table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+
+def popular_book(rng, books):
+    # Popularidade de cauda longa: ids baixos são bem mais lidos, mas todo o catálogo recebe resenhas
+    return int(books * rng.random() ** 3) + 1
+
+
+def populate(users, books, reviews_per_user, seed):
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    _insert(User.__table__, ({'email': f'user{i}@example.com', 'password': 'x'} for i in range(1, users + 1)))
+    _insert(Book.__table__, ({'title': f'Book {i}', 'description': 'Description', 'gender': 'Fiction',
+                              'registered_by': 'user1@example.com'} for i in range(1, books + 1)))
+
+    def reviews():
+        for user in range(1, users + 1):
+            for _ in range(reviews_per_user):
+                book_id = popular_book(rng, books)
+                yield {'rating': rng.randint(0, 5), 'comment': None, 'user_email': f'user{user}@example.com',
+                       'book_id': book_id, 'book_title': f'Book {book_id}'}
+
+    _insert(Review.__table__, reviews())
+    db.session.commit()
+
+
+def percentiles(timings):
+    timings.sort()
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--reviews-per-user', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = create_app('benchmark')
+    with app.app_context():
+        populate(args.users, args.books, args.reviews_per_user, args.seed)
+        config = current_app.config
+        settings = (config['SIMILAR_BOOKS_MIN_RATING'], config['SIMILAR_BOOKS_NEIGHBOURS'], config['SIMILAR_BOOKS_MAX_USER_BOOKS'])
+
+        started = time.perf_counter()
+        books = rebuild_similar_books(*settings)
+        rebuild_seconds = time.perf_counter() - started
+
+        # Os livros consultados e resenhados seguem a mesma popularidade das resenhas
+        rng = random.Random(args.seed + 1)
+        client = app.test_client()
+        lookups = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            response = client.get(f'/books/Book {popular_book(rng, args.books)}/similar')
+            lookups.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200
+
+        refreshes = []
+        for _ in range(args.repeat):
+            book_id, user_email = popular_book(rng, args.books), f'user{rng.randint(1, args.users)}@example.com'
+            started = time.perf_counter()
+            with db.engine.begin() as connection:
+                refresh_book_neighbours(connection, book_id, user_email, *settings, config['SIMILAR_BOOKS_MAX_INCREMENTAL_READERS'])
+            refreshes.append((time.perf_counter() - started) * 1000)
+
+        result = {
+            'users': args.users,
+            'books': args.books,
+            'reviews': args.users * args.reviews_per_user,
+            'books_with_neighbours': books,
+            'rebuild_seconds': round(rebuild_seconds, 1),
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'lookup': percentiles(lookups),
+            'incremental_refresh': percentiles(refreshes),
+        }
+        print(json.dumps(result))
+        db.drop_all()
+    return result
+
+
+if __name__ == '__main__':
+    main()
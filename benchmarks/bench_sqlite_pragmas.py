@@ -0,0 +1,92 @@
+"""
+Compara a vazão de escritas concorrentes no SQLite com as configurações padrão e com as de produção
+(pool de conexões e PRAGMAs WAL, synchronous=NORMAL, mmap_size, cache_size e busy_timeout).
+
+Cada thread grava resenhas pelo caminho normal da API (`Review.save_review`, um commit por linha).
+
+Uso:
+    python -m benchmarks.bench_sqlite_pragmas --threads 8 --duration 5
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from app import create_app
+from app.models.book import Book
+from app.models.review import Review
+from app.models.user import User
+from config import ProductionConfig
+from sql_alchemy import db
+
+SETTINGS = {
+    'default': {},
+    'tuned': {
+        'SQLALCHEMY_ENGINE_OPTIONS': ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS,
+        'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS
+    }
+}
+
+
+def writer(app, stop, counters):
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                Review(rating=5, comment='Great book!', user_email='bench@example.com', book_id=1,
+                       book_title='Bench Book').save_review()
+                counters['writes'] += 1
+            except Exception:
+                db.session.rollback()
+                counters['errors'] += 1
+        db.session.remove()
+
+
+def run(name, threads, duration):
+    app = create_app('benchmark', **SETTINGS[name])
+    with app.app_context():
+        path = db.engine.url.database
+        db.engine.dispose()
+        # O modo WAL fica gravado no arquivo, então cada rodada começa de um banco novo
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        db.create_all()
+        db.session.add(User(email='bench@example.com', password='x'))
+        db.session.add(Book(title='Bench Book', description='Description', gender='Fiction', registered_by='bench@example.com'))
+        db.session.commit()
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+
+    stop = threading.Event()
+    counters = {'writes': 0, 'errors': 0}
+    workers = [threading.Thread(target=writer, args=(app, stop, counters)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    with app.app_context():
+        db.drop_all()
+        db.engine.dispose()
+    return {'settings': name, 'journal_mode': journal_mode, 'threads': threads,
+            'writes_per_second': round(counters['writes'] / duration, 1), 'errors': counters['errors']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for name in SETTINGS:
+        result = run(name, args.threads, args.duration)
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Gerador determinístico de dados sintéticos (usuários, livros, resenhas e clubes) para os benchmarks.
+
+A mesma escala e a mesma semente sempre geram o mesmo banco, de forma que os resultados de execuções
+diferentes possam ser comparados. A escala é o número de livros (e de resenhas); usuários e clubes
+crescem proporcionalmente.
+
+Uso:
+    python -m benchmarks.dataset --scale 100k
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from app.models.book import Book
+from app.models.club import Club, club_book
+from app.models.review import Review
+from app.models.user import User
+from sql_alchemy import db
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+BATCH_SIZE = 50000
+PASSWORD = 'password123'
+GENDERS = ['Fiction', 'Fantasy', 'Romance', 'Mystery', 'Thriller', 'Horror', 'Biography', 'History',
+           'Poetry', 'Science', 'Self-help', 'Children']
+WORDS = ['river', 'shadow', 'garden', 'winter', 'silver', 'empire', 'ocean', 'letter', 'forest', 'dragon',
+         'harbor', 'memory', 'island', 'mirror', 'thunder', 'journey', 'castle', 'secret', 'summer', 'machine',
+         'kingdom', 'lantern', 'desert', 'violin', 'compass', 'orchard', 'canyon', 'feather', 'glacier', 'meadow']
+START = datetime(2024, 1, 1)
+
+
+def parse_scale(value):
+    """
+    Aceita uma escala nomeada (1k, 10k, 100k, 1m) ou um número de livros.
+    """
+    if value.lower() in SCALES:
+        return SCALES[value.lower()]
+    scale = int(value)
+    if scale < 10:
+        raise ValueError('The scale must be at least 10 books.')
+    return scale
+
+
+def sizes(scale):
+    """
+    Quantidades de cada entidade para uma escala.
+    """
+    return {
+        'users': max(10, scale // 100),
+        'books': scale,
+        'reviews': scale,
+        'clubs': max(5, scale // 1000),
+        'books_per_club': min(20, scale)
+    }
+
+
+def _insert(table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def populate(scale, seed=42):
+    """
+    Recria o banco da aplicação atual com os dados sintéticos da escala.
+
+    Todos os usuários têm a senha `PASSWORD`, o usuário 1 (`user1@example.com`) é dono do clube 1
+    e os agregados de avaliação dos livros são recalculados no final.
+
+    Retorna:
+        dict: As quantidades geradas de cada entidade.
+    """
+    rng = random.Random(seed)
+    counts = sizes(scale)
+    db.drop_all()
+    db.create_all()
+
+    # Um único hash para todos os usuários: gerar um por usuário dominaria o tempo de carga
+    password = generate_password_hash(PASSWORD)
+    emails = [f'user{i}@example.com' for i in range(1, counts['users'] + 1)]
+    _insert(User.__table__, ({'email': email, 'password': password} for email in emails))
+
+    titles = [f'{_text(rng, 2).title()} {i}' for i in range(1, counts['books'] + 1)]
+    _insert(Book.__table__, ({
+        'title': title,
+        'description': _text(rng, 12),
+        'gender': rng.choice(GENDERS),
+        'registered_by': rng.choice(emails)
+    } for title in titles))
+
+    def review(i):
+        rating, comment, user_email = rng.randint(0, 5), _text(rng, 8), rng.choice(emails)
+        book_id = rng.randrange(counts['books']) + 1
+        return {'rating': rating, 'comment': comment, 'user_email': user_email, 'book_id': book_id,
+                'book_title': titles[book_id - 1], 'created_at': START + timedelta(seconds=i)}
+
+    _insert(Review.__table__, (review(i) for i in range(counts['reviews'])))
+
+    _insert(Club.__table__, ({
+        'name': f'Club {i}',
+        'owner_id': 1 if i == 1 else rng.randint(1, counts['users'])
+    } for i in range(1, counts['clubs'] + 1)))
+    _insert(club_book, ({'club_id': club_id, 'book_id': book_id}
+                        for club_id in range(1, counts['clubs'] + 1)
+                        for book_id in rng.sample(range(1, counts['books'] + 1), counts['books_per_club'])))
+
+    db.session.commit()
+    Book.repair_rating_aggregates()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='10k')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = create_app('benchmark')
+    with app.app_context():
+        started = time.perf_counter()
+        counts = populate(parse_scale(args.scale), args.seed)
+        print(json.dumps({**counts, 'seconds': round(time.perf_counter() - started, 1)}))
+
+
+if __name__ == '__main__':
+    main()
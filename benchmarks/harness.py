@@ -0,0 +1,522 @@
+"""
+Mede todas as rotas dos blueprints de users, clubs, books e reviews sobre um banco sintético.
+
+Para cada rota são registrados a latência (p50, p99 e média), o número de comandos SQL por requisição
+e o pico de memória alocada durante a requisição (tracemalloc, medido em uma passada separada para
+não distorcer a latência). O resultado é um JSON que pode ser comparado com o de outra execução:
+com `--baseline`, as rotas que pioraram além de `--threshold` são listadas e o comando sai com código 1.
+
+Uso:
+    python -m benchmarks.harness --scale 10k --output results.json
+    python -m benchmarks.harness --scale 10k --baseline results.json
+"""
+import argparse
+import io
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from flask import current_app
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import create_app
+from app.auth import identity_claims
+from app.leaderboard import get_leaderboard
+from app.models.book import Book
+from app.models.club import Club
+from app.models.review import Review
+from app.models.user import User
+from app.similarity import get_similarity_worker, rebuild_similar_books
+from sql_alchemy import db
+from .dataset import PASSWORD, parse_scale, populate
+
+BLUEPRINTS = ('users_blueprint', 'clubs_blueprint', 'books_blueprint', 'review_blueprint')
+
+# Cenário de cada rota: uma função que recebe o contexto e o número da iteração e devolve os argumentos
+# da requisição. O `setup` opcional prepara, fora da medição, os registros que as escritas consomem.
+# Rotas que leem a tabela inteira são marcadas como `heavy` e repetidas menos vezes.
+SCENARIOS = {}
+
+
+def scenario(endpoint, setup=None, heavy=False):
+    def decorator(function):
+        SCENARIOS[endpoint] = {'build': function, 'setup': setup, 'heavy': heavy}
+        return function
+    return decorator
+
+
+class Context:
+    """
+    Registros conhecidos do banco sintético e tokens do usuário 1, usados para montar as requisições.
+    """
+
+    def __init__(self):
+        self.user = db.session.get(User, 1)
+        self.book = db.session.get(Book, 1)
+        self.club = db.session.get(Club, 1)
+        self.review = db.session.get(Review, 1)
+        self.targets = {}
+
+    def token(self, user=None):
+        user = user or self.user
+        return create_access_token(identity=user.id, additional_claims=identity_claims(user))
+
+    def auth(self, user=None):
+        return {'Authorization': f'Bearer {self.token(user)}'}
+
+
+def _insert_many(model, rows):
+    db.session.execute(db.insert(model), rows)
+    db.session.commit()
+
+
+# Users
+
+@scenario('users_blueprint.register_user')
+def register_user(ctx, i):
+    return {'method': 'POST', 'path': '/register', 'json': {'email': f'bench-new-{i}@example.com', 'password': PASSWORD}}
+
+
+@scenario('users_blueprint.login')
+def login(ctx, i):
+    return {'method': 'POST', 'path': '/login', 'json': {'email': ctx.user.email, 'password': PASSWORD}}
+
+
+@scenario('users_blueprint.logout')
+def logout(ctx, i):
+    return {'method': 'POST', 'path': '/logout', 'headers': ctx.auth()}
+
+
+@scenario('users_blueprint.get_user')
+def get_user(ctx, i):
+    return {'method': 'GET', 'path': f'/users/{ctx.user.email}', 'headers': ctx.auth()}
+
+
+@scenario('users_blueprint.edit_user')
+def edit_user(ctx, i):
+    return {'method': 'PUT', 'path': f'/users/{ctx.user.email}', 'json': {'password': PASSWORD}, 'headers': ctx.auth()}
+
+
+def setup_delete_user(ctx, repeat):
+    # O email muda a cada execução: a exclusão revoga os tokens do email no arquivo de revogação, que persiste entre execuções
+    prefix = f'bench-delete-{time.time_ns()}'
+    _insert_many(User, [{'email': f'{prefix}-{i}@example.com', 'password': 'x'} for i in range(repeat)])
+    ctx.targets['users'] = User.query.filter(User.email.like(f'{prefix}-%')).order_by(User.id).all()
+
+
+@scenario('users_blueprint.delete_user', setup=setup_delete_user)
+def delete_user(ctx, i):
+    user = ctx.targets['users'][i]
+    return {'method': 'DELETE', 'path': f'/users/{user.email}', 'headers': ctx.auth(user)}
+
+
+# Clubs
+
+@scenario('clubs_blueprint.register_club')
+def register_club(ctx, i):
+    return {'method': 'POST', 'path': '/clubs', 'json': {'name': f'Bench Club {i}'}, 'headers': ctx.auth()}
+
+
+@scenario('clubs_blueprint.get_all_clubs')
+def get_all_clubs(ctx, i):
+    return {'method': 'GET', 'path': '/clubs'}
+
+
+@scenario('clubs_blueprint.get_club')
+def get_club(ctx, i):
+    return {'method': 'GET', 'path': f'/clubs/{ctx.club.name}'}
+
+
+@scenario('clubs_blueprint.get_club_by_id')
+def get_club_by_id(ctx, i):
+    return {'method': 'GET', 'path': f'/clubs/id/{ctx.club.id}'}
+
+
+@scenario('clubs_blueprint.edit_club')
+def edit_club(ctx, i):
+    return {'method': 'PUT', 'path': f'/clubs/{ctx.club.name}', 'json': {'owner_id': ctx.user.id}, 'headers': ctx.auth()}
+
+
+def setup_delete_club(ctx, repeat):
+    _insert_many(Club, [{'name': f'Bench Delete Club {i}', 'owner_id': ctx.user.id} for i in range(repeat)])
+
+
+@scenario('clubs_blueprint.delete_club', setup=setup_delete_club)
+def delete_club(ctx, i):
+    return {'method': 'DELETE', 'path': f'/clubs/Bench Delete Club {i}', 'headers': ctx.auth()}
+
+
+def setup_add_book(ctx, repeat):
+    _insert_many(Club, [{'name': 'Bench Add Club', 'owner_id': ctx.user.id}])
+    ctx.targets['books'] = db.session.execute(db.select(Book.title).order_by(Book.id).limit(repeat)).scalars().all()
+
+
+@scenario('clubs_blueprint.add_book', setup=setup_add_book)
+def add_book(ctx, i):
+    return {'method': 'POST', 'path': f"/clubs/addbook/Bench Add Club/{ctx.targets['books'][i % len(ctx.targets['books'])]}",
+            'headers': ctx.auth()}
+
+
+def setup_add_books(ctx, repeat):
+    _insert_many(Club, [{'name': f'Bench Add Books Club {i}', 'owner_id': ctx.user.id} for i in range(repeat)])
+    ctx.targets['titles'] = db.session.execute(db.select(Book.title).order_by(Book.id).limit(20)).scalars().all()
+
+
+@scenario('clubs_blueprint.add_books', setup=setup_add_books)
+def add_books(ctx, i):
+    return {'method': 'POST', 'path': f'/clubs/Bench Add Books Club {i}/books', 'json': {'titles': ctx.targets['titles']},
+            'headers': ctx.auth()}
+
+
+@scenario('clubs_blueprint.average_number_of_books_read_by_clubs')
+def average_books_read(ctx, i):
+    return {'method': 'GET', 'path': '/clubs/average-books-read'}
+
+
+# Books
+
+@scenario('books_blueprint.register_book')
+def register_book(ctx, i):
+    return {'method': 'POST', 'path': '/books', 'headers': ctx.auth(),
+            'json': {'title': f'Bench Book {i}', 'description': 'Benchmark description', 'gender': 'Fiction'}}
+
+
+@scenario('books_blueprint.register_books_in_bulk')
+def register_books_in_bulk(ctx, i):
+    rows = ''.join(f'Bench Bulk Book {i}-{j},Benchmark description,Fiction\n' for j in range(100))
+    return {'method': 'POST', 'path': '/books/bulk', 'headers': ctx.auth(), 'content_type': 'text/csv',
+            'data': 'title,description,gender\n' + rows}
+
+
+@scenario('books_blueprint.get_all_books')
+def get_all_books(ctx, i):
+    return {'method': 'GET', 'path': '/books'}
+
+
+@scenario('books_blueprint.get_book_facets')
+def get_book_facets(ctx, i):
+    return {'method': 'GET', 'path': '/books/facets'}
+
+
+@scenario('books_blueprint.search_books')
+def search_books(ctx, i):
+    return {'method': 'GET', 'path': '/books/search', 'query_string': {'q': ctx.book.description.split()[i % 12], 'limit': 20}}
+
+
+def setup_top_books(ctx, repeat):
+    # Em produção o ranking é montado na criação da aplicação; aqui o banco é populado depois dela
+    get_leaderboard().rebuild()
+
+
+@scenario('books_blueprint.get_top_books', setup=setup_top_books)
+def get_top_books(ctx, i):
+    return {'method': 'GET', 'path': '/books/top', 'query_string': {'limit': 20, 'min_reviews': 2}}
+
+
+@scenario('books_blueprint.get_book')
+def get_book(ctx, i):
+    return {'method': 'GET', 'path': f'/books/{ctx.book.title}'}
+
+
+@scenario('books_blueprint.get_book_by_id')
+def get_book_by_id(ctx, i):
+    return {'method': 'GET', 'path': f'/books/id/{ctx.book.id}'}
+
+
+def setup_similar_books(ctx, repeat):
+    config = current_app.config
+    rebuild_similar_books(config['SIMILAR_BOOKS_MIN_RATING'], config['SIMILAR_BOOKS_NEIGHBOURS'], config['SIMILAR_BOOKS_MAX_USER_BOOKS'])
+
+
+@scenario('books_blueprint.get_similar_books', setup=setup_similar_books)
+def get_similar_books(ctx, i):
+    return {'method': 'GET', 'path': f'/books/{ctx.book.title}/similar'}
+
+
+def setup_edit_book(ctx, repeat):
+    _insert_many(Book, [{'title': 'Bench Edit Book', 'description': 'Benchmark description', 'gender': 'Fiction',
+                         'registered_by': ctx.user.email}])
+
+
+@scenario('books_blueprint.edit_book', setup=setup_edit_book)
+def edit_book(ctx, i):
+    return {'method': 'PUT', 'path': '/books/Bench Edit Book', 'json': {'description': f'Edited description {i}'},
+            'headers': ctx.auth()}
+
+
+def setup_delete_book(ctx, repeat):
+    _insert_many(Book, [{'title': f'Bench Delete Book {i}', 'description': 'Benchmark description', 'gender': 'Fiction',
+                         'registered_by': ctx.user.email} for i in range(repeat)])
+
+
+@scenario('books_blueprint.delete_book', setup=setup_delete_book)
+def delete_book(ctx, i):
+    return {'method': 'DELETE', 'path': f'/books/Bench Delete Book {i}', 'headers': ctx.auth()}
+
+
+# Reviews
+
+@scenario('review_blueprint.register_review')
+def register_review(ctx, i):
+    return {'method': 'POST', 'path': '/reviews', 'headers': ctx.auth(),
+            'json': {'rating': str(i % 6), 'comment': 'Benchmark review', 'book_title': ctx.book.title}}
+
+
+@scenario('review_blueprint.get_all_reviews', heavy=True)
+def get_all_reviews(ctx, i):
+    return {'method': 'GET', 'path': '/reviews/'}
+
+
+@scenario('review_blueprint.export_reviews', heavy=True)
+def export_reviews(ctx, i):
+    return {'method': 'GET', 'path': '/reviews/export'}
+
+
+@scenario('review_blueprint.get_all_reviews_by_book')
+def get_all_reviews_by_book(ctx, i):
+    return {'method': 'GET', 'path': f'/reviews/{ctx.book.title}'}
+
+
+@scenario('review_blueprint.get_review')
+def get_review(ctx, i):
+    return {'method': 'GET', 'path': f'/reviews/{ctx.review.id}'}
+
+
+@scenario('review_blueprint.average_rating_of_book')
+def average_rating_of_book(ctx, i):
+    return {'method': 'GET', 'path': f'/reviews/avarage-rating/{ctx.book.title}'}
+
+
+def setup_user_reviews(ctx, repeat):
+    _insert_many(Review, [{'rating': 3, 'comment': 'Benchmark review', 'user_email': ctx.user.email,
+                           'book_id': ctx.book.id, 'book_title': ctx.book.title} for _ in range(repeat)])
+    ctx.targets['reviews'] = db.session.execute(
+        db.select(Review.id).where(Review.user_email == ctx.user.email, Review.comment == 'Benchmark review')
+        .order_by(Review.id.desc()).limit(repeat)
+    ).scalars().all()
+
+
+@scenario('review_blueprint.edit_review', setup=setup_user_reviews)
+def edit_review(ctx, i):
+    return {'method': 'PUT', 'path': f"/reviews/{ctx.targets['reviews'][0]}", 'json': {'rating': str(i % 6)},
+            'headers': ctx.auth()}
+
+
+@scenario('review_blueprint.delete_review', setup=setup_user_reviews)
+def delete_review(ctx, i):
+    return {'method': 'DELETE', 'path': f"/reviews/{ctx.targets['reviews'][i]}", 'headers': ctx.auth()}
+
+
+class StatementCounter:
+    # Conta só os comandos da thread que envia as requisições; o trabalho em segundo plano
+    # (ex.: a atualização dos livros parecidos) não faz parte do custo da rota
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.thread = threading.get_ident()
+
+    def __call__(self, *args):
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self)
+
+
+def _send(client, spec):
+    spec = dict(spec)
+    method, path = spec.pop('method'), spec.pop('path')
+    if 'data' in spec and isinstance(spec['data'], str):
+        spec['data'] = io.BytesIO(spec['data'].encode('utf-8'))
+    response = client.open(path, method=method, **spec)
+    # Consome o corpo chunk a chunk, sem juntá-lo, para não somar o buffer do cliente ao pico de memória
+    for _ in response.iter_encoded():
+        pass
+    response.close()
+    return response.status_code
+
+
+def _percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def prepare(name, repeat, memory_samples):
+    """
+    Roda o setup do cenário e monta as requisições (inclusive os tokens) antes da medição.
+
+    Deve ser chamada com um contexto de aplicação ativo.
+
+    Retorna:
+        tuple: As requisições medidas por tempo e as usadas na passada de memória.
+    """
+    definition = SCENARIOS[name]
+    if definition['heavy']:
+        repeat = max(1, min(repeat, 5))
+    memory_samples = min(memory_samples, repeat)
+    ctx = Context()
+    if definition['setup']:
+        definition['setup'](ctx, repeat + memory_samples)
+    specs = [definition['build'](ctx, i) for i in range(repeat + memory_samples)]
+    return specs[:repeat], specs[repeat:]
+
+
+def measure(client, engine, timed_specs, memory_specs):
+    """
+    Envia as requisições sem contexto de aplicação ativo, para que cada uma tenha a sua sessão, como em produção.
+    """
+    statuses, timings, statements = Counter(), [], []
+    for spec in timed_specs:
+        with StatementCounter(engine) as counter:
+            started = time.perf_counter()
+            status = _send(client, spec)
+            timings.append((time.perf_counter() - started) * 1000)
+        statuses[status] += 1
+        statements.append(counter.count)
+
+    peaks = []
+    for spec in memory_specs:
+        tracemalloc.start()
+        _send(client, spec)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'requests': len(timed_specs),
+        'status': {str(code): total for code, total in sorted(statuses.items())},
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(_percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'statements': statistics.median_low(statements),
+        'peak_kb': round(max(peaks) / 1024, 1) if peaks else None
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """
+    Compara os resultados com os de uma execução anterior.
+
+    Uma rota regrediu quando a p50 ou o pico de memória cresceram mais que `threshold` vezes (com a p50
+    também ao menos `min_delta_ms` mais lenta, para ignorar ruído) ou quando passou a executar mais comandos SQL.
+
+    Retorna:
+        list: Uma descrição de cada regressão encontrada.
+    """
+    regressions = []
+    if baseline['meta']['scale'] != results['meta']['scale']:
+        regressions.append(f"scale differs from baseline: {results['meta']['scale']} != {baseline['meta']['scale']}")
+        return regressions
+
+    for route, current in results['routes'].items():
+        previous = baseline['routes'].get(route)
+        if previous is None:
+            continue
+        if current['p50_ms'] > previous['p50_ms'] * threshold and current['p50_ms'] - previous['p50_ms'] >= min_delta_ms:
+            regressions.append(f"{route}: p50 {previous['p50_ms']} ms -> {current['p50_ms']} ms")
+        if current['statements'] > previous['statements']:
+            regressions.append(f"{route}: SQL statements {previous['statements']} -> {current['statements']}")
+        if current['peak_kb'] and previous['peak_kb'] and current['peak_kb'] > previous['peak_kb'] * threshold:
+            regressions.append(f"{route}: peak memory {previous['peak_kb']} KB -> {current['peak_kb']} KB")
+    return regressions
+
+
+def run(scale, seed, repeat, memory_samples, only=None):
+    app = create_app('benchmark')
+    with app.app_context():
+        started = time.perf_counter()
+        counts = populate(scale, seed)
+        populate_seconds = round(time.perf_counter() - started, 1)
+        engine = db.engine
+
+    rules = {rule.endpoint: rule for rule in app.url_map.iter_rules() if rule.endpoint.split('.')[0] in BLUEPRINTS}
+    unmeasured = sorted(endpoint for endpoint in rules if endpoint not in SCENARIOS)
+    for endpoint in unmeasured:
+        print(f'warning: no benchmark scenario for {endpoint}', file=sys.stderr)
+
+    client = app.test_client()
+    routes = {}
+    for name in SCENARIOS:
+        if name not in rules or (only and not any(pattern in name for pattern in only)):
+            continue
+        rule = rules[name]
+        key = f"{sorted(rule.methods - {'HEAD', 'OPTIONS'})[0]} {rule.rule}"
+        with app.app_context():
+            timed_specs, memory_specs = prepare(name, repeat, memory_samples)
+        routes[key] = {'endpoint': name, **measure(client, engine, timed_specs, memory_specs)}
+        print(json.dumps({'route': key, **routes[key]}), file=sys.stderr)
+        # O que ficou na fila dos livros parecidos não pode pesar na rota seguinte
+        with app.app_context():
+            get_similarity_worker().join()
+
+    with app.app_context():
+        get_similarity_worker().join()
+        db.drop_all()
+
+    return {
+        'meta': {
+            'scale': scale,
+            'seed': seed,
+            'repeat': repeat,
+            'counts': counts,
+            'populate_seconds': populate_seconds,
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        },
+        'routes': routes,
+        'unmeasured': unmeasured
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='10k', help='1k, 10k, 100k, 1m ou um número de livros')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--memory-samples', type=int, default=3)
+    parser.add_argument('--only', nargs='+', help='Mede só os endpoints cujo nome contém um destes trechos')
+    parser.add_argument('--output', help='Grava o resultado JSON neste arquivo (padrão: saída padrão)')
+    parser.add_argument('--baseline', help='Resultado JSON de uma execução anterior para comparação')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--min-delta-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    results = run(parse_scale(args.scale), args.seed, args.repeat, args.memory_samples, args.only)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f'regression: {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
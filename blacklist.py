@@ -1 +1,146 @@
-BLACKLIST = set()
\ No newline at end of file
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+NEVER_EXPIRES = float('inf')
+
+
+class MemoryRevocationStore:
+    """
+    Guarda os tokens revogados na memória do processo.
+
+    Só é visível para o próprio processo, por isso serve para testes e para execuções com um único worker.
+    """
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, expires_at):
+        now = time.time()
+        with self._lock:
+            self._tokens = {token: exp for token, exp in self._tokens.items() if exp > now}
+            self._tokens[jti] = expires_at
+
+    def revoked_until(self, jti):
+        expires_at = self._tokens.get(jti)
+        if expires_at is not None and expires_at > time.time():
+            return expires_at
+        return None
+
+
+class SQLiteRevocationStore:
+    """
+    Guarda os tokens revogados em um arquivo SQLite compartilhado entre processos (ex.: workers do gunicorn).
+
+    Cada entrada expira junto com o `exp` do token e é removida nas revogações seguintes.
+    """
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS revoked_token (jti TEXT PRIMARY KEY, expires_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_revoked_token_expires_at ON revoked_token (expires_at)')
+
+    def _connection(self):
+        # Uma conexão por thread e por processo, para continuar válida depois de um fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def revoke(self, jti, expires_at):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM revoked_token WHERE expires_at <= ?', (time.time(),))
+            conn.execute('INSERT OR REPLACE INTO revoked_token (jti, expires_at) VALUES (?, ?)', (jti, expires_at))
+
+    def revoked_until(self, jti):
+        row = self._connection().execute(
+            'SELECT expires_at FROM revoked_token WHERE jti = ? AND expires_at > ?', (jti, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+
+class CachedRevocationStore:
+    """
+    Coloca um LRU em memória na frente de um backend compartilhado.
+
+    Tokens revogados ficam no cache até expirarem. Tokens válidos só ficam `negative_ttl` segundos,
+    que é o maior atraso para um worker enxergar uma revogação feita por outro processo.
+    """
+
+    def __init__(self, backend, maxsize=10000, negative_ttl=1.0):
+        self.backend = backend
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, jti, revoked, until):
+        with self._lock:
+            self._entries[jti] = (revoked, until)
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def revoke(self, jti, expires_at):
+        self.backend.revoke(jti, expires_at)
+        self._remember(jti, True, expires_at)
+
+    def revoked_until(self, jti):
+        entry = self._entries.get(jti)
+        now = time.time()
+        if entry is not None and entry[1] > now:
+            revoked, until = entry
+            return until if revoked else None
+
+        expires_at = self.backend.revoked_until(jti)
+        if expires_at is not None:
+            self._remember(jti, True, expires_at)
+        else:
+            self._remember(jti, False, now + self.negative_ttl)
+        return expires_at
+
+
+class Blacklist:
+    """
+    Lista de tokens JWT revogados (logout e exclusão de usuário) da aplicação atual.
+
+    O backend é escolhido por `JWT_REVOCATION_STORE`: `memory` (apenas o processo atual)
+    ou `sqlite` (arquivo `JWT_REVOCATION_DATABASE` compartilhado entre processos, com cache LRU local).
+    """
+
+    def init_app(self, app):
+        store = app.config['JWT_REVOCATION_STORE']
+        if store == 'memory':
+            backend = MemoryRevocationStore()
+        elif store == 'sqlite':
+            os.makedirs(app.instance_path, exist_ok=True)
+            path = os.path.join(app.instance_path, app.config['JWT_REVOCATION_DATABASE'])
+            backend = CachedRevocationStore(SQLiteRevocationStore(path),
+                                            maxsize=app.config['JWT_REVOCATION_CACHE_SIZE'],
+                                            negative_ttl=app.config['JWT_REVOCATION_NEGATIVE_TTL'])
+        else:
+            raise ValueError(f'Unknown JWT revocation store: {store}')
+        app.extensions['blacklist'] = backend
+
+    @property
+    def store(self):
+        return current_app.extensions['blacklist']
+
+    def add(self, jti, expires_at=None):
+        self.store.revoke(jti, NEVER_EXPIRES if expires_at is None else expires_at)
+
+    def __contains__(self, jti):
+        return self.store.revoked_until(jti) is not None
+
+
+BLACKLIST = Blacklist()
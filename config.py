@@ -4,6 +4,55 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLITE_PRAGMAS = {}
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 100))
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+    # 'auto' usa o orjson quando ele está instalado; 'stdlib' fica com o json da biblioteca padrão
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+    STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 500))
+    # Livros mais recentes ranqueados em cada faixa da busca (título e demais); 0 ranqueia todos
+    SEARCH_MAX_CANDIDATES = int(os.environ.get('SEARCH_MAX_CANDIDATES', 500))
+    SEARCH_TITLE_WEIGHT = float(os.environ.get('SEARCH_TITLE_WEIGHT', 10))
+    TOP_BOOKS_PRIOR_WEIGHT = float(os.environ.get('TOP_BOOKS_PRIOR_WEIGHT', 10))
+    TOP_BOOKS_MIN_REVIEWS = int(os.environ.get('TOP_BOOKS_MIN_REVIEWS', 1))
+    # Valores aceitos em `min_reviews` no GET /books/top; cada um mantém o seu ranking em memória
+    TOP_BOOKS_MIN_REVIEWS_LEVELS = [int(level) for level in os.environ.get('TOP_BOOKS_MIN_REVIEWS_LEVELS', '1,2,5,10,20,50,100').split(',') if level.strip()]
+    TOP_BOOKS_REFRESH_INTERVAL = int(os.environ.get('TOP_BOOKS_REFRESH_INTERVAL', 300))
+    SIMILAR_BOOKS_MIN_RATING = int(os.environ.get('SIMILAR_BOOKS_MIN_RATING', 4))
+    SIMILAR_BOOKS_NEIGHBOURS = int(os.environ.get('SIMILAR_BOOKS_NEIGHBOURS', 20))
+    SIMILAR_BOOKS_MAX_USER_BOOKS = int(os.environ.get('SIMILAR_BOOKS_MAX_USER_BOOKS', 500))
+    SIMILAR_BOOKS_MAX_INCREMENTAL_READERS = int(os.environ.get('SIMILAR_BOOKS_MAX_INCREMENTAL_READERS', 1000))
+    SIMILAR_BOOKS_INCREMENTAL = os.environ.get('SIMILAR_BOOKS_INCREMENTAL', 'true').lower() in ('1', 'true', 'yes')
+    SIMILAR_BOOKS_QUEUE_SIZE = int(os.environ.get('SIMILAR_BOOKS_QUEUE_SIZE', 10000))
+    CLUB_BOOKS_MAX_TITLES = int(os.environ.get('CLUB_BOOKS_MAX_TITLES', 1000))
+    CLUB_STATS_CACHE = os.environ.get('CLUB_STATS_CACHE', 'false').lower() in ('1', 'true', 'yes')
+    CLUB_STATS_CACHE_TTL = int(os.environ.get('CLUB_STATS_CACHE_TTL', 60))
+    JWT_REVOCATION_STORE = os.environ.get('JWT_REVOCATION_STORE', 'sqlite')
+    JWT_REVOCATION_DATABASE = os.environ.get('JWT_REVOCATION_DATABASE', 'revoked_tokens.db')
+    JWT_REVOCATION_CACHE_SIZE = int(os.environ.get('JWT_REVOCATION_CACHE_SIZE', 10000))
+    JWT_REVOCATION_NEGATIVE_TTL = float(os.environ.get('JWT_REVOCATION_NEGATIVE_TTL', 1.0))
+    RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'memory')
+    RESPONSE_CACHE_MAXSIZE = int(os.environ.get('RESPONSE_CACHE_MAXSIZE', 1024))
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    RESPONSE_CACHE_DATABASE = os.environ.get('RESPONSE_CACHE_DATABASE', 'response_cache.db')
+    REQUEST_LOG_ENABLED = os.environ.get('REQUEST_LOG_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    REQUEST_LOG_FILE = os.environ.get('REQUEST_LOG_FILE', 'app.log')
+    REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 1.0))
+    REQUEST_LOG_HEADERS = [header.strip() for header in os.environ.get('REQUEST_LOG_HEADERS', 'User-Agent').split(',') if header.strip()]
+    REQUEST_LOG_QUEUE_SIZE = int(os.environ.get('REQUEST_LOG_QUEUE_SIZE', 10000))
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_SALT_LENGTH = int(os.environ.get('PASSWORD_HASH_SALT_LENGTH', 16))
+    PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'process')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 30))
+    QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    QUERY_BUDGET_LOG_ENABLED = os.environ.get('QUERY_BUDGET_LOG_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    QUERY_BUDGET_STATEMENTS = int(os.environ.get('QUERY_BUDGET_STATEMENTS', 20))
+    QUERY_BUDGET_DB_MS = float(os.environ.get('QUERY_BUDGET_DB_MS', 100))
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -13,14 +62,45 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
+    JWT_REVOCATION_STORE = 'memory'
+    RESPONSE_CACHE = 'null'
+    REQUEST_LOG_ENABLED = False
+    PASSWORD_HASH_EXECUTOR = 'inline'
+    # A thread dos livros parecidos só é ligada nos testes que esperam por ela
+    SIMILAR_BOOKS_INCREMENTAL = False
     PRESERVE_CONTEXT_ON_EXCEPTION = False
 
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('BENCHMARK_DATABASE_URL', 'sqlite:///benchmark.db')
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'benchmark')
+    RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'null')
+    REQUEST_LOG_ENABLED = False
+
 class ProductionConfig(Config):
     DEBUG = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+    # O cache em memória é de cada worker e não veria as invalidações feitas pelos outros;
+    # o backend em disco é compartilhado entre eles
+    RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'disk')
+    # Aplicados apenas quando o banco é SQLite
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    }
 
 config = {
     'development': DevelopmentConfig,
     'testing': TestingConfig,
+    'benchmark': BenchmarkConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
@@ -0,0 +1,21 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import db
+
+
+@contextmanager
+def capture_statements():
+    """
+    Guarda o texto dos comandos SQL executados no bloco, para os testes que verificam quais consultas são feitas.
+
+    Para verificar só a quantidade de comandos de uma requisição, basta o header `X-DB-Queries`.
+    """
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
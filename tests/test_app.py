@@ -0,0 +1,181 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from flask import json
+from flask.json.provider import DefaultJSONProvider
+from flask_testing import TestCase
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models.user import User
+from app.models.book import Book
+from app.json_provider import OrjsonProvider, StdlibJSONProvider, orjson
+from app.request_log import init_request_logging, stop_request_logging
+
+class AppTestCase(TestCase):
+    def create_app(self):
+        # Configura a aplicação Flask para o ambiente de teste
+        app = create_app('testing')
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.client = self.app.test_client()
+
+        # Adiciona um usuário para teste
+        hashed_password = 'password123'  # Evita a necessidade de gerar um hash para o teste
+        user = User(email='test@example.com', password=hashed_password)
+        db.session.add(user)
+        db.session.commit()
+
+        self.user_id = user.id
+        self.token = create_access_token(identity=self.user_id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_request_logging(self):
+        """
+        Testa o log de requisições em segundo plano.
+        
+        Este teste verifica se cada requisição gera um único registro JSON, apenas com os headers permitidos.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            log_file = os.path.join(directory, 'requests.log')
+            self.app.config.update(REQUEST_LOG_ENABLED=True, REQUEST_LOG_FILE=log_file, REQUEST_LOG_HEADERS=['User-Agent'])
+            init_request_logging(self.app)
+
+            self.client.get('/books?limit=1', headers={'User-Agent': 'tests', 'Authorization': f'Bearer {self.token}'})
+            stop_request_logging(self.app)
+
+            with open(log_file) as file:
+                records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['path'], '/books?limit=1')
+        self.assertEqual(records[0]['status'], 200)
+        self.assertEqual(records[0]['headers'], {'User-Agent': 'tests'})
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_request_logging_after_fork(self):
+        """
+        Testa o log de requisições em um processo filho criado depois da aplicação.
+        
+        Este teste verifica se, como nos workers do `gunicorn --preload`, o processo filho recria a thread de log
+        e grava os registros das suas requisições, em vez de deixá-los na fila herdada do pai.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            log_file = os.path.join(directory, 'requests.log')
+            self.app.config.update(REQUEST_LOG_ENABLED=True, REQUEST_LOG_FILE=log_file)
+            init_request_logging(self.app)
+
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    for _ in range(10):
+                        self.client.get('/missing')
+                    stop_request_logging(self.app)
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            stop_request_logging(self.app)
+
+            with open(log_file) as file:
+                records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), 10)
+        self.assertEqual({record['path'] for record in records}, {'/missing'})
+
+    def test_query_stats_headers(self):
+        """
+        Testa os headers de instrumentação SQL das respostas.
+        
+        Este teste verifica se os comandos da requisição são contados em X-DB-Queries e Server-Timing
+        e se uma requisição acima do orçamento é registrada no log.
+        """
+        Book(title='New Book', description='Description of new book', gender='Fiction', registered_by='test@example.com').save_book()
+
+        response = self.client.get('/books/New Book')
+        self.assertEqual(response.headers['X-DB-Queries'], '2')
+        self.assertRegex(response.headers['Server-Timing'], r'^db;dur=[0-9.]+;desc="2 queries", app;dur=[0-9.]+$')
+
+        self.app.config.update(QUERY_BUDGET_LOG_ENABLED=True, QUERY_BUDGET_STATEMENTS=1)
+        with self.assertLogs('bookbridge.queries', level='WARNING') as logs:
+            self.client.get('/books/New Book')
+        self.assertIn('GET /books/New Book ran 2 statements', logs.output[0])
+
+    def test_json_provider(self):
+        """
+        Testa os providers JSON da aplicação.
+        
+        Este teste verifica se as respostas saem iguais às do provider padrão do Flask, com as chaves ordenadas
+        e as datas no formato HTTP, tanto com o json da biblioteca padrão quanto com o orjson (quando instalado).
+        """
+        default = DefaultJSONProvider(self.app)
+        payload = [{
+            'title': 'Book', 'id': 1, 'score': 0.25, 'comment': None,
+            'created_at': datetime(2024, 5, 1, 12, 30, 15, 999999),
+            'updated_at': datetime(2024, 5, 1, 23, 30, 15, tzinfo=timezone(timedelta(hours=-3))),
+            'published': date(1999, 12, 31),
+            'gender': {2: 'Fiction', 1: 'Drama'},
+        }]
+        providers = ['stdlib', 'auto'] + (['orjson'] if orjson is not None else [])
+
+        for name in providers:
+            app = create_app('testing', JSON_PROVIDER=name)
+            provider = app.json
+            with app.test_request_context():
+                self.assertEqual(provider.response(payload).get_data(), default.response(payload).get_data())
+            self.assertEqual(json.loads(provider.dumps(payload)), json.loads(default.dumps(payload)))
+            self.assertEqual(provider.loads(b'{"a": [1, 2]}'), {'a': [1, 2]})
+            self.assertEqual(json.loads(provider.dumps({'big': 2 ** 70})), {'big': 2 ** 70})
+        self.assertIn('"created_at":"Wed, 01 May 2024 12:30:15 GMT"', self.app.json.dumps(payload))
+        self.assertIn('"updated_at":"Thu, 02 May 2024 02:30:15 GMT"', self.app.json.dumps(payload))
+        self.assertIsInstance(self.app.json, OrjsonProvider if orjson is not None else StdlibJSONProvider)
+
+    def test_metrics_endpoint(self):
+        """
+        Testa o endpoint de métricas no formato do Prometheus.
+        
+        Este teste verifica se as requisições são contadas por endpoint e status, com histograma de latência,
+        e se no modo multiprocesso os snapshots de outros processos são somados, descartando os gauges
+        dos processos encerrados.
+        """
+        def requests_total(text):
+            prefix = 'bookbridge_http_requests_total{blueprint="books_blueprint",endpoint="books_blueprint.get_book",method="GET",status="404"} '
+            lines = [line for line in text.splitlines() if line.startswith(prefix)]
+            return int(lines[0][len(prefix):]) if lines else 0
+
+        before = requests_total(self.client.get('/metrics').get_data(as_text=True))
+        self.client.get('/books/Missing Book')
+        response = self.client.get('/metrics')
+        text = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        self.assertEqual(requests_total(text), before + 1)
+        self.assertIn('# TYPE bookbridge_http_request_duration_seconds histogram', text)
+        self.assertIn('bookbridge_http_request_duration_seconds_bucket{blueprint="books_blueprint",endpoint="books_blueprint.get_book",le="+Inf"}', text)
+        self.assertIn('bookbridge_http_requests_in_flight{blueprint="",endpoint="metrics"} 1', text)
+        self.assertIn('bookbridge_db_pool_checkouts_total', text)
+
+        with tempfile.TemporaryDirectory() as directory:
+            finished = subprocess.Popen([sys.executable, '-c', ''])
+            finished.wait()
+            with open(os.path.join(directory, f'metrics-{finished.pid}.json'), 'w') as file:
+                json.dump({'pid': finished.pid, 'samples': [
+                    ['bookbridge_http_requests_total', [['blueprint', 'books_blueprint'], ['endpoint', 'books_blueprint.get_book'],
+                                                                  ['method', 'GET'], ['status', '404']], 5],
+                    ['bookbridge_db_pool_checked_out', [], 3]
+                ]}, file)
+
+            app = create_app('testing', METRICS_MULTIPROC_DIR=directory)
+            text = app.test_client().get('/metrics').get_data(as_text=True)
+            self.assertEqual(requests_total(text), before + 6)
+            checked_out = [line for line in text.splitlines() if line.startswith('bookbridge_db_pool_checked_out ')]
+            self.assertLess(int(checked_out[0].split()[1]), 3)
+            self.assertTrue(os.path.exists(os.path.join(directory, f'metrics-{os.getpid()}.json')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,6 @@
+import os
+import sqlite3
+import tempfile
 import unittest
 from flask import json
 from flask_testing import TestCase
@@ -6,6 +9,10 @@ from flask_jwt_extended import create_access_token
 from app import create_app, db
 from app.models.user import User
 from app.models.book import Book
+from app.models.review import Review
+from app.auth import identity_claims
+from app.cache import response_cache
+from helpers import capture_statements
 
 class BookTestCase(TestCase):
     def create_app(self):
@@ -46,6 +53,80 @@ class BookTestCase(TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertIn('Book created successfully!', response.json['message'])
 
+    def test_register_book_with_identity_claims(self):
+        """
+        Testa o registro de um livro com um token que traz a identidade nas claims.
+        
+        Este teste verifica se o livro é registrado pelo email do token sem consultar a tabela de usuários.
+        """
+        user = db.session.get(User, self.user_id)
+        token = create_access_token(identity=self.user_id, additional_claims=identity_claims(user))
+        with capture_statements() as statements:
+            response = self.client.post('/books', data=json.dumps({
+                'title': 'Claims Book',
+                'description': 'Description of claims book',
+                'gender': 'Fiction'
+            }), headers={'Authorization': f'Bearer {token}'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Book.book_exists('Claims Book').registered_by, 'test@example.com')
+        self.assertFalse([statement for statement in statements if 'FROM user' in statement])
+
+    def test_register_books_in_bulk(self):
+        """
+        Testa o registro de livros em lote a partir de NDJSON.
+        
+        Este teste verifica se as linhas válidas são inseridas e se duplicatas e linhas inválidas são reportadas por linha.
+        """
+        book = Book(title='Existing Book', description='Description', gender='Fiction', registered_by='test@example.com')
+        db.session.add(book)
+        db.session.commit()
+        rows = [
+            {'title': 'Book 1', 'description': 'Description', 'gender': 'Fiction'},
+            {'title': 'Existing Book', 'description': 'Description', 'gender': 'Fiction'},
+            {'title': 'Book 1', 'description': 'Description', 'gender': 'Fiction'},
+            {'title': 'Book 2', 'gender': 'Fiction'},
+            {'title': 'Book 3', 'description': 'Description', 'gender': 'Fiction'}
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\nnot json\n'
+
+        response = self.client.post('/books/bulk?batch_size=2', data=body, headers={
+            'Authorization': f'Bearer {self.token}'
+        }, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 2)
+        self.assertEqual(response.json['errors'], [
+            {'line': 2, 'message': 'Book already exists!'},
+            {'line': 3, 'message': 'Book already exists!'},
+            {'line': 4, 'message': 'Missing description!'},
+            {'line': 6, 'message': 'Invalid row!'}
+        ])
+        self.assertEqual(Book.query.filter(Book.title.in_(['Book 1', 'Book 3'])).count(), 2)
+
+    def test_register_books_in_bulk_invalid_encoding(self):
+        """
+        Testa o registro de livros em lote com bytes que não são UTF-8 válido.
+        
+        Este teste verifica se as linhas com bytes inválidos são reportadas como inválidas, sem interromper
+        a importação das demais, tanto em CSV quanto em NDJSON.
+        """
+        headers = {'Authorization': f'Bearer {self.token}'}
+        body = b'title,description,gender\nBook 1,Description,Fiction\n\xff\xfe bad,Description,Fiction\nBook 2,Description,Fiction\n'
+        response = self.client.post('/books/bulk', data=body, headers=headers, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 2)
+        self.assertEqual(response.json['errors'], [{'line': 3, 'message': 'Invalid row!'}])
+
+        body = b'{"title": "Book \xff", "description": "Description", "gender": "Fiction"}\n' \
+               b'{"title": "Book 3", "description": "Description", "gender": "Fiction"}\n'
+        response = self.client.post('/books/bulk', data=body, headers=headers, content_type='application/x-ndjson')
+        self.assertEqual((response.json['inserted'], response.json['errors']), (1, [{'line': 1, 'message': 'Invalid row!'}]))
+
+        response = self.client.post('/books/bulk', data=b'\xff\xfe bad', headers=headers, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json['inserted'], response.json['errors']), (0, [{'line': 1, 'message': 'Invalid row!'}]))
+        self.assertEqual(Book.query.count(), 3)
+
     def test_get_all_books(self):
         """
         Testa a obtenção de uma lista de todos os livros.
@@ -61,6 +142,112 @@ class BookTestCase(TestCase):
         self.assertEqual(len(response.json), 1)
         self.assertEqual(response.json[0]['title'], 'New Book')
 
+    def test_get_all_books_paginated(self):
+        """
+        Testa a paginação por cursor da lista de livros.
+        
+        Este teste verifica se os parâmetros `after` e `limit` retornam páginas consecutivas e o header `X-Next-Cursor`.
+        """
+        for i in range(3):
+            db.session.add(Book(title=f'Book {i}', description='Description', gender='Fiction', registered_by='test@example.com'))
+        db.session.commit()
+
+        response = self.client.get('/books?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['title'] for book in response.json], ['Book 0', 'Book 1'])
+        next_cursor = response.headers['X-Next-Cursor']
+
+        response = self.client.get(f'/books?limit=2&after={next_cursor}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['title'] for book in response.json], ['Book 2'])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+    def test_get_all_books_by_gender(self):
+        """
+        Testa o filtro por gênero da lista de livros.
+        
+        Este teste verifica se apenas os livros do gênero pedido são retornados, inclusive com paginação.
+        """
+        for i, gender in enumerate(['Fiction', 'Poetry', 'Fiction', 'Fiction']):
+            db.session.add(Book(title=f'Book {i}', description='Description', gender=gender, registered_by='test@example.com'))
+        db.session.commit()
+
+        response = self.client.get('/books?gender=Fiction&limit=2')
+        self.assertEqual([book['title'] for book in response.json], ['Book 0', 'Book 2'])
+        response = self.client.get(f"/books?gender=Fiction&limit=2&after={response.headers['X-Next-Cursor']}")
+        self.assertEqual([book['title'] for book in response.json], ['Book 3'])
+        self.assertEqual(self.client.get('/books?gender=Drama').json, [])
+
+    def test_get_book_facets(self):
+        """
+        Testa a contagem de livros por gênero.
+        
+        Este teste verifica se as contagens são retornadas, guardadas em cache e invalidadas no registro de um livro.
+        """
+        self.app.config['RESPONSE_CACHE'] = 'memory'
+        response_cache.init_app(self.app)
+        for i, gender in enumerate(['Fiction', 'Poetry', 'Fiction']):
+            Book(title=f'Book {i}', description='Description', gender=gender, registered_by='test@example.com').save_book()
+
+        response = self.client.get('/books/facets')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'gender': {'Fiction': 2, 'Poetry': 1}})
+        self.assertEqual(self.client.get('/books/facets').headers['X-Cache'], 'HIT')
+
+        self.client.post('/books', data=json.dumps({
+            'title': 'Book 3',
+            'description': 'Description',
+            'gender': 'Poetry'
+        }), headers={'Authorization': f'Bearer {self.token}'}, content_type='application/json')
+        response = self.client.get('/books/facets')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(response.json, {'gender': {'Fiction': 2, 'Poetry': 2}})
+
+    def test_get_all_books_stream(self):
+        """
+        Testa a obtenção da lista de livros em modo streaming.
+        
+        Este teste verifica se todos os livros, com suas reviews, são enviados quando `stream=true`.
+        """
+        self.app.config['STREAM_CHUNK_SIZE'] = 2
+        for i in range(5):
+            db.session.add(Book(title=f'Book {i}', description='Description', gender='Fiction', registered_by='test@example.com'))
+        db.session.commit()
+
+        response = self.client.get('/books?stream=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        books = json.loads(response.get_data(as_text=True))
+        self.assertEqual([book['title'] for book in books], [f'Book {i}' for i in range(5)])
+        self.assertEqual(books[0]['reviews'], [])
+
+    def test_get_all_books_sparse_fields(self):
+        """
+        Testa a listagem de livros com os parâmetros `fields` e `include`.
+        
+        Este teste verifica se só os campos pedidos são lidos do banco e retornados, se as reviews só são
+        consultadas quando incluídas e se um campo inexistente é rejeitado.
+        """
+        book = Book(title='New Book', description='Description of new book', gender='Fiction', registered_by='test@example.com')
+        db.session.add(book)
+        db.session.commit()
+        Review(rating=5, comment='Great', user_email='test@example.com', book=book).save_review()
+
+        with capture_statements() as statements:
+            response = self.client.get('/books?fields=id,title')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{'id': book.id, 'title': 'New Book'}])
+        self.assertFalse([statement for statement in statements if 'description' in statement or 'FROM review' in statement])
+
+        response = self.client.get('/books?fields=title&include=reviews')
+        self.assertEqual(response.json[0]['title'], 'New Book')
+        self.assertEqual([review['rating'] for review in response.json[0]['reviews']], [5])
+        self.assertNotIn('description', response.json[0])
+
+        self.assertEqual(self.client.get('/books?stream=true&fields=title').json, [{'title': 'New Book'}])
+        self.assertEqual(self.client.get('/books?fields=password').status_code, 400)
+        self.assertEqual(self.client.get('/books?include=clubs').status_code, 400)
+
     def test_get_book(self):
         """
         Testa a obtenção de informações de um livro específico.
@@ -75,6 +262,122 @@ class BookTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['title'], 'New Book')
 
+    def test_get_book_by_id(self):
+        """
+        Testa a obtenção de informações de um livro pela chave primária.
+        
+        Este teste verifica se a rota por ID retorna o mesmo livro da rota por título e 404 para IDs inexistentes.
+        """
+        book = Book(title='New Book', description='Description of new book', gender='Fiction', registered_by='test@example.com')
+        db.session.add(book)
+        db.session.commit()
+
+        response = self.client.get(f'/books/id/{book.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, self.client.get('/books/New Book').json)
+        self.assertEqual(self.client.get(f'/books/id/{book.id + 1}').status_code, 404)
+
+    def test_search_books(self):
+        """
+        Testa a busca textual de livros pelo título e pela descrição.
+        
+        Este teste verifica se a busca encontra termos e prefixos, acompanha edições e exclusões
+        e pagina os resultados com o header X-Next-Offset.
+        """
+        for title, description in [('The Dragon Rider', 'A boy and his dragon'), ('Cooking Basics', 'Recipes with dragon fruit'),
+                                   ('Sea Stories', 'Tales from the ocean')]:
+            db.session.add(Book(title=title, description=description, gender='Fiction', registered_by='test@example.com'))
+        db.session.commit()
+
+        response = self.client.get('/books/search?q=dragon')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({book['title'] for book in response.json}, {'The Dragon Rider', 'Cooking Basics'})
+        self.assertEqual(response.json[0]['title'], 'The Dragon Rider')
+        self.assertNotIn('reviews', response.json[0])
+
+        response = self.client.get('/books/search?q=ocea')
+        self.assertEqual([book['title'] for book in response.json], ['Sea Stories'])
+
+        response = self.client.get('/books/search?q=dragon&limit=1')
+        self.assertEqual(len(response.json), 1)
+        self.assertEqual(response.headers['X-Next-Offset'], '1')
+        response = self.client.get('/books/search?q=dragon&limit=1&offset=1')
+        self.assertEqual(response.json[0]['title'], 'Cooking Basics')
+
+        # Os livros com o termo no título vêm antes, mesmo com livros mais novos e descrições que repetem o termo
+        db.session.add(Book(title='Dune', description='Desert planet', gender='Fiction', registered_by='test@example.com'))
+        for number in range(3):
+            db.session.add(Book(title=f'Sand Book {number}', description='A dune, another dune and the dune sea',
+                                gender='Fiction', registered_by='test@example.com'))
+        db.session.commit()
+        response = self.client.get('/books/search?q=dune')
+        self.assertEqual(len(response.json), 4)
+        self.assertEqual(response.json[0]['title'], 'Dune')
+
+        # Com a janela de candidatos em 1, só o livro mais recente de cada faixa é ranqueado,
+        # e o livro mais antigo com o termo no título não se perde
+        self.app.config['SEARCH_MAX_CANDIDATES'] = 1
+        self.assertEqual([book['title'] for book in self.client.get('/books/search?q=dune').json], ['Dune', 'Sand Book 2'])
+        self.app.config['SEARCH_MAX_CANDIDATES'] = 0
+        self.assertEqual(len(self.client.get('/books/search?q=dune').json), 4)
+
+        book = Book.book_exists('Cooking Basics')
+        book.update_book('Cooking Basics', 'Recipes with mango', 'Fiction', 'test@example.com')
+        book.save_book()
+        Book.book_exists('The Dragon Rider').delete_book()
+        self.assertEqual(self.client.get('/books/search?q=dragon').json, [])
+
+        self.assertEqual(self.client.get('/books/search?q=%22').json, [])
+        response = self.client.get('/books/search')
+        self.assertEqual(response.status_code, 400)
+
+    def test_upgrade_db_command(self):
+        """
+        Testa a atualização de um banco criado com o schema antigo.
+        
+        Este teste verifica se as colunas de agregados e os índices são criados sem perder dados
+        e se títulos duplicados impedem a criação do índice único.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'old.db')
+            connection = sqlite3.connect(path)
+            connection.executescript("""
+                CREATE TABLE user (id INTEGER PRIMARY KEY, email VARCHAR(80) NOT NULL UNIQUE, password VARCHAR(30) NOT NULL);
+                CREATE TABLE book (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, description VARCHAR(250) NOT NULL,
+                                   gender VARCHAR(20) NOT NULL, registered_by VARCHAR NOT NULL REFERENCES user (email));
+                CREATE TABLE review (id INTEGER PRIMARY KEY, rating INTEGER NOT NULL, comment VARCHAR(500), user_email VARCHAR(80) NOT NULL,
+                                     book_title VARCHAR(100) NOT NULL REFERENCES book (title), created_at DATETIME);
+                CREATE INDEX ix_review_book_title_created_at ON review (book_title, created_at);
+                INSERT INTO user (email, password) VALUES ('old@example.com', 'x');
+                INSERT INTO book (title, description, gender, registered_by) VALUES ('Old Book', 'Description', 'Fiction', 'old@example.com');
+                INSERT INTO book (title, description, gender, registered_by) VALUES ('Old Book', 'Description', 'Fiction', 'old@example.com');
+                INSERT INTO review (rating, comment, user_email, book_title) VALUES (4, 'Good', 'old@example.com', 'Old Book');
+            """)
+            connection.commit()
+
+            app = create_app('testing', SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+            # O comando reaproveita o contexto já ativo, então o da aplicação antiga precisa ser empurrado
+            with app.app_context():
+                result = app.test_cli_runner().invoke(args=['upgrade-db'])
+                self.assertNotEqual(result.exit_code, 0)
+                self.assertIn("Cannot create unique index ix_book_title: duplicated values 'Old Book'", result.output)
+
+                connection.execute("UPDATE book SET title = 'Old Book 2' WHERE id = 2")
+                connection.commit()
+                result = app.test_cli_runner().invoke(args=['upgrade-db'])
+                self.assertEqual(result.exit_code, 0, result.output)
+                self.assertIn('Created index ix_book_title.', result.output)
+                self.assertIn('Dropped index ix_review_book_title_created_at.', result.output)
+                self.assertIn('Created search index book_fts.', result.output)
+                self.assertEqual(connection.execute("SELECT rowid FROM book_fts WHERE book_fts MATCH 'old'").fetchall(), [(1,), (2,)])
+                self.assertIn('Migrated data for review.book_id.', result.output)
+                self.assertEqual(connection.execute("SELECT book_id FROM review").fetchall(), [(1,)])
+                self.assertEqual(connection.execute("SELECT rating_count, rating_sum FROM book WHERE id = 1").fetchone(), (1, 4))
+                self.assertIn('Database is up to date.', app.test_cli_runner().invoke(args=['upgrade-db']).output)
+                db.engine.dispose()
+
+            connection.close()
+
     def test_edit_book(self):
         """
         Testa a edição das informações de um livro existente.
@@ -111,5 +414,49 @@ class BookTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('Book deleted successfully!', response.json['message'])
 
+    def test_get_book_cached(self):
+        """
+        Testa o cache de resposta das informações de um livro.
+        
+        Este teste verifica se a segunda leitura vem do cache e se a edição do livro invalida a resposta guardada.
+        """
+        self.app.config['RESPONSE_CACHE'] = 'memory'
+        response_cache.init_app(self.app)
+        Book(title='New Book', description='Description of new book', gender='Fiction', registered_by='test@example.com').save_book()
+
+        self.assertEqual(self.client.get('/books/New Book').headers['X-Cache'], 'MISS')
+        response = self.client.get('/books/New Book')
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(response.json['description'], 'Description of new book')
+
+        self.client.put('/books/New Book', data=json.dumps({
+            'description': 'Updated description of book'
+        }), headers={
+            'Authorization': f'Bearer {self.token}'
+        }, content_type='application/json')
+        response = self.client.get('/books/New Book')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(response.json['description'], 'Updated description of book')
+        self.assertEqual(response_cache.stats, {'hits': 1, 'misses': 2})
+
+    def test_search_books_cached(self):
+        """
+        Testa o cache de resposta da busca de livros com as reviews incluídas.
+        
+        Este teste verifica se uma nova review invalida a busca guardada em cache com `include=reviews`.
+        """
+        self.app.config['RESPONSE_CACHE'] = 'memory'
+        response_cache.init_app(self.app)
+        book = Book(title='New Book', description='Description of new book', gender='Fiction', registered_by='test@example.com')
+        book.save_book()
+
+        self.assertEqual(self.client.get('/books/search?q=new&include=reviews').json[0]['reviews'], [])
+        self.assertEqual(self.client.get('/books/search?q=new&include=reviews').headers['X-Cache'], 'HIT')
+
+        Review(rating=5, comment='Great', user_email='test@example.com', book=book).save_review()
+        response = self.client.get('/books/search?q=new&include=reviews')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual([review['comment'] for review in response.json[0]['reviews']], ['Great'])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
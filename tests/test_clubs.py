@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from flask import json
 from flask_testing import TestCase
@@ -7,6 +9,9 @@ from app import create_app, db
 from app.models.user import User
 from app.models.club import Club
 from app.models.book import Book
+from app.models.review import Review
+from app.cache import response_cache
+from helpers import capture_statements
 
 class ClubTestCase(TestCase):
     def create_app(self):
@@ -60,6 +65,59 @@ class ClubTestCase(TestCase):
         self.assertEqual(len(response.json), 1)
         self.assertEqual(response.json[0]['name'], 'Book Club')
 
+    def test_get_all_clubs_query_count(self):
+        """
+        Testa a quantidade de consultas SQL feitas pela listagem de clubes.
+        
+        Este teste verifica se a listagem usa sempre o mesmo número de consultas, independente da quantidade
+        de clubes, livros e reviews.
+        """
+        def count_statements():
+            response = self.client.get('/clubs')
+            self.assertEqual(response.status_code, 200)
+            return int(response.headers['X-DB-Queries']), response
+
+        def add_clubs(start, count):
+            for i in range(start, start + count):
+                club = Club(name=f'Book Club {i}', owner_id=self.user_id)
+                for j in range(3):
+                    book = Book(title=f'Book {i}-{j}', description='Book Description', gender='Fiction', registered_by='test@example.com')
+                    db.session.add(Review(rating=5, comment='Great book!', user_email='test@example.com', book=book))
+                    club.books.append(book)
+                db.session.add(club)
+            db.session.commit()
+
+        add_clubs(0, 2)
+        small_count, _ = count_statements()
+        add_clubs(2, 8)
+        large_count, response = count_statements()
+
+        self.assertEqual(small_count, 3)
+        self.assertEqual(large_count, small_count)
+        self.assertEqual(len(response.json), 10)
+        self.assertEqual(len(response.json[0]['books'][0]['reviews']), 1)
+
+    def test_get_all_clubs_sparse_fields(self):
+        """
+        Testa a listagem de clubes com os parâmetros `fields` e `include`.
+        
+        Este teste verifica se os livros e as reviews só são consultados quando incluídos.
+        """
+        club = Club(name='Book Club', owner_id=self.user_id)
+        club.books.append(Book(title='Book Title', description='Book Description', gender='Fiction', registered_by='test@example.com'))
+        db.session.add(club)
+        db.session.commit()
+
+        response = self.client.get('/clubs?fields=name')
+        self.assertEqual(response.json, [{'name': 'Book Club'}])
+        self.assertEqual(response.headers['X-DB-Queries'], '1')
+
+        response = self.client.get('/clubs?fields=name&include=books')
+        self.assertEqual(response.json[0]['books'][0]['title'], 'Book Title')
+        self.assertNotIn('reviews', response.json[0]['books'][0])
+        self.assertEqual(self.client.get('/clubs?include=books.reviews').json[0]['books'][0]['reviews'], [])
+        self.assertEqual(self.client.get('/clubs?include=reviews').status_code, 400)
+
     def test_get_club(self):
         """
         Testa a obtenção de informações de um clube específico.
@@ -74,6 +132,21 @@ class ClubTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['name'], 'Book Club')
 
+    def test_get_club_by_id(self):
+        """
+        Testa a obtenção de informações de um clube pela chave primária.
+        
+        Este teste verifica se a rota por ID retorna o mesmo clube da rota por nome.
+        """
+        club = Club(name='Book Club', owner_id=self.user_id)
+        db.session.add(club)
+        db.session.commit()
+
+        response = self.client.get(f'/clubs/id/{club.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, self.client.get('/clubs/Book Club').json)
+        self.assertEqual(self.client.get(f'/clubs/id/{club.id + 1}').status_code, 404)
+
     def test_edit_club(self):
         """
         Testa a edição das informações de um clube existente.
@@ -126,6 +199,60 @@ class ClubTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('Book added to club successfully!', response.json['message'])
 
+    def test_add_book_to_club_duplicate(self):
+        """
+        Testa a adição de um livro que já está na lista do clube.
+        
+        Este teste verifica se a duplicidade é detectada sem carregar a lista de livros do clube.
+        """
+        club = Club(name='Book Club', owner_id=self.user_id)
+        book = Book(title='Book Title', description='Book Description', gender='Fiction', registered_by='test@example.com')
+        club.books.append(book)
+        db.session.add(club)
+        db.session.commit()
+
+        with capture_statements() as statements:
+            response = self.client.post('/clubs/addbook/Book Club/Book Title', headers={
+                'Authorization': f'Bearer {self.token}'
+            })
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(any('FROM book, club_book' in statement for statement in statements))
+        self.assertTrue(any('EXISTS' in statement and 'club_book' in statement for statement in statements))
+
+    def test_add_books_to_club(self):
+        """
+        Testa a adição de vários livros a um clube existente.
+        
+        Este teste verifica se os livros que faltam são adicionados, se os que já estão no clube são ignorados
+        e se nenhum livro é adicionado quando algum título não existe.
+        """
+        club = Club(name='Book Club', owner_id=self.user_id)
+        books = [Book(title=f'Book Title {i}', description='Book Description', gender='Fiction', registered_by='test@example.com')
+                 for i in range(3)]
+        club.books.append(books[0])
+        db.session.add(club)
+        db.session.add_all(books)
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {self.token}'}
+
+        response = self.client.post('/clubs/Book Club/books', headers=headers, json={'titles': ['Book Title 1', 'Missing Book']})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['titles'], ['Missing Book'])
+
+        with capture_statements() as statements:
+            response = self.client.post('/clubs/Book Club/books', headers=headers,
+                                        json={'titles': ['Book Title 0', 'Book Title 1', 'Book Title 2', 'Book Title 1']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['added'], ['Book Title 1', 'Book Title 2'])
+        self.assertEqual(response.json['existing'], ['Book Title 0'])
+        self.assertEqual(sum(statement.startswith('INSERT INTO club_book') for statement in statements), 1)
+        self.assertEqual([book['title'] for book in self.client.get('/clubs/Book Club').json['books']],
+                         ['Book Title 0', 'Book Title 1', 'Book Title 2'])
+
+        response = self.client.post('/clubs/Book Club/books', headers=headers, json={'titles': ['Book Title 2']})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.post('/clubs/Book Club/books', headers=headers, json={'titles': []}).status_code, 400)
+
     def test_average_books_read_by_clubs(self):
         """
         Testa o cálculo da média de livros lidos por clubes.
@@ -146,5 +273,61 @@ class ClubTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['average number of books read by clubs'], 1.0)
 
+    def test_average_books_read_by_clubs_cached(self):
+        """
+        Testa o modo em cache da média de livros lidos por clubes.
+        
+        Este teste verifica se a média é servida do cache e recalculada depois que um livro é adicionado a um clube.
+        """
+        self.app.config['CLUB_STATS_CACHE'] = True
+        club1 = Club(name='Book Club 1', owner_id=self.user_id)
+        club2 = Club(name='Book Club 2', owner_id=self.user_id)
+        book1 = Book(title='Book Title 1', description='Book Description', gender='Fiction', registered_by='test@example.com')
+        book2 = Book(title='Book Title 2', description='Book Description', gender='Fiction', registered_by='test@example.com')
+        club1.books.append(book1)
+        db.session.add_all([club1, club2, book2])
+        db.session.commit()
+
+        response = self.client.get('/clubs/average-books-read')
+        self.assertEqual(response.json['average number of books read by clubs'], 0.5)
+
+        # Escrita direta na sessão não invalida o cache
+        club2.books.append(book2)
+        db.session.commit()
+        response = self.client.get('/clubs/average-books-read')
+        self.assertEqual(response.json['average number of books read by clubs'], 0.5)
+
+        self.client.post('/clubs/addbook/Book Club 1/Book Title 2', headers={
+            'Authorization': f'Bearer {self.token}'
+        })
+        response = self.client.get('/clubs/average-books-read')
+        self.assertEqual(response.json['average number of books read by clubs'], 1.5)
+
+    def test_get_club_cached_on_disk(self):
+        """
+        Testa o cache de resposta em disco das informações de um clube.
+        
+        Este teste verifica se a resposta é compartilhada pelo arquivo de cache e invalidada quando um livro do clube muda.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            self.app.config['RESPONSE_CACHE'] = 'disk'
+            self.app.config['RESPONSE_CACHE_DATABASE'] = os.path.join(directory, 'cache.db')
+            response_cache.init_app(self.app)
+            club = Club(name='Book Club', owner_id=self.user_id)
+            book = Book(title='Book Title', description='Book Description', gender='Fiction', registered_by='test@example.com')
+            club.books.append(book)
+            club.save_club()
+
+            self.assertEqual(self.client.get('/clubs/Book Club').headers['X-Cache'], 'MISS')
+            # Um novo backend sobre o mesmo arquivo simula outro worker
+            response_cache.init_app(self.app)
+            self.assertEqual(self.client.get('/clubs/Book Club').headers['X-Cache'], 'HIT')
+
+            book.description = 'Updated Description'
+            book.save_book()
+            response = self.client.get('/clubs/Book Club')
+            self.assertEqual(response.headers['X-Cache'], 'MISS')
+            self.assertEqual(response.json['books'][0]['description'], 'Updated Description')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
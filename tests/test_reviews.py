@@ -1,4 +1,9 @@
+import gzip
+import os
+import tempfile
+import time
 import unittest
+from datetime import datetime
 from flask import json
 from flask_testing import TestCase
 from flask_jwt_extended import create_access_token
@@ -7,6 +12,8 @@ from app import create_app, db
 from app.models.user import User
 from app.models.book import Book
 from app.models.review import Review
+from app.leaderboard import get_leaderboard
+from app.similarity import get_similarity_worker
 
 class ReviewTestCase(TestCase):
     def create_app(self):
@@ -27,6 +34,7 @@ class ReviewTestCase(TestCase):
         db.session.commit()
 
         self.user_id = user.id
+        self.book = book
         self.book_title = book.title
         self.token = create_access_token(identity=self.user_id)
 
@@ -50,13 +58,67 @@ class ReviewTestCase(TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertIn('Review created successfully!', response.json['message'])
 
+    def test_import_reviews_command(self):
+        """
+        Testa a importação de resenhas em lote a partir de um arquivo CSV.
+        
+        Este teste verifica se as resenhas válidas são inseridas, com os agregados do livro atualizados, e se as inválidas são reportadas.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reviews.csv')
+            with open(path, 'w') as file:
+                file.write('rating,comment,user_email,book_title\n')
+                file.write(f'5,Great book!,test@example.com,{self.book_title}\n')
+                file.write(f'3,Ok book,test@example.com,{self.book_title}\n')
+                file.write(f'9,Too high,test@example.com,{self.book_title}\n')
+                file.write('4,Unknown book,test@example.com,Missing Book\n')
+
+            result = self.app.test_cli_runner().invoke(args=['import-catalog', 'reviews', path])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('2 reviews imported, 2 rows failed.', result.output)
+        self.assertIn('line 4: The review value must be from 0 to 5!', result.output)
+        book = Book.book_exists(self.book_title)
+        self.assertEqual((book.rating_count, book.rating_sum), (2, 8))
+
+    def test_export_reviews(self):
+        """
+        Testa a exportação das resenhas em NDJSON.
+        
+        Este teste verifica se as resenhas são exportadas em ordem de criação, filtradas por `since` e comprimidas com gzip.
+        """
+        for i in range(3):
+            db.session.add(Review(rating=i, comment=f'Comment {i}', user_email='test@example.com', book=self.book,
+                                  created_at=datetime(2024, 1, 1 + i)))
+        db.session.commit()
+
+        response = self.client.get('/reviews/export')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([row['comment'] for row in rows], ['Comment 0', 'Comment 1', 'Comment 2'])
+        self.assertEqual(rows[0]['created_at'], '2024-01-01T00:00:00')
+
+        response = self.client.get('/reviews/export?since=2024-01-02T00:00:00%2B00:00&gzip=true')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['rating'] for line in lines], [1, 2])
+
+        self.assertEqual(self.client.get('/reviews/export?since=yesterday').status_code, 400)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reviews.ndjson.gz')
+            result = self.app.test_cli_runner().invoke(args=['export-reviews', '--since', '2024-01-03', '--gzip', '--output', path])
+            self.assertEqual(result.exit_code, 0, result.output)
+            with gzip.open(path, 'rt') as file:
+                self.assertEqual([json.loads(line)['comment'] for line in file], ['Comment 2'])
+
     def test_get_all_reviews(self):
         """
         Testa a obtenção de uma lista de todas as resenhas.
         
         Este teste verifica se todas as resenhas podem ser obtidas corretamente.
         """
-        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book_title=self.book_title)
+        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book=self.book)
         db.session.add(review)
         db.session.commit()
 
@@ -71,7 +133,7 @@ class ReviewTestCase(TestCase):
         
         Este teste verifica se todas as resenhas de um livro podem ser obtidas corretamente.
         """
-        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book_title=self.book_title)
+        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book=self.book)
         db.session.add(review)
         db.session.commit()
 
@@ -80,13 +142,34 @@ class ReviewTestCase(TestCase):
         self.assertEqual(len(response.json), 1)
         self.assertEqual(response.json[0]['comment'], 'Great book!')
 
+    def test_get_all_reviews_by_book_paginated(self):
+        """
+        Testa a paginação por cursor das resenhas de um livro.
+        
+        Este teste verifica se apenas as resenhas do livro são retornadas, em ordem de criação e em páginas consecutivas.
+        """
+        other_book = Book(title='Other Book', description='Test Description', gender='Fiction', registered_by='test@example.com')
+        db.session.add(other_book)
+        for i in range(3):
+            db.session.add(Review(rating='5', comment=f'Review {i}', user_email='test@example.com', book=self.book))
+            db.session.add(Review(rating='1', comment='Other review', user_email='test@example.com', book=other_book))
+        db.session.commit()
+
+        response = self.client.get(f'/reviews/{self.book_title}?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([review['comment'] for review in response.json], ['Review 0', 'Review 1'])
+
+        response = self.client.get(f'/reviews/{self.book_title}?limit=2&after={response.headers["X-Next-Cursor"]}')
+        self.assertEqual([review['comment'] for review in response.json], ['Review 2'])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
     def test_get_review(self):
         """
         Testa a obtenção de informações de uma resenha específica.
         
         Este teste verifica se as informações de uma resenha podem ser obtidas corretamente.
         """
-        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book_title=self.book_title)
+        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book=self.book)
         db.session.add(review)
         db.session.commit()
 
@@ -100,7 +183,7 @@ class ReviewTestCase(TestCase):
         
         Este teste verifica se as informações de uma resenha podem ser editadas corretamente.
         """
-        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book_title=self.book_title)
+        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book=self.book)
         db.session.add(review)
         db.session.commit()
 
@@ -119,7 +202,7 @@ class ReviewTestCase(TestCase):
         
         Este teste verifica se uma resenha pode ser excluída corretamente.
         """
-        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book_title=self.book_title)
+        review = Review(rating='5', comment='Great book!', user_email='test@example.com', book=self.book)
         db.session.add(review)
         db.session.commit()
 
@@ -135,13 +218,221 @@ class ReviewTestCase(TestCase):
         
         Este teste verifica se a média das classificações de um livro pode ser calculada corretamente.
         """
-        review1 = Review(rating='5', comment='Great book!', user_email='test@example.com', book_title=self.book_title)
-        review2 = Review(rating='4', comment='Good book!', user_email='test@example.com', book_title=self.book_title)
+        review1 = Review(rating='5', comment='Great book!', user_email='test@example.com', book=self.book)
+        review2 = Review(rating='4', comment='Good book!', user_email='test@example.com', book=self.book)
         db.session.add(review1)
         db.session.add(review2)
         db.session.commit()
 
         response = self.client.get(f'/reviews/avarage-rating/{self.book_title}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['avarage rating of book'], '4.5')
+
+    def test_average_rating_follows_edits_and_deletes(self):
+        """
+        Testa se a média das classificações acompanha a edição e a exclusão de resenhas.
+        
+        Este teste verifica se os agregados do livro são atualizados pelas escritas de Review.
+        """
+        review1 = Review(rating='5', comment='Great book!', user_email='test@example.com', book=self.book)
+        review1.save_review()
+        review2 = Review(rating='4', comment='Good book!', user_email='test@example.com', book=self.book)
+        review2.save_review()
+
+        self.client.put(f'/reviews/{review1.id}', data=json.dumps({'rating': '1'}), headers={
+            'Authorization': f'Bearer {self.token}'
+        }, content_type='application/json')
+        response = self.client.get(f'/reviews/avarage-rating/{self.book_title}')
+        self.assertEqual(response.json['avarage rating of book'], '2.5')
+
+        self.client.delete(f'/reviews/{review2.id}', headers={
+            'Authorization': f'Bearer {self.token}'
+        })
+        book = Book.book_exists(self.book_title)
+        self.assertEqual((book.rating_count, book.rating_sum), (1, 1))
+
+    def test_review_follows_book_rename_and_move(self):
+        """
+        Testa se as resenhas acompanham a renomeação do livro e a troca de livro.
+        
+        Este teste verifica se a resenha continua ligada ao livro (por book_id) depois que o título muda
+        e se os agregados são movidos quando a resenha passa para outro livro.
+        """
+        other_book = Book(title='Other Book', description='Other Description', gender='Fiction', registered_by='test@example.com')
+        other_book.save_book()
+        review = Review(rating='4', comment='Good book!', user_email='test@example.com', book=self.book)
+        review.save_review()
+
+        self.book.update_book('Renamed Book', self.book.description, self.book.gender, self.book.registered_by)
+        self.book.save_book()
+        response = self.client.get('/reviews/Renamed Book')
+        self.assertEqual([data['book_title'] for data in response.json], ['Renamed Book'])
+        self.assertEqual(self.client.get(f'/reviews/{self.book_title}').json, [])
+
+        response = self.client.put(f'/reviews/{review.id}', data=json.dumps({'book_title': 'Other Book'}), headers={
+            'Authorization': f'Bearer {self.token}'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((review.book_id, review.book_title), (other_book.id, 'Other Book'))
+        self.assertEqual((self.book.rating_count, self.book.rating_sum), (0, 0))
+        self.assertEqual((other_book.rating_count, other_book.rating_sum), (1, 4))
+
+    def test_get_top_books(self):
+        """
+        Testa o ranking dos livros mais bem avaliados.
+        
+        Este teste verifica a ordem pela média bayesiana, o filtro `min_reviews` (só com os valores aceitos), a atualização incremental
+        do ranking quando uma resenha é registrada e se a consulta só lê o ranking, montado na criação da aplicação.
+        """
+        other_book = Book(title='Other Book', description='Other Description', gender='Fiction', registered_by='test@example.com')
+        other_book.save_book()
+        Review(rating=5, comment='Great book!', user_email='test@example.com', book=self.book).save_review()
+        for _ in range(4):
+            Review(rating=4, comment='Good book!', user_email='test@example.com', book=other_book).save_review()
+        # A aplicação de teste é criada antes das tabelas, então o ranking ainda não foi montado
+        get_leaderboard().rebuild()
+
+        response = self.client.get('/books/top')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['title'] for book in response.json], ['Test Book', 'Other Book'])
+        self.assertEqual((response.json[0]['rating_count'], response.json[0]['average_rating']), (1, 5))
+        # Só os livros do topo são lidos do banco
+        self.assertEqual(response.headers['X-DB-Queries'], '1')
+
+        app = create_app('testing')
+        with app.app_context():
+            self.assertEqual([book_id for book_id, *_ in get_leaderboard().top(10)], [self.book.id, other_book.id])
+
+        response = self.client.get('/books/top?min_reviews=2')
+        self.assertEqual([book['title'] for book in response.json], ['Other Book'])
+        # Só os mínimos com ranking próprio são aceitos, para a consulta não percorrer os livros abaixo do mínimo
+        response = self.client.get('/books/top?min_reviews=3')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('min_reviews must be one of: 1, 2, 5', response.json['message'])
+
+        self.client.post('/reviews', data=json.dumps({'rating': '0', 'comment': 'Bad book', 'book_title': self.book_title}), headers={
+            'Authorization': f'Bearer {self.token}'
+        }, content_type='application/json')
+        response = self.client.get('/books/top?limit=1')
+        self.assertEqual([book['title'] for book in response.json], ['Other Book'])
+
+    def test_top_books_prior_after_empty_build(self):
+        """
+        Testa o ranking montado antes de existir qualquer avaliação, como em um banco novo.
+        
+        Este teste verifica se a primeira resenha pede uma reconstrução, para que a média geral `m`
+        não fique em 0 e as notas voltem a ser médias bayesianas.
+        """
+        leaderboard = get_leaderboard()
+        leaderboard.rebuild()
+        Review(rating=5, comment='Great book!', user_email='test@example.com', book=self.book).save_review()
+
+        # Com m = 0, a nota seria 5 / 11; depois da reconstrução em segundo plano, é 5
+        deadline = time.monotonic() + 5
+        while leaderboard.top(1)[0][3] != 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(leaderboard.top(1), [(self.book.id, 1, 5, 5.0)])
+
+    def test_get_similar_books(self):
+        """
+        Testa os livros parecidos ("quem leu também gostou").
+        
+        Este teste verifica a reconstrução pelo comando `rebuild-similar-books`, a ordem pela similaridade
+        e a atualização incremental quando um leitor avalia outro livro.
+        """
+        users = [db.session.get(User, self.user_id), User(email='reader2@example.com', password='x'), User(email='reader3@example.com', password='x')]
+        books = [self.book, Book(title='Book B', description='Description', gender='Fiction', registered_by='test@example.com'),
+                 Book(title='Book C', description='Description', gender='Fiction', registered_by='test@example.com')]
+        db.session.add_all(users + books)
+        db.session.commit()
+        for user, book in [(0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 2)]:
+            Review(rating=5, comment='Great book!', user_email=users[user].email, book=books[book]).save_review()
+
+        result = self.app.test_cli_runner().invoke(args=['rebuild-similar-books'])
+        self.assertIn('Similar books rebuilt for 3 books', result.output)
+        self.app.config['SIMILAR_BOOKS_INCREMENTAL'] = True
+
+        response = self.client.get(f'/books/{self.book_title}/similar')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(book['title'], book['score']) for book in response.json], [('Book B', 0.8165), ('Book C', 0.5774)])
+
+        self.client.post('/reviews', data=json.dumps({'rating': '5', 'comment': 'Great book!', 'book_title': 'Book C'}), headers={
+            'Authorization': f'Bearer {self.token}'
+        }, content_type='application/json')
+        get_similarity_worker().join()
+        response = self.client.get('/books/Book C/similar')
+        self.assertEqual([(book['title'], book['score']) for book in response.json], [('Test Book', 0.8165), ('Book B', 0.5)])
+        response = self.client.get(f'/books/{self.book_title}/similar?limit=2')
+        self.assertEqual([(book['title'], book['score']) for book in response.json], [('Book B', 0.8165), ('Book C', 0.8165)])
+        self.assertEqual(self.client.get('/books/Missing Book/similar').status_code, 404)
+
+        # Acima do limite de leitores, só os pares com os outros livros do leitor são atualizados
+        self.app.config['SIMILAR_BOOKS_MAX_INCREMENTAL_READERS'] = 1
+        self.client.post('/reviews', data=json.dumps({'rating': '5', 'comment': 'Great book!', 'book_title': 'Book C'}), headers={
+            'Authorization': f'Bearer {create_access_token(identity=users[1].id)}'
+        }, content_type='application/json')
+        get_similarity_worker().join()
+        response = self.client.get('/books/Book C/similar')
+        self.assertEqual([(book['title'], book['score']) for book in response.json], [('Test Book', 1.0), ('Book B', 0.8165)])
+        response = self.client.get(f'/books/{self.book_title}/similar')
+        self.assertEqual([(book['title'], book['score']) for book in response.json], [('Book C', 1.0), ('Book B', 0.8165)])
+
+    def test_review_writes_query_count(self):
+        """
+        Testa a quantidade de consultas SQL das escritas de resenhas com a atualização dos livros parecidos ligada.
+        
+        Este teste verifica, pelo header `X-DB-Queries`, se criar, editar e excluir uma resenha custa o mesmo número
+        de comandos para um leitor sem outras resenhas e para um que gostou de muitos livros, pois as similaridades
+        são atualizadas em segundo plano.
+        """
+        self.app.config['SIMILAR_BOOKS_INCREMENTAL'] = True
+        reader = User(email='reader@example.com', password='x')
+        books = [Book(title=f'Liked Book {i}', description='Description', gender='Fiction', registered_by='test@example.com')
+                 for i in range(20)]
+        db.session.add_all([reader, *books])
+        db.session.commit()
+        for book in books:
+            Review(rating=5, comment='Great book!', user_email=reader.email, book=book).save_review()
+        get_similarity_worker().join()
+
+        def write_queries(user_id):
+            db.session.expunge_all()
+            headers = {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+            created = self.client.post('/reviews', json={'rating': '5', 'comment': 'Great book!', 'book_title': self.book_title},
+                                       headers=headers)
+            review_id = db.session.execute(db.select(db.func.max(Review.id))).scalar()
+            edited = self.client.put(f'/reviews/{review_id}', json={'rating': '4'}, headers=headers)
+            deleted = self.client.delete(f'/reviews/{review_id}', headers=headers)
+            get_similarity_worker().join()
+            return [int(response.headers['X-DB-Queries']) for response in (created, edited, deleted)]
+
+        self.assertEqual(write_queries(reader.id), write_queries(self.user_id))
+
+    def test_average_rating_of_book_without_reviews(self):
+        """
+        Testa a média das classificações de um livro sem resenhas.
+        
+        Este teste verifica se a média é zero em vez de gerar uma divisão por zero.
+        """
+        response = self.client.get(f'/reviews/avarage-rating/{self.book_title}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['avarage rating of book'], '0')
+
+    def test_repair_ratings_command(self):
+        """
+        Testa o comando que recalcula os agregados de avaliação dos livros.
+        
+        Este teste verifica se agregados corrompidos são recalculados a partir das resenhas.
+        """
+        Review(rating='3', comment='Ok book', user_email='test@example.com', book=self.book).save_review()
+        book = Book.book_exists(self.book_title)
+        book.rating_count, book.rating_sum = 10, 10
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(args=['repair-ratings'])
+        self.assertEqual(result.exit_code, 0)
+        book = Book.book_exists(self.book_title)
+        self.assertEqual((book.rating_count, book.rating_sum), (1, 3))
     
     if __name__ == '__main__':
         unittest.main()
\ No newline at end of file
@@ -1,11 +1,15 @@
+import os
+import tempfile
+import time
 import unittest
 from flask import json
 from flask_testing import TestCase
+from flask_jwt_extended import decode_token
 from werkzeug.security import generate_password_hash
 
 from app import create_app, db
 from app.models.user import User
-from blacklist import BLACKLIST
+from blacklist import BLACKLIST, CachedRevocationStore, SQLiteRevocationStore
 
 class UserTestCase(TestCase):
     def create_app(self):
@@ -126,5 +130,97 @@ class UserTestCase(TestCase):
         # Faz o login para obter um token JWT
         login_response = self.client.post
 
+    def test_login_with_process_hasher(self):
+        """
+        Testa o registro e o login com o hash de senha calculado no pool de processos.
+        
+        Este teste verifica se o hash gerado fora da thread da requisição é aceito no login com o método configurado.
+        """
+        self.app.config.update(PASSWORD_HASH_EXECUTOR='process', PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_METHOD='pbkdf2:sha256:1000')
+        self.client.post('/register', data=json.dumps({
+            'email': 'pool@example.com',
+            'password': 'password123'
+        }), content_type='application/json')
+        self.assertTrue(User.user_exists('pool@example.com').password.startswith('pbkdf2:sha256:1000$'))
+
+        response = self.client.post('/login', data=json.dumps({
+            'email': 'pool@example.com',
+            'password': 'password123'
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/login', data=json.dumps({
+            'email': 'pool@example.com',
+            'password': 'wrongpassword'
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_revokes_token(self):
+        """
+        Testa se o token usado no logout deixa de ser aceito.
+        
+        Este teste verifica se o token revogado é recusado pelos endpoints protegidos.
+        """
+        login_response = self.client.post('/login', data=json.dumps({
+            'email': 'test@example.com',
+            'password': 'password123'
+        }), content_type='application/json')
+        token = login_response.json['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        response = self.client.post('/logout', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/users/test@example.com', headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+    def test_email_change_revokes_identity_tokens(self):
+        """
+        Testa se a troca de email invalida os tokens que carregam o email antigo nas claims.
+        
+        Este teste verifica se o token do login traz o email e se, depois da troca, só um novo login é aceito.
+        """
+        login_response = self.client.post('/login', data=json.dumps({
+            'email': 'test@example.com',
+            'password': 'password123'
+        }), content_type='application/json')
+        token = login_response.json['access_token']
+        self.assertEqual(decode_token(token)['email'], 'test@example.com')
+
+        response = self.client.put('/users/test@example.com', data=json.dumps({
+            'email': 'updated@example.com'
+        }), headers={'Authorization': f'Bearer {token}'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/users/updated@example.com', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 401)
+
+        login_response = self.client.post('/login', data=json.dumps({
+            'email': 'updated@example.com',
+            'password': 'password123'
+        }), content_type='application/json')
+        response = self.client.get('/users/updated@example.com', headers={
+            'Authorization': f"Bearer {login_response.json['access_token']}"
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_sqlite_revocation_store(self):
+        """
+        Testa o armazenamento de tokens revogados em SQLite.
+        
+        Este teste verifica se uma revogação é vista por outra instância do mesmo arquivo e se entradas vencidas expiram.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'revoked.db')
+            worker1 = CachedRevocationStore(SQLiteRevocationStore(path), negative_ttl=0)
+            worker2 = CachedRevocationStore(SQLiteRevocationStore(path), negative_ttl=0)
+
+            self.assertIsNone(worker2.revoked_until('token-1'))
+            worker1.revoke('token-1', time.time() + 60)
+            worker1.revoke('token-2', time.time() - 1)
+
+            self.assertIsNotNone(worker2.revoked_until('token-1'))
+            self.assertIsNone(worker2.revoked_until('token-2'))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file